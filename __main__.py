@@ -1,4 +1,3 @@
-from kaban.control import main
+from kaban.client import main
 
 main()
-
@@ -0,0 +1,58 @@
+"""Time to prompt for a mutating command with autopush on, however slow the remote.
+
+Usage: python benchmarks/autopush.py [--runs N] [--delay SECONDS]
+
+Runs `kaban add` with autopush off, then on against a remote that takes --delay
+seconds to answer every push. With pushes happening in the background the two
+should come out about the same.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kaban.defaults import Paths
+from kaban.sync import load_state
+
+
+def run_kaban(argv, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(REPO_ROOT)] + argv, cwd=REPO_ROOT, env=env,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--runs', type=int, default=5)
+    argparser.add_argument('--delay', type=float, default=5)
+    args = argparser.parse_args()
+    home = Path(tempfile.mkdtemp(prefix='kaban_bench_'))
+    env = dict(os.environ, HOME=str(home))
+    paths = Paths.for_dir(home / '.kaban')
+    run_kaban(['init'], env)
+    run_kaban(['config', 'flush_count', '1'], env)
+    run_kaban(['remote', 'ssh://example.invalid/tasks.git'], env)
+    # stands in for a remote on the other side of the world
+    subprocess.run(['git', '-C', str(paths.kaban_dir), 'config', 'core.sshCommand',
+                    f'sleep {args.delay}; false'], check=True)
+    print(f"{'autopush':<10} {'add ms':>8}")
+    for setting in ['false', 'true']:
+        run_kaban(['config', 'autopush', setting], env)
+        times = [run_kaban(['add', f"Task number {i}"], env) for i in range(args.runs)]
+        print(f"{setting:<10} {statistics.median(times) * 1000:>8.1f}")
+    worker = load_state(paths).get('worker')
+    print(f"push still in flight in the background: {worker is not None}")
+
+
+if __name__ == '__main__':
+    main()
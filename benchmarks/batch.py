@@ -0,0 +1,77 @@
+"""Cost of running lots of commands through `kaban batch` rather than one by one.
+
+Usage: python benchmarks/batch.py [--tasks 10000] [--commands 500]
+
+Starts from a kaban with `--tasks` tasks in it, then runs `--commands` add and deadline
+commands three ways: each in a KabanControl of its own, the way separate `kaban`
+invocations would (minus starting Python), in one `kaban batch`, and in one
+`kaban batch --atomic`.
+"""
+
+import argparse
+import io
+import shlex
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import kaban.control
+from kaban.control import KabanControl
+from kaban.data import KabanBag, KabanTask
+from kaban.defaults import Paths
+
+
+def run(*argv):
+    with redirect_stdout(io.StringIO()):
+        assert KabanControl(argv=list(argv))._execute_command(), argv
+
+
+def setup(task_count):
+    kaban.control.DEFAULT_PATHS = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    run('init')
+    control = KabanControl(argv=['flush'])
+    for i in range(task_count // 100):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", date(2024, 1, 1)) for j in range(100)]
+        control.data.append(bag)
+    control.repo.commit(control._save_data(), "Lots of tasks")
+
+
+def script(command_count):
+    lines = []
+    for i in range(command_count // 2):
+        lines += [f"add 'bag {i % 10}' 'New task {i}'", f"deadline 2025-01-01 'New task {i}'"]
+    return lines
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--tasks', type=int, default=10000)
+    argparser.add_argument('--commands', type=int, default=500)
+    args = argparser.parse_args()
+    lines = script(args.commands)
+    print(f"{args.commands} commands on {args.tasks} tasks")
+    print(f"{'how':<16} {'total s':>8}")
+    setup(args.tasks)
+    start = time.perf_counter()
+    for line in lines:
+        run(*shlex.split(line))
+    print(f"{'one by one':<16} {time.perf_counter() - start:>8.2f}")
+    for options in [[], ['--atomic']]:
+        setup(args.tasks)
+        source = Path(tempfile.mkdtemp(prefix='kaban_bench_')) / 'script.txt'
+        source.write_text('\n'.join(lines) + '\n')
+        start = time.perf_counter()
+        run('batch', str(source), *options)
+        print(f"{' '.join(['batch'] + options):<16} {time.perf_counter() - start:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Measure how long each kaban command takes to start up from cold.
+
+Usage: python benchmarks/cold_start.py [--runs N]
+
+Every command is run in a fresh interpreter against a throwaway kaban repo, once
+under `python -X importtime` to see which modules it drags in, and a few more
+times to get the median wall time.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+COMMANDS = [ ['help']
+           , ['help', 'init']
+           , ['config', 'quiet']
+           , ['dump']
+           , ['add', 'Feed dragon']
+           , ['remote']
+           , ['cred']
+           ]
+
+# modules we'd rather not see imported by commands that don't need them
+HEAVY_MODULES = ['git', 'tomlkit', 'yaml']
+
+
+def run_kaban(argv, env, importtime=False):
+    """Run kaban in a fresh interpreter, return wall time and stderr."""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += [str(REPO_ROOT)] + argv
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def parse_importtime(stderr):
+    """Return total self import time in microseconds and the set of top level packages imported."""
+    total_us = 0
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        packages.add(name.strip().split('.')[0])
+    return total_us, packages
+
+
+def make_kaban_home():
+    """Create a throwaway home directory with an initialized kaban repo in it."""
+    home = Path(tempfile.mkdtemp(prefix='kaban_bench_'))
+    env = dict(os.environ, HOME=str(home))
+    subprocess.run([sys.executable, str(REPO_ROOT), 'init'], cwd=REPO_ROOT, env=env,
+                   capture_output=True, check=True)
+    return env
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--runs', type=int, default=5)
+    args = argparser.parse_args()
+    env = make_kaban_home()
+    print(f"{'command':<20} {'wall ms':>8} {'import ms':>10}  heavy imports")
+    for argv in COMMANDS:
+        _, stderr = run_kaban(argv, env, importtime=True)
+        import_us, packages = parse_importtime(stderr)
+        heavy = [name for name in HEAVY_MODULES if name in packages]
+        wall_times = [run_kaban(argv, env)[0] for _ in range(args.runs)]
+        print(f"{' '.join(argv):<20} {statistics.median(wall_times) * 1000:>8.1f} "
+              f"{import_us / 1000:>10.1f}  {', '.join(heavy) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
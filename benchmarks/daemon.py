@@ -0,0 +1,90 @@
+"""Compare per-command latency with and without `kaban serve` running.
+
+Usage: python benchmarks/daemon.py [--runs N] [--tasks N]
+
+For each command this reports the median wall time of
+  standalone  a fresh `kaban` process doing all the work itself
+  client      a fresh `kaban` process handing the command to the daemon
+  round trip  the daemon alone, the command sent from this very process
+"""
+
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kaban.client import forward
+
+
+COMMANDS = [ ['help', 'add']
+           , ['list']
+           , ['grep', 'number 77']
+           , ['complete', 'Task number 9']
+           , ['add', 'Feed dragon']
+           ]
+
+
+def run_kaban(argv, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(REPO_ROOT)] + argv, cwd=REPO_ROOT, env=env,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def ask_daemon(argv, socket_path):
+    """Send a command to the daemon, throw away what it prints."""
+    with redirect_stdout(io.TextIOWrapper(io.BytesIO())):
+        return forward(argv, socket_path)
+
+
+def median_ms(measure, runs):
+    return statistics.median(measure() for _ in range(runs)) * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--runs', type=int, default=5)
+    argparser.add_argument('--tasks', type=int, default=1000)
+    args = argparser.parse_args()
+    home = Path(tempfile.mkdtemp(prefix='kaban_bench_'))
+    env = dict(os.environ, HOME=str(home))
+    run_kaban(['init'], env)
+    run_kaban(['config', 'flush_count', str(args.tasks + 1)], env)
+    for i in range(0, args.tasks, 100):
+        run_kaban(['add'] + [f"Task number {j}" for j in range(i, min(i + 100, args.tasks))], env)
+    run_kaban(['flush'], env)
+    socket_path = home / '.kaban' / '.cache' / 'kaban.sock'
+
+    standalone = {' '.join(argv): median_ms(lambda: run_kaban(argv, env), args.runs) for argv in COMMANDS}
+    daemon = subprocess.Popen([sys.executable, str(REPO_ROOT), 'serve'], cwd=REPO_ROOT, env=env,
+                              stdout=subprocess.DEVNULL)
+    try:
+        while ask_daemon(['help', 'help'], socket_path) is None:
+            time.sleep(0.05)
+        print(f"{args.tasks} tasks")
+        print(f"{'command':<24} {'standalone ms':>14} {'client ms':>10} {'round trip ms':>14}")
+        for argv in COMMANDS:
+            client = median_ms(lambda: run_kaban(argv, env), args.runs)
+            def round_trip():
+                start = time.perf_counter()
+                ask_daemon(argv, socket_path)
+                return time.perf_counter() - start
+            name = ' '.join(argv)
+            print(f"{name:<24} {standalone[name]:>14.1f} {client:>10.1f} {median_ms(round_trip, args.runs):>14.1f}")
+    finally:
+        ask_daemon(['serve', 'stop'], socket_path)
+        daemon.wait()
+
+
+if __name__ == '__main__':
+    main()
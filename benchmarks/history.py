@@ -0,0 +1,100 @@
+"""Cost of showing the latest page of history, walking commits versus the history index.
+
+Usage: python benchmarks/history.py [--commits 20000] [--page 20]
+
+The repo gets one commit per change, made in bulk with `git fast-import`. Reported are
+  walk        GitPython going through every commit and parsing its message, what a
+              filtered `kaban hist` would have to do without an index
+  build       indexing the whole history from scratch, paid once
+  update      indexing one new commit and reading the latest page, every `kaban hist`
+"""
+
+import argparse
+import itertools
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import git
+
+from kaban.defaults import Paths
+from kaban.history import iter_history, select_rows, update_history
+from kaban.journal import parse_commit_message
+from kaban.repo import KabanRepo
+
+
+# commits go round-robin over this many bags
+BAGS = 50
+
+
+def commit_message(number):
+    operation = { 'id': f'{number:032x}', 'time': 1700000000 + number, 'message': f"Add 1 task to 'bag {number % BAGS}'"
+                , 'changes': [{ 'change': 'insert', 'path': [number % BAGS, 0], 'bag_title': f'bag {number % BAGS}'
+                              , 'task': {'title': f"Task number {number}"}
+                              }]
+                }
+    return f"{operation['message']}\n\n{json.dumps(operation)}\n"
+
+
+def fast_import(kaban_dir, first, count):
+    """Make `count` commits on top of master, as fast as git can."""
+    stream = []
+    for number in range(first, first + count):
+        message = commit_message(number).encode()
+        stream.append(b'commit refs/heads/master\n')
+        stream.append(f'committer Mal <mal@serenity.space> {1700000000 + number} +0000\n'.encode())
+        stream.append(f'data {len(message)}\n'.encode() + message)
+        if number == first and first > 0:
+            stream.append(b'from refs/heads/master^0\n')
+        stream.append(f'M 644 inline my_kaban_tasks.toml\ndata {len(str(number))}\n{number}\n'.encode())
+    subprocess.run(['git', '-C', str(kaban_dir), 'fast-import', '--quiet'], input=b''.join(stream), check=True)
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--commits', type=int, default=20000)
+    argparser.add_argument('--page', type=int, default=20)
+    args = argparser.parse_args()
+    paths = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    repo = KabanRepo(paths.kaban_dir)
+    repo.init()
+    fast_import(paths.kaban_dir, 0, args.commits)
+
+    def walk():
+        # filtering has to look at every commit, there's no telling where the matches are
+        rows = [operation for commit in git.Repo(paths.kaban_dir).iter_commits()
+                for operation in parse_commit_message(commit.message)]
+        assert len(rows) == args.commits
+
+    # the bag of the latest commit, and how many of the commits touch it once there's one more
+    bag_number = args.commits % BAGS
+    matches = len(range(bag_number, args.commits + 1, BAGS))
+
+    def latest_page():
+        update_history(paths.history_file_path, KabanRepo(paths.kaban_dir))
+        rows = select_rows(iter_history(paths.history_file_path), bag=f'bag {bag_number}')
+        page = list(itertools.islice(rows, args.page))
+        assert len(page) == min(args.page, matches)
+
+    print(f"{args.commits} commits, a page of {args.page}")
+    print(f"{'walk':<8} {timed(walk):>10.1f} ms")
+    print(f"{'build':<8} {timed(lambda: update_history(paths.history_file_path, repo)):>10.1f} ms")
+    fast_import(paths.kaban_dir, args.commits, 1)
+    print(f"{'update':<8} {timed(latest_page):>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
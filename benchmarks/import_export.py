@@ -0,0 +1,66 @@
+"""Cost of `kaban import` and `kaban export` for lots of tasks.
+
+Usage: python benchmarks/import_export.py [--tasks 50000] [--bags 100] [--format jsonl]
+
+Writes a file of `--tasks` tasks spread over `--bags` bags, then imports it into an
+empty kaban and exports everything again, timing each as a whole command, commit included.
+"""
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import kaban.control
+from kaban.control import KabanControl
+from kaban.data import KabanTask
+from kaban.defaults import Paths
+from kaban.transfer import write_tasks
+
+
+def make_file(path, format, task_count, bag_count):
+    added = datetime(2024, 1, 1)
+    items = ((f'bag {i % bag_count}' if i % 10 else None,
+              KabanTask(f"Task number {i}", added + timedelta(seconds=i), deadline=date(2025, 1, 1 + i % 28),
+                        estimate=timedelta(hours=i % 5), notes="Use vegan ions though"))
+             for i in range(task_count))
+    with open(path, 'w', encoding='utf-8', newline='' if 'csv' == format else None) as file:
+        write_tasks(format, items, file)
+
+
+def run(*argv):
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        assert KabanControl(argv=list(argv))._execute_command(), argv
+        return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--tasks', type=int, default=50000)
+    argparser.add_argument('--bags', type=int, default=100)
+    argparser.add_argument('--format', default='jsonl', choices=['jsonl', 'csv', 'todotxt'])
+    args = argparser.parse_args()
+    suffix = {'jsonl': 'jsonl', 'csv': 'csv', 'todotxt': 'txt'}[args.format]
+    paths = kaban.control.DEFAULT_PATHS = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    source = paths.kaban_dir.parent / f'{paths.kaban_dir.name}_in.{suffix}'
+    target = paths.kaban_dir.parent / f'{paths.kaban_dir.name}_out.{suffix}'
+    make_file(source, args.format, args.tasks, args.bags)
+    run('init')
+    print(f"{args.tasks} tasks in {args.bags} bags, {args.format}")
+    print(f"{'import s':>9} {'export s':>9}")
+    import_time = run('import', str(source))
+    export_time = run('export', str(target))
+    print(f"{import_time:>9.2f} {export_time:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
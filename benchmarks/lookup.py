@@ -0,0 +1,73 @@
+"""Time title lookups, prefix completion and grep against the persisted index.
+
+Usage: python benchmarks/lookup.py [--tasks 50000]
+
+Builds a synthetic task set spread over a few dozen bags, persists its index in a
+throwaway directory and then times loading the index back plus a handful of
+queries, which is what `kaban complete` and `kaban grep` pay per call.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.defaults import Paths
+from kaban.index import KabanIndex, load_index, save_index
+
+
+WORDS = ['feed', 'dragon', 'reload', 'ion', 'cannons', 'memorize', 'pi', 'sleep', 'fix', 'bug',
+         'practice', 'bagpipes', 'clear', 'fridge', 'placate', 'owl', 'install', 'dvorak']
+
+
+def synthetic_data(task_count, bag_count=40):
+    data = KabanData()
+    bags = [KabanBag(f'bag{i}', date(2024, 1, 1)) for i in range(bag_count)]
+    for i in range(task_count):
+        title = ' '.join(WORDS[(i * k) % len(WORDS)] for k in (1, 3, 7)).capitalize() + f' {i}'
+        notes = ' '.join(WORDS[(i * k) % len(WORDS)] for k in (5, 11))
+        bags[i % bag_count].append(KabanTask(title, date(2024, 1, 1), notes=notes))
+    data.extend(bags)
+    return data
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--tasks', type=int, default=50_000)
+    args = argparser.parse_args()
+    directory = Path(tempfile.mkdtemp(prefix='kaban_bench_'))
+    paths = Paths(directory, directory / 'my_kaban_tasks.toml', directory / 'my_kaban_tasks.yaml',
+                  directory / 'config.toml')
+    data = synthetic_data(args.tasks)
+    data.save_to_file(paths.toml_file_path)
+    build_ms, index = timed(KabanIndex.build, data)
+    save_index(paths, index)
+    print(f"build index for {args.tasks} tasks: {build_ms:.1f} ms (once, when stale)")
+    load_ms, _ = timed(load_index, paths, False)
+    print(f"load persisted titles:       {load_ms:.1f} ms")
+    load_ms, index = timed(load_index, paths)
+    print(f"load titles and words:       {load_ms:.1f} ms")
+    for label, function, query in [ ('complete', index.complete, 'Feed dragon')
+                                   , ('complete', index.complete, 'p')
+                                   , ('find', index.find, 'Feed dragon feed 42')
+                                   , ('grep', index.grep, 'owl')
+                                   , ('grep', index.grep, 'bagpipes fridge')
+                                   ]:
+        query_ms, matches = timed(function, query)
+        print(f"{label + ' ' + repr(query):<28} {query_ms:>6.2f} ms  {len(matches)} matches")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Cost of `kaban pull --merge` after both sides have changed a handful of tasks.
+
+Usage: python benchmarks/merge.py [--bags 200] [--tasks-per-bag 100] [--edits 20]
+
+Both sides start from the same commit, then each changes the deadline of `--edits`
+tasks in bags of its own and adds a task, and commits. Reported is the time it takes to
+merge the other side's commit into ours and commit the result, from the task files on
+disk, once with a single task file and once with one file per bag.
+"""
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kaban.control import KabanControl
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.defaults import Paths
+from kaban.repo import KabanRepo
+
+
+def make_data(bag_count, tasks_per_bag):
+    data = KabanData()
+    for i in range(bag_count):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", date(2024, 1, 1), notes="Use vegan ions though")
+                     for j in range(tasks_per_bag)]
+        data.append(bag)
+    return data
+
+
+def load(paths, layout):
+    data = KabanData()
+    if 'sharded' == layout:
+        data.load_from_shards(paths.shard_dir)
+    else:
+        data.load_from_file(paths.toml_file_path)
+    return data
+
+
+def save(data, paths, layout):
+    if 'sharded' == layout:
+        written, removed = data.save_to_shards(paths.shard_dir)
+        return written + removed
+    data.save_to_file(paths.toml_file_path)
+    return [paths.toml_file_path]
+
+
+def edit(paths, repo, layout, args, side):
+    data = load(paths, layout)
+    for number in range(args.edits):
+        bag = data[(2 * number + side) * 7 % args.bags]
+        bag[number % args.tasks_per_bag].deadline = date(2025, 1, 1 + side)
+    data[side].append(KabanTask(f"New on side {side}", date(2024, 2, 1)))
+    repo.commit(save(data, paths, layout), f"Side {side}")
+    return repo.head_commit()
+
+
+def measure(layout, args):
+    paths = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    repo = KabanRepo(paths.kaban_dir)
+    repo.init()
+    repo.commit(save(make_data(args.bags, args.tasks_per_bag), paths, layout), "Init")
+    base = repo.head_commit()
+    theirs = edit(paths, repo, layout, args, 1)
+    repo._git('reset', '--quiet', '--hard', base)
+    edit(paths, repo, layout, args, 0)
+    control = KabanControl(argv=['help'])
+    control.paths = paths
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        control._merge(base, theirs)
+        elapsed = time.perf_counter() - start
+    merged = load(paths, layout)
+    assert len(merged[0]) == len(merged[1]) == args.tasks_per_bag + 1
+    return elapsed * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--bags', type=int, default=200)
+    argparser.add_argument('--tasks-per-bag', type=int, default=100)
+    argparser.add_argument('--edits', type=int, default=20)
+    args = argparser.parse_args()
+    print(f"{args.bags} bags of {args.tasks_per_bag} tasks, {args.edits} edits on each side")
+    print(f"{'layout':<8} {'merge+commit ms':>16}")
+    for layout in ['single', 'sharded']:
+        print(f"{layout:<8} {measure(layout, args):>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
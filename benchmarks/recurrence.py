@@ -0,0 +1,91 @@
+"""Cost of checking for recurring tasks that came due, with the schedule versus a full scan.
+
+Usage: python benchmarks/recurrence.py [--tasks 100000] [--recurring 500] [--runs 5]
+
+  scan       loading the tasks and parsing every recurrence to see what's due
+  check      what every command pays with nothing due: one peek at the schedule
+  catch up   a fresh command adding three weeks' worth of instances of every recurring
+             task, in one operation and one commit
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import kaban.control
+from kaban.control import KabanControl
+from kaban.data import KabanBag, KabanTask
+from kaban.defaults import Paths
+from kaban.recurrence import first_due
+
+
+def run(*argv):
+    with redirect_stdout(io.StringIO()):
+        control = KabanControl(argv=list(argv))
+        assert control._execute_command() is not False, argv
+    return control
+
+
+def median_ms(measure, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        measure()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--tasks', type=int, default=100000)
+    argparser.add_argument('--recurring', type=int, default=500)
+    argparser.add_argument('--runs', type=int, default=5)
+    args = argparser.parse_args()
+    kaban.control.DEFAULT_PATHS = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    run('init')
+    control = KabanControl(argv=['flush'])
+    today = date.today()
+    every = args.tasks // args.recurring
+    for i in range(args.tasks // 1000):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", datetime(2024, 1, 1),
+                               **(dict(recurring='weekly', next_due=today + timedelta(days=1 + j % 7))
+                                  if (i * 1000 + j) % every == 0 else {}))
+                     for j in range(1000)]
+        control.data.append(bag)
+    control._save_data()
+    control.repo.commit([control.paths.toml_file_path], "Lots of tasks")
+    # builds the schedule and the snapshot
+    run('list', '--limit=1')
+
+    def scan():
+        control = KabanControl(argv=['help'])
+        return [task for bag in control.data for task in bag
+                if task.recurring and first_due(task) <= today]
+
+    def check():
+        KabanControl(argv=['help'])._catch_up_recurring()
+
+    def catch_up():
+        control = KabanControl(argv=['help'])
+        with redirect_stdout(io.StringIO()):
+            return control._catch_up_recurring(today + timedelta(weeks=3))
+
+    print(f"{args.tasks} tasks, {args.recurring} of them weekly")
+    print(f"{'scan':<10} {median_ms(scan, args.runs):>10.1f} ms")
+    print(f"{'check':<10} {median_ms(check, args.runs):>10.2f} ms")
+    print(f"{'catch up':<10} {median_ms(catch_up, 1):>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Count how many times each command opens the git repo, and how long the command takes.
+
+Usage: python benchmarks/repo_access.py [--subprocess]
+
+Commands run in-process against a throwaway kaban repo. `git.Repo` instances
+are counted by wrapping GitPython's constructor, so this catches repo opens
+from anywhere, not just the ones KabanRepo knows about.
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+COMMANDS = [ ['init']
+           , ['remote', 'https://github.com/mreynolds/my_kaban_tasks.git']
+           , ['remote']
+           , ['user', 'mreynolds']
+           , ['token', 'ghp_03K64Firefly']
+           , ['cred']
+           , ['config', 'quiet']
+           ]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--subprocess', action='store_true', help="use the plain git fallback")
+    args = argparser.parse_args()
+    # must happen before kaban computes its default paths
+    os.environ['HOME'] = tempfile.mkdtemp(prefix='kaban_bench_')
+    sys.path.insert(0, str(REPO_ROOT))
+    import git
+    import kaban.repo
+    from kaban.control import KabanControl
+    if args.subprocess:
+        kaban.repo.git = None
+    repo_opens = []
+    real_init = git.Repo.__init__
+    def counting_init(self, *args, **kwargs):
+        repo_opens.append(1)
+        real_init(self, *args, **kwargs)
+    git.Repo.__init__ = counting_init
+    print(f"{'command':<60} {'opens':>6} {'ms':>8}")
+    for argv in COMMANDS:
+        repo_opens.clear()
+        sys.argv = ['kaban'] + argv
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            KabanControl()._execute_command()
+        elapsed = time.perf_counter() - start
+        print(f"{' '.join(argv):<60} {len(repo_opens):>6} {elapsed * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
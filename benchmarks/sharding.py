@@ -0,0 +1,86 @@
+"""Cost of saving and committing one small change, single task file versus one file per bag.
+
+Usage: python benchmarks/sharding.py [--bags 200] [--tasks-per-bag 100] [--edits 10]
+
+Each edit appends a task to one bag, writes the task store and commits it. Reported
+are the median time that takes and how much the repo grew, loose objects and all.
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.defaults import Paths
+from kaban.repo import KabanRepo
+
+
+def make_data(bag_count, tasks_per_bag):
+    data = KabanData()
+    for i in range(bag_count):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", date(2024, 1, 1), notes="Use vegan ions though")
+                     for j in range(tasks_per_bag)]
+        data.append(bag)
+    return data
+
+
+def objects_size(kaban_dir):
+    """Bytes taken up by the repo's objects."""
+    return sum(path.stat().st_size for path in (Path(kaban_dir) / '.git' / 'objects').rglob('*') if path.is_file())
+
+
+def measure(layout, args):
+    paths = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    repo = KabanRepo(paths.kaban_dir)
+    repo.init()
+    data = make_data(args.bags, args.tasks_per_bag)
+
+    def save():
+        if 'sharded' == layout:
+            written, removed = data.save_to_shards(paths.shard_dir)
+            return written + removed
+        data.save_to_file(paths.toml_file_path)
+        return [paths.toml_file_path]
+
+    repo.commit(save(), "Init")
+    # start from what a command would have loaded, only the bags it touches get read
+    data = KabanData()
+    if 'sharded' == layout:
+        data.load_from_shards(paths.shard_dir)
+    else:
+        data.load_from_file(paths.toml_file_path)
+    size_before = objects_size(paths.kaban_dir)
+    times = []
+    for edit in range(args.edits):
+        start = time.perf_counter()
+        data[edit * 7 % args.bags].append(KabanTask(f"Edit number {edit}", date(2024, 1, 2)))
+        repo.commit(save(), f"Edit {edit}")
+        times.append(time.perf_counter() - start)
+    growth = (objects_size(paths.kaban_dir) - size_before) / args.edits
+    return statistics.median(times) * 1000, growth / 1024
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--bags', type=int, default=200)
+    argparser.add_argument('--tasks-per-bag', type=int, default=100)
+    argparser.add_argument('--edits', type=int, default=10)
+    args = argparser.parse_args()
+    print(f"{args.bags} bags of {args.tasks_per_bag} tasks")
+    print(f"{'layout':<8} {'save+commit ms':>15} {'KiB per edit':>13}")
+    for layout in ['single', 'sharded']:
+        ms, kib = measure(layout, args)
+        print(f"{layout:<8} {ms:>15.1f} {kib:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
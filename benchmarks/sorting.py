@@ -0,0 +1,91 @@
+"""Top-k by a task field: sorting all the tasks versus a range scan over the field index.
+
+Usage: python benchmarks/sorting.py [--sizes 10000 100000] [--limit 20] [--runs 5]
+
+  sort       sorting every task by date_added and taking the first k
+  deadlines  scanning every task for the next k deadlines from today
+  scan       both of the above answered from the field index
+  update     keeping the index in order as one task gets its deadline changed
+  load       reading the deadline part of the persisted index, what a fresh `kaban status`
+             pays on top of the scan
+"""
+
+import argparse
+import heapq
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.defaults import Paths
+from kaban.index import KabanFieldIndex, load_field_index, save_field_index
+
+
+def make_data(task_count):
+    data = KabanData()
+    for i in range(task_count // 100):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", datetime(2024, 1, 1) + timedelta(minutes=(i * 7919 + j * 104729) % 500000),
+                               deadline=date(2025, 1, 1) + timedelta(days=(i * 31 + j * 17) % 700) if j % 3 else None)
+                     for j in range(100)]
+        data.append(bag)
+    return data
+
+
+def median_ms(measure, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        measure()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    argparser.add_argument('--limit', type=int, default=20)
+    argparser.add_argument('--runs', type=int, default=5)
+    args = argparser.parse_args()
+    today = date(2025, 6, 1)
+    print(f"{'tasks':>8} {'sort':>9} {'deadlines':>10} {'scan':>9} {'update':>9} {'load':>9}   (ms)")
+    for size in args.sizes:
+        data = make_data(size)
+        index = KabanFieldIndex.build(data)
+        paths = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+        paths.toml_file_path.touch()
+        save_field_index(paths, index)
+
+        def naive_sort():
+            tasks = [(task.date_added, bag.title, task.title) for bag in data for task in bag]
+            return sorted(tasks)[:args.limit]
+
+        def naive_deadlines():
+            return heapq.nsmallest(args.limit, ((task.deadline, bag.title, task.title) for bag in data for task in bag
+                                                if task.deadline is not None and task.deadline >= today))
+
+        def scan():
+            index.first('date_added', args.limit)
+            index.first('deadline', args.limit, start=today)
+
+        def update():
+            task = data[3][5]
+            index.remove_task(data[3].title, task)
+            index.add_task(data[3].title, replace(task, deadline=today))
+
+        assert [entry[2] for entry in naive_sort()] == [entry[2] for entry in index.first('date_added', args.limit)]
+        print(f"{size:>8} {median_ms(naive_sort, args.runs):>9.2f} {median_ms(naive_deadlines, args.runs):>10.2f} "
+              f"{median_ms(scan, args.runs):>9.3f} {median_ms(update, args.runs):>9.3f} "
+              f"{median_ms(lambda: load_field_index(paths, ['deadline']), args.runs):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
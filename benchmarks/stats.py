@@ -0,0 +1,83 @@
+"""Cost of `kaban status BAG` from the rollups versus a full pass over the tasks.
+
+Usage: python benchmarks/stats.py [--bags 100] [--tasks-per-bag 1000] [--runs 5]
+
+  rollups    a fresh `kaban status BAG`, answered from the persisted rollups
+  full pass  loading the tasks (snapshot and all) and summing them up from scratch
+  analytics  estimate/actual ratios for every bag, in one batch over the loaded tasks
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import kaban.control
+from kaban.control import KabanControl
+from kaban.data import KabanBag, KabanTask
+from kaban.defaults import Paths
+from kaban.stats import KabanStats, ratio_columns, ratio_summary
+
+
+def run(*argv):
+    with redirect_stdout(io.StringIO()):
+        control = KabanControl(argv=list(argv))
+        assert control._execute_command() is not False, argv
+    return control
+
+
+def median_ms(measure, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        measure()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--bags', type=int, default=100)
+    argparser.add_argument('--tasks-per-bag', type=int, default=1000)
+    argparser.add_argument('--runs', type=int, default=5)
+    args = argparser.parse_args()
+    kaban.control.DEFAULT_PATHS = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    run('init')
+    control = KabanControl(argv=['flush'])
+    for i in range(args.bags):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", date(2024, 1, 1 + j % 28), estimate=timedelta(hours=j % 5 + 1),
+                               done=timedelta(hours=j % 7)) for j in range(args.tasks_per_bag)]
+        control.data.append(bag)
+    control._save_data()
+    control.repo.commit([control.paths.toml_file_path], "Lots of tasks")
+    # one from the middle, whatever --bags says
+    bag_title = f'bag {args.bags // 2}'
+    # the first one builds the rollups and the snapshot
+    run('status', bag_title)
+
+    def full_pass():
+        control = KabanControl(argv=['help'])
+        KabanStats.build(control.data).bags[bag_title].progress()
+
+    def analytics():
+        for ratios in ratio_columns(control.data).values():
+            ratio_summary(ratios)
+
+    print(f"{args.bags} bags of {args.tasks_per_bag} tasks")
+    print(f"{'rollups':<10} {median_ms(lambda: run('status', bag_title), args.runs):>10.1f} ms")
+    print(f"{'full pass':<10} {median_ms(full_pass, args.runs):>10.1f} ms")
+    print(f"{'analytics':<10} {median_ms(analytics, args.runs):>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
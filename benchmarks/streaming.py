@@ -0,0 +1,104 @@
+"""Time to first output and peak memory when reading a very large task file.
+
+Usage: python benchmarks/streaming.py [--tasks 50000]
+
+Each way of reading the file runs in its own interpreter so peak RSS figures
+don't bleed into each other:
+  stream       iter_tasks, the generator `kaban list` uses
+  load         KabanData.load_from_file, everything in memory first
+  tomlkit      the whole-document tomlkit parse load_from_file used to do
+  dump-chunks  `kaban dump` copying the file to stdout in chunks
+  dump-read    the old `kaban dump`, reading the whole file into one string
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+MODES = ['stream', 'load', 'tomlkit', 'dump-chunks', 'dump-read']
+
+
+def write_task_file(path, task_count, bag_size=500):
+    from kaban.data import KabanBag, KabanData, KabanTask
+    data = KabanData()
+    for i in range(0, task_count, bag_size):
+        bag = KabanBag(f'bag{i // bag_size}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task number {j}", date(2024, 1, 1), notes="Use vegan ions though")
+                     for j in range(i, min(i + bag_size, task_count))]
+        data.append(bag)
+    data.save_to_file(path)
+
+
+def child(mode, path):
+    """Read the file one way, report time to first output, total time and peak RSS on stderr."""
+    if mode.startswith('write:'):
+        write_task_file(path, int(mode.partition(':')[2]))
+        return
+    start = time.perf_counter()
+    first = None
+    with open(os.devnull, 'w') as devnull:
+        if 'stream' == mode:
+            from kaban.data import iter_tasks
+            for _, task in iter_tasks(path):
+                print(task.title, file=devnull)
+                first = first or time.perf_counter()
+        elif 'load' == mode:
+            from kaban.data import KabanData
+            data = KabanData()
+            data.load_from_file(path)
+            for bag in data:
+                print(bag.title, file=devnull)
+                first = first or time.perf_counter()
+        elif 'tomlkit' == mode:
+            from tomlkit.toml_file import TOMLFile
+            document = TOMLFile(path).read()
+            for bag in document['bags']:
+                print(bag['title'], file=devnull)
+                first = first or time.perf_counter()
+        elif 'dump-chunks' == mode:
+            with open(path, 'rb') as task_file, open(os.devnull, 'wb') as out:
+                out.write(task_file.read(64 * 1024))
+                first = time.perf_counter()
+                shutil.copyfileobj(task_file, out, 64 * 1024)
+        elif 'dump-read' == mode:
+            with open(path, 'r', encoding='utf-8') as task_file:
+                print(task_file.read(), file=devnull)
+            first = time.perf_counter()
+    end = time.perf_counter()
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{(first - start) * 1000} {(end - start) * 1000} {peak_kb}", file=sys.stderr)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--tasks', type=int, default=50_000)
+    argparser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+    path = Path(tempfile.mkdtemp(prefix='kaban_bench_')) / 'my_kaban_tasks.toml'
+    # in a child process too, peak RSS is inherited across fork and exec
+    subprocess.run([sys.executable, __file__, '--child', f'write:{args.tasks}', str(path)], check=True)
+    print(f"{args.tasks} tasks, {path.stat().st_size / 2**20:.1f} MB")
+    print(f"{'mode':<12} {'first ms':>9} {'total ms':>9} {'peak MB':>8}")
+    for mode in MODES:
+        result = subprocess.run([sys.executable, __file__, '--child', mode, str(path)],
+                                capture_output=True, text=True, check=True)
+        first_ms, total_ms, peak_kb = map(float, result.stderr.split())
+        print(f"{mode:<12} {first_ms:>9.1f} {total_ms:>9.1f} {peak_kb / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
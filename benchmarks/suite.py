@@ -0,0 +1,360 @@
+"""Every kaban command against synthetic kaban repos of several sizes, with a baseline to compare to.
+
+Usage: python benchmarks/suite.py [--scales small,medium] [--runs 3] [--only list,add,...]
+                                  [--save FILE] [--compare FILE [--threshold 1.2] [--min-ms 5]]
+
+For each scale a kaban home is generated once: that many bags of that many tasks with
+notes that long, a history of that many commits (made with `git fast-import`, so even
+100k of them only take seconds) and a local bare remote. The caches are warmed up by
+running a few commands on it, like they would be on any kaban in use.
+
+Every command then runs in a fresh interpreter, the way it would from a shell, on a copy
+of that home if it changes anything. Reported are the median wall time, the time kaban
+itself says it took (with KABAN_TRACE=json, so without starting Python), the peak RSS,
+and the counters from the trace: commits created, repo opens, git processes, files read
+and written. Loading the task file, with and without the snapshot, and loading and
+saving the config are measured in this process, with peak memory from tracemalloc.
+
+--save writes the results to a JSON file. --compare runs the scales in such a file
+again and flags every result that got more than --threshold times slower or bigger
+(ignoring wall time differences under --min-ms) and every counter that went up. It
+exits with status 1 if anything did, so it can gate a release. Wall times only compare
+on the same machine, the counters compare anywhere.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from kaban import trace
+from kaban.config import KabanConfig
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.defaults import Paths
+from kaban.journal import format_commit_message
+from kaban.repo import KabanRepo
+from kaban.version import get_version
+
+
+@dataclass
+class Scale:
+    bags: int
+    tasks_per_bag: int
+    note_size: int
+    commits: int
+
+
+SCALES = { 'small' : Scale(bags=10, tasks_per_bag=10, note_size=0, commits=100)
+         , 'medium': Scale(bags=100, tasks_per_bag=100, note_size=200, commits=10_000)
+         , 'large' : Scale(bags=250, tasks_per_bag=200, note_size=1000, commits=100_000)
+         }
+
+
+@dataclass
+class Command:
+    name: str
+    argv: list
+    # run first, untimed, on the same copy
+    setup: tuple = ()
+    # whether it needs a copy of the home of its own
+    mutates: bool = False
+    # whether it runs in an empty home instead
+    fresh: bool = False
+
+
+# every command but `serve`, which runs until it's told to stop; {home} is the kaban home
+COMMANDS = [ Command('help', ['help'])
+           , Command('init', ['init'], fresh=True)
+           , Command('config get', ['config', 'quiet'])
+           , Command('config set', ['config', 'quiet', 'true'], mutates=True)
+           , Command('remote', ['remote'])
+           , Command('cred', ['cred'], setup=(['user', 'mreynolds'],), mutates=True)
+           , Command('user', ['user', 'mreynolds'], mutates=True)
+           , Command('token', ['token', 'ghp_03K64Firefly'], setup=(['user', 'mreynolds'],), mutates=True)
+           , Command('dump', ['dump'])
+           , Command('list', ['list'])
+           , Command('list sorted', ['list', '--sortby=deadline', '--limit=20'])
+           , Command('export', ['export', '{home}/export.jsonl'])
+           , Command('status', ['status'])
+           , Command('grep', ['grep', 'dragon'])
+           , Command('complete', ['complete', 'Task 1'])
+           , Command('hist', ['hist', '--limit=20'])
+           , Command('stats', ['stats'])
+           , Command('undolog', ['undolog'])
+           , Command('add', ['add', 'bag 1', 'Benchmark task'], mutates=True)
+           , Command('deadline', ['deadline', '2030-01-01', 'Task 3 in bag 1'], mutates=True)
+           , Command('auto', ['auto', 'weekly', 'bag 1', 'Task 3 in bag 1'], mutates=True)
+           , Command('bag', ['bag', 'Benchmark bag'], mutates=True)
+           , Command('flush', ['flush'], setup=(['add', 'Benchmark task'],), mutates=True)
+           , Command('undo', ['undo'], setup=(['add', 'Benchmark task'], ['flush']), mutates=True)
+           , Command('redo', ['redo'], setup=(['add', 'Benchmark task'], ['flush'], ['undo']), mutates=True)
+           , Command('batch', ['batch', '{home}/batch.txt'], mutates=True)
+           , Command('batch atomic', ['batch', '{home}/batch.txt', '--atomic'], mutates=True)
+           , Command('import', ['import', '{home}/import.jsonl'], mutates=True)
+           , Command('shard', ['shard'], mutates=True)
+           , Command('pull', ['pull'])
+           ]
+
+# counters that only ever change when the code does, so any increase is a regression
+STEADY_COUNTERS = ['commits created', 'repo opens', 'git processes', 'files read', 'files written']
+
+
+def kaban_env(home):
+    # no daemon or autopush worker from a previous run to get in the way
+    return dict(os.environ, HOME=str(home), KABAN_TRACE='json', GIT_TERMINAL_PROMPT='0')
+
+
+def run_kaban(home, argv, check=True):
+    """Run kaban in a fresh interpreter: (wall seconds, peak RSS in KB, trace lines)."""
+    argv = [arg.replace('{home}', str(home)) for arg in argv]
+    start = time.perf_counter()
+    # from the repo root like cold_start.py, the version comes from setup.cfg in there
+    process = subprocess.Popen([sys.executable, str(REPO_ROOT)] + argv, cwd=REPO_ROOT, env=kaban_env(home),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    stderr = process.stderr.read()
+    # wait4 rather than wait to get at this one process's resource usage
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if check and process.returncode != 0:
+        raise RuntimeError(f"`kaban {' '.join(argv)}` failed:\n{stderr}")
+    # bytes on macOS, kilobytes everywhere else
+    peak_kb = usage.ru_maxrss // 1024 if 'darwin' == sys.platform else usage.ru_maxrss
+    lines = [json.loads(line) for line in stderr.splitlines() if line.startswith('{')]
+    return wall, peak_kb, lines
+
+
+def commit_message(number, scale):
+    bag = number % scale.bags
+    operation = { 'id': f'{number:032x}', 'time': 1700000000 + number, 'message': f"Add 1 task to 'bag {bag}'"
+                , 'changes': [{ 'change': 'insert', 'path': [bag, 0], 'bag_title': f'bag {bag}'
+                              , 'task': {'title': f"Old task {number}", 'date_added': '2023-11-14T22:13:20'}
+                              }]
+                }
+    return format_commit_message([operation])
+
+
+def make_history(kaban_dir, branch, scale):
+    """Make `scale.commits` commits on top of the branch, as fast as git can."""
+    stream = []
+    for number in range(scale.commits):
+        message = commit_message(number, scale).encode('utf-8')
+        stream.append(f'commit refs/heads/{branch}\n'.encode())
+        stream.append(f'committer Mal <mal@serenity.space> {1700000000 + number} +0000\n'.encode())
+        stream.append(f'data {len(message)}\n'.encode() + message + b'\n')
+        if 0 == number:
+            stream.append(f'from refs/heads/{branch}^0\n'.encode())
+        stream.append(f'M 644 inline history.txt\ndata {len(str(number))}\n{number}\n'.encode())
+    subprocess.run(['git', '-C', str(kaban_dir), 'fast-import', '--quiet'],
+                   input=b''.join(stream), check=True)
+    subprocess.run(['git', '-C', str(kaban_dir), 'reset', '--quiet', '--hard'], check=True)
+
+
+def make_data(scale):
+    data = KabanData()
+    notes = ('Use vegan ions though. ' * (scale.note_size // 23 + 1))[:scale.note_size] or None
+    for i in range(scale.bags):
+        bag = KabanBag(f'bag {i}', date(2024, 1, 1))
+        bag.tasks = [KabanTask(f"Task {j} in bag {i}" + (' (feed the dragon)' if 0 == j % 97 else ''),
+                               datetime(2024, 1, 1, 9, 0, 0, i * scale.tasks_per_bag + j), notes=notes,
+                               deadline=date(2025, 1 + j % 12, 1) if j % 3 else None)
+                     for j in range(scale.tasks_per_bag)]
+        data.append(bag)
+    return data
+
+
+def make_home(root, name, scale):
+    """Generate a kaban home of the given scale, return its path."""
+    home = root / name
+    kaban_dir = home / '.kaban'
+    home.mkdir()
+    run_kaban(home, ['init'])
+    paths = Paths.for_dir(kaban_dir)
+    repo = KabanRepo(kaban_dir)
+    make_history(kaban_dir, repo.current_branch(), scale)
+    make_data(scale).save_to_file(paths.toml_file_path)
+    repo.commit([paths.toml_file_path], "Generate synthetic tasks")
+    subprocess.run(['git', 'init', '--quiet', '--bare', str(home / 'remote.git')], check=True)
+    run_kaban(home, ['remote', str(home / 'remote.git')])
+    subprocess.run(['git', '-C', str(kaban_dir), 'push', '--quiet', 'origin', 'HEAD'], check=True)
+    (home / 'import.jsonl').write_text(''.join(json.dumps({'bag': f'imported {i % 10}', 'title': f"Imported task {i}"})
+                                               + '\n' for i in range(1000)))
+    (home / 'batch.txt').write_text(''.join(f"add 'bag {i % scale.bags}' 'Batched task {i}'\n"
+                                            f"deadline 2030-01-01 'Batched task {i}'\n" for i in range(20)))
+    # what any kaban that's been in use for a while has lying around
+    for argv in [['list', '--sortby=deadline', '--limit=1'], ['status'], ['grep', 'dragon'], ['hist', '--limit=1'],
+                 ['stats']]:
+        run_kaban(home, argv)
+    return home
+
+
+def counters(lines):
+    return {line['counter']: line['value'] for line in lines if 'counter' in line}
+
+
+def measure_command(root, template, command, runs):
+    walls, peaks, kaban_times = [], [], []
+    for run in range(runs):
+        home = template
+        if command.fresh:
+            home = root / f'fresh-{run}'
+            home.mkdir()
+        elif command.mutates:
+            home = root / f'copy-{run}'
+            shutil.copytree(template, home, symlinks=True)
+        for argv in command.setup:
+            run_kaban(home, argv)
+        wall, peak_kb, lines = run_kaban(home, command.argv)
+        walls.append(wall)
+        peaks.append(peak_kb)
+        kaban_times += [line['ms'] for line in lines if 1 == len(line.get('phase', []))]
+        if home != template:
+            shutil.rmtree(home)
+    return { 'wall_ms': statistics.median(walls) * 1000
+           , 'kaban_ms': statistics.median(kaban_times) if kaban_times else None
+           , 'peak_kb': max(peaks)
+           , 'counters': counters(lines)
+           }
+
+
+def measure_here(function, runs):
+    """Time a function in this very process, with its peak Python memory and the trace counters."""
+    walls, peaks = [], []
+    for _ in range(runs):
+        tracemalloc.start()
+        trace.start('json', 'measure')
+        start = time.perf_counter()
+        function()
+        walls.append(time.perf_counter() - start)
+        report = io.StringIO()
+        trace.finish(report)
+        peaks.append(tracemalloc.get_traced_memory()[1] // 1024)
+        tracemalloc.stop()
+    lines = [json.loads(line) for line in report.getvalue().splitlines()]
+    return {'wall_ms': statistics.median(walls) * 1000, 'kaban_ms': None, 'peak_kb': max(peaks),
+            'counters': counters(lines)}
+
+
+def measure_scale(name, scale, runs, only):
+    root = Path(tempfile.mkdtemp(prefix=f'kaban_suite_{name}_'))
+    try:
+        start = time.perf_counter()
+        template = make_home(root, 'template', scale)
+        print(f"{name}: {scale.bags} bags of {scale.tasks_per_bag} tasks, notes of {scale.note_size}, "
+              f"{scale.commits} commits (generated in {time.perf_counter() - start:.1f} s)")
+        print(HEADER)
+        paths = Paths.for_dir(template / '.kaban')
+        config_copy = root / 'config.toml'
+        shutil.copy(paths.config_file_path, config_copy)
+        here = { 'load tasks': lambda: KabanData().load_from_file(paths.toml_file_path)
+               , 'load tasks from snapshot': lambda: KabanData().load_from_file(
+                     paths.toml_file_path, snapshot_path=paths.snapshot_file_path)
+               , 'config load': lambda: KabanConfig(path=config_copy).load_from_file()
+               , 'config save': lambda: KabanConfig(path=config_copy).save_to_file()
+               }
+        results = {}
+        for command_name, function in here.items():
+            if only is None or command_name in only:
+                results[command_name] = measure_here(function, runs)
+                print_result(command_name, results[command_name])
+        for command in COMMANDS:
+            if only is None or command.name in only:
+                results[command.name] = measure_command(root, template, command, runs)
+                print_result(command.name, results[command.name])
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+HEADER = (f"  {'what':<26} {'wall ms':>9} {'kaban ms':>9} {'peak MB':>8} {'commits':>8} {'opens':>6} "
+          f"{'git':>4} {'read':>5} {'written':>8}")
+
+
+def print_result(name, result):
+    numbers = result['counters']
+    kaban_ms = f"{result['kaban_ms']:9.1f}" if result['kaban_ms'] is not None else f"{'-':>9}"
+    print(f"  {name:<26} {result['wall_ms']:9.1f} {kaban_ms} {result['peak_kb'] / 1024:8.1f} "
+          f"{numbers.get('commits created', 0):8} {numbers.get('repo opens', 0):6} "
+          f"{numbers.get('git processes', 0):4} {numbers.get('files read', 0):5} {numbers.get('files written', 0):8}")
+
+
+def compare(baseline, current, threshold, min_ms):
+    """(what, measure, before, after) for everything in `current` that got worse than in `baseline`."""
+    regressions = []
+    for key, result in current.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for measure in ['wall_ms', 'kaban_ms']:
+            old, new = before.get(measure), result.get(measure)
+            if old is not None and new is not None and new > old * threshold and new - old > min_ms:
+                regressions.append((key, measure, old, new))
+        if result['peak_kb'] > before['peak_kb'] * threshold:
+            regressions.append((key, 'peak_kb', before['peak_kb'], result['peak_kb']))
+        for counter in STEADY_COUNTERS:
+            old, new = before['counters'].get(counter, 0), result['counters'].get(counter, 0)
+            if new > old:
+                regressions.append((key, counter, old, new))
+    return regressions
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--scales', default=None, help=f"comma separated, out of {', '.join(SCALES)}")
+    argparser.add_argument('--runs', type=int, default=3)
+    argparser.add_argument('--only', default=None, help="comma separated names of the things to measure")
+    argparser.add_argument('--save', default=None, help="write the results to this JSON file")
+    argparser.add_argument('--compare', default=None, help="compare with the results in this JSON file")
+    argparser.add_argument('--threshold', type=float, default=1.2)
+    argparser.add_argument('--min-ms', type=float, default=5.0)
+    args = argparser.parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    if args.scales:
+        scales = args.scales.split(',')
+    elif baseline is not None:
+        scales = sorted({key.partition('/')[0] for key in baseline['results']}, key=list(SCALES).index)
+    else:
+        scales = ['small', 'medium']
+    only = set(args.only.split(',')) if args.only else None
+    results = {}
+    for name in scales:
+        for what, result in measure_scale(name, SCALES[name], args.runs, only).items():
+            results[f'{name}/{what}'] = result
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as results_file:
+            json.dump({ 'kaban': get_version(), 'python': platform.python_version(), 'machine': platform.node()
+                      , 'date': datetime.now().isoformat(timespec='seconds'), 'runs': args.runs
+                      , 'scales': {name: asdict(SCALES[name]) for name in scales}, 'results': results
+                      }, results_file, indent=1)
+        print(f"Results saved to '{args.save}'.")
+    if baseline is None:
+        return
+    if baseline.get('machine') != platform.node():
+        print(f"The baseline comes from '{baseline.get('machine')}', only the counters are worth comparing.")
+    regressions = compare(baseline['results'], results, args.threshold, args.min_ms)
+    for key, measure, old, new in regressions:
+        print(f"REGRESSION {key}: {measure} {old:.1f} -> {new:.1f}")
+    print(f"{len(regressions)} regression{'s' if len(regressions) != 1 else ''} against '{args.compare}'.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Memory use and throughput of the task model at archive scale.
+
+Usage: python benchmarks/task_memory.py [--sizes 10000 100000 1000000]
+
+For each size, builds that many synthetic tasks from parsed-table dicts the way
+KabanData.load_from_file does, then iterates over them summing estimates.
+The same is done with a plain (unslotted) dataclass copy of KabanTask for reference.
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import make_dataclass, fields
+from datetime import date, timedelta
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kaban.data import KabanTask, _from_document
+
+
+# what KabanTask looked like before it had slots
+PlainTask = make_dataclass('PlainTask', [(field.name, field.type, field) for field in fields(KabanTask)])
+
+
+def synthetic_tables(count):
+    """Task tables as they come out of the TOML parser."""
+    for i in range(count):
+        yield { 'title': f"Task number {i}"
+              , 'date_added': date(2024, 1 + i % 12, 1 + i % 28)
+              , 'recurring': 'daily' if i % 3 == 0 else None
+              , 'estimate': (i % 40) / 4
+              , 'done': (i % 20) / 4
+              }
+
+
+def measure(task_class, count):
+    """Return construction time, peak memory and iteration time for `count` tasks."""
+    def build():
+        shared = {}
+        return [task_class(**_from_document(table, shared)) for table in synthetic_tables(count)]
+    # tracing slows allocation down a lot, so time and measure memory in separate runs
+    gc.collect()
+    tracemalloc.start()
+    build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    start = time.perf_counter()
+    tasks = build()
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    total = timedelta(0)
+    for task in tasks:
+        total += task.estimate
+    iterate_time = time.perf_counter() - start
+    return build_time, peak, iterate_time
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = argparser.parse_args()
+    print(f"{'model':<10} {'tasks':>9} {'build s':>8} {'peak MB':>8} {'bytes/task':>11} {'iterate s':>10}")
+    for count in args.sizes:
+        for name, task_class in [('slots', KabanTask), ('plain', PlainTask)]:
+            build_time, peak, iterate_time = measure(task_class, count)
+            print(f"{name:<10} {count:>9} {build_time:>8.2f} {peak / 2**20:>8.1f} "
+                  f"{peak / count:>11.0f} {iterate_time:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
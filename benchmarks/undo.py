@@ -0,0 +1,62 @@
+"""Cost of `kaban undo` and `kaban redo` next to `kaban add`, in a repo with lots of tasks.
+
+Usage: python benchmarks/undo.py [--tasks 10000] [--steps 20]
+
+Every command runs on a fresh KabanControl in this process, the way it would from a
+fresh `kaban` invocation minus the interpreter startup. Reported are the median time
+per command and, for undo and redo, the total for going all the steps back and forth.
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import kaban.control
+from kaban.control import KabanControl
+from kaban.data import KabanTask
+from kaban.defaults import Paths
+
+
+def run(*argv):
+    """Run one command, return how long it took."""
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        control = KabanControl(argv=list(argv))
+        assert control._execute_command() is not False, argv
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--tasks', type=int, default=10000)
+    argparser.add_argument('--steps', type=int, default=20)
+    args = argparser.parse_args()
+    kaban.control.DEFAULT_PATHS = Paths.for_dir(tempfile.mkdtemp(prefix='kaban_bench_'))
+    run('init')
+    run('add', 'placeholder')
+    # the flush writes out everything that's in memory, so the tasks go in with it
+    control = KabanControl(argv=['flush'])
+    control.data.extend(KabanTask(f"Task number {i}", date(2024, 1, 1)) for i in range(args.tasks))
+    with redirect_stdout(io.StringIO()):
+        control._execute_command()
+    adds = [run('add', f"Step number {step}") for step in range(args.steps)]
+    undos = [run('undo') for _ in range(args.steps)]
+    redos = [run('redo') for _ in range(args.steps)]
+    print(f"{args.tasks} tasks, {args.steps} steps")
+    print(f"{'command':<8} {'median ms':>10} {'total ms':>10}")
+    for name, times in [('add', adds), ('undo', undos), ('redo', redos)]:
+        print(f"{name:<8} {statistics.median(times) * 1000:>10.1f} {sum(times) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Binary snapshots of parsed task data so we don't have to reparse the task file every time."""
+
+import os
+import pickle
+from pathlib import Path
+
+from kaban import trace
+
+
+# bump this whenever the pickled classes change shape
+SNAPSHOT_VERSION = 5
+
+
+def fingerprint(filepath):
+    """Cheap identity of a file's current contents: its path, mtime and size."""
+    stat = os.stat(filepath)
+    return (SNAPSHOT_VERSION, str(Path(filepath).resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def dir_fingerprint(dirpath):
+    """Cheap identity of the current contents of every file in a directory, None if there's no such directory."""
+    try:
+        with os.scandir(dirpath) as entries:
+            return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                                for entry in entries if entry.is_file()))
+    except FileNotFoundError:
+        return None
+
+
+def load_snapshot(snapshot_path, source_path):
+    """Return the tasks saved from `source_path` if the snapshot is still valid, None otherwise."""
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            # the key is pickled separately so a stale snapshot costs next to nothing to reject
+            key = pickle.load(snapshot_file)
+            if key != fingerprint(source_path):
+                return None
+            return pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # truncated, corrupt or written by an incompatible kaban, just reparse
+        return None
+
+
+def snapshot_valid(snapshot_path, source_path):
+    """Is there a snapshot of the tasks in `source_path` that's still valid? Only reads its key."""
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            return pickle.load(snapshot_file) == fingerprint(source_path)
+    except Exception:
+        return False
+
+
+def save_snapshot(snapshot_path, source_path, tasks, key=None):
+    """Atomically write a snapshot of the tasks parsed from `source_path`.
+    Pass the `key` taken before parsing to avoid racing with a concurrent edit."""
+    if key is None:
+        key = fingerprint(source_path)
+    snapshot_path = Path(snapshot_path)
+    try:
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = snapshot_path.with_name(snapshot_path.name + f'.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as snapshot_file:
+            pickle.dump(key, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(tasks, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            trace.count_written(snapshot_file.tell())
+        os.replace(temp_path, snapshot_path)
+    except OSError:
+        pass  # the snapshot is only an optimization, no need to make a fuss
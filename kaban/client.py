@@ -0,0 +1,112 @@
+"""The thin end of `kaban serve`: hand the command line to the daemon if one is running.
+
+This runs before anything else on every kaban invocation, so it sticks to the few
+standard library modules the daemon protocol can't do without.
+"""
+
+import os
+import socket
+import struct
+import sys
+
+
+# every message is a frame: what kind of message it is, how long it is, then the message itself
+_FRAME_HEADER = struct.Struct('>cI')
+REQUEST = b'r'
+STDOUT  = b'o'
+STDERR  = b'e'
+EXIT    = b'x'
+
+
+def send_frame(sock, kind, payload):
+    sock.sendall(_FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 64 * 1024))
+        if not chunk:
+            raise EOFError
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    kind, size = _FRAME_HEADER.unpack(_recv_exactly(sock, _FRAME_HEADER.size))
+    return kind, _recv_exactly(sock, size)
+
+
+def encode_request(cwd, argv):
+    # command line arguments can't contain NUL characters, so that's our separator
+    return '\0'.join([cwd] + list(argv)).encode('utf-8', 'surrogateescape')
+
+
+def decode_request(payload):
+    cwd, *argv = payload.decode('utf-8', 'surrogateescape').split('\0')
+    return cwd, argv
+
+
+def default_socket_path():
+    # same as DEFAULT_PATHS.socket_file_path, minus importing dataclasses and pathlib
+    return os.path.join(os.path.expanduser('~'), '.kaban', '.cache', 'kaban.sock')
+
+
+def connect(socket_path):
+    """A connection to the daemon listening at `socket_path`, None if there's no such daemon."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(socket_path))
+    except OSError:
+        # no socket file, or one left behind by a daemon that's gone
+        client.close()
+        return None
+    return client
+
+
+def forward(argv, socket_path=None):
+    """Have the daemon run a command, copying its output to ours as it comes.
+    Return the exit status, or None if there is no daemon to run it."""
+    client = connect(socket_path or default_socket_path())
+    if client is None:
+        return None
+    with client:
+        send_frame(client, REQUEST, encode_request(os.getcwd(), argv))
+        while True:
+            try:
+                kind, payload = recv_frame(client)
+            except (EOFError, OSError):
+                print("The kaban daemon hung up halfway through, sorry about that.", file=sys.stderr)
+                return 1
+            if STDOUT == kind:
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif STDERR == kind:
+                sys.stderr.buffer.write(payload)
+                sys.stderr.buffer.flush()
+            elif EXIT == kind:
+                return int(payload)
+
+
+def reads_stdin(argv):
+    """Would the command read our standard input? The daemon has its own, not ours."""
+    words = [arg for arg in argv[1:] if not arg.startswith('--')]
+    if argv[:1] == ['batch']:
+        # no FILE means the standard input too
+        return words[:1] in [[], ['-']]
+    return argv[:1] == ['import'] and '-' in words
+
+
+def main():
+    """Entry point: run the command in the daemon if there is one, right here otherwise."""
+    argv = sys.argv[1:]
+    # no point asking the daemon to start itself, but it's the one to ask to stop
+    starting_daemon = argv[:1] == ['serve'] and 'stop' not in argv
+    status = None if starting_daemon or reads_stdin(argv) else forward(argv)
+    if status is None:
+        from kaban.control import main as run_here
+        run_here()
+    sys.exit(status)
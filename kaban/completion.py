@@ -0,0 +1,133 @@
+"""Shell completion from a plain text cache, without importing the rest of kaban.
+
+Pressing TAB shouldn't cost as much as running a kaban command, so commands write
+whatever completion needs to `.cache/completion.txt` whenever the titles index changes:
+    kaban-completion 1<TAB>FINGERPRINT
+    command<TAB>add
+    bag<TAB>gifts
+    task<TAB>Feed dragon
+The fingerprint is taken from the task file or files and the journal, the same things
+the indexes are keyed on, plus kaban's own code, so the cache is known to be stale after
+a `git pull` or an upgrade. Only then does the rest of kaban get imported, to bring it
+up to date.
+
+The scripts for bash, zsh and fish in kaban/completions/ run this file with the words on
+the command line so far and offer whatever it prints:
+    python3 completion.py CURRENT_WORD_INDEX kaban WORDS...
+It sticks to the standard library modules Python loads anyway.
+"""
+
+import os
+import sys
+
+
+CACHE_HEADER = 'kaban-completion 1'
+
+# commands whose arguments are other commands rather than titles
+_COMMAND_ARGUMENTS = ['help']
+
+# same as DEFAULT_PATHS.kaban_dir, minus importing dataclasses and pathlib
+_KABAN_DIR = os.path.join(os.path.expanduser('~'), '.kaban')
+
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return '-'
+    return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+
+def fingerprint(kaban_dir):
+    """Cheap identity of everything the cache is derived from, as a single line of text."""
+    parts = [_stat_key(os.path.join(kaban_dir, name)) for name in ['my_kaban_tasks.toml', '.journal.jsonl']]
+    try:
+        with os.scandir(os.path.join(kaban_dir, 'tasks')) as entries:
+            parts += sorted(f'{entry.name}:{_stat_key(entry.path)}' for entry in entries if entry.is_file())
+    except OSError:
+        pass
+    # new commands come with a new kaban
+    parts.append(_stat_key(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'control.py')))
+    return ' '.join(parts)
+
+
+def _clean(title):
+    # one entry per line, one tab per entry
+    return ' '.join(title.split())
+
+
+def write_cache(cache_path, kaban_dir, commands, bags, titles):
+    """Atomically write the completion cache, keyed on the files as they are right now."""
+    lines = [f'{CACHE_HEADER}\t{fingerprint(kaban_dir)}']
+    lines += [f'command\t{command}' for command in commands]
+    lines += [f'bag\t{_clean(bag)}' for bag in bags]
+    lines += [f'task\t{_clean(title)}' for title in titles]
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as cache_file:
+            cache_file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # completion will bring it up to date itself
+
+
+def read_cache(cache_path, kaban_dir):
+    """{'command': [...], 'bag': [...], 'task': [...]} from the cache, None if it's missing or stale."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            header = cache_file.readline().rstrip('\n')
+            if header != f'{CACHE_HEADER}\t{fingerprint(kaban_dir)}':
+                return None
+            entries = {'command': [], 'bag': [], 'task': []}
+            for line in cache_file:
+                kind, _, name = line.rstrip('\n').partition('\t')
+                if kind in entries:
+                    entries[kind].append(name)
+            return entries
+    except OSError:
+        return None
+
+
+def _refresh():
+    """The slow way: import kaban for real and have it rewrite the cache."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from kaban.control import KabanControl
+    KabanControl(argv=['complete'])._save_completions()
+
+
+def candidates(entries, words, current):
+    """What the word at index `current` of the command line could be, going by its beginning."""
+    prefix = words[current] if current < len(words) else ''
+    # the shell may hand us an opening quote too
+    prefix = prefix.lstrip('\'"').casefold()
+    if current <= 1:
+        names = entries['command']
+    elif words[1] in _COMMAND_ARGUMENTS:
+        names = entries['command'] if 2 == current else []
+    else:
+        names = entries['bag'] + entries['task']
+    return list(dict.fromkeys(name for name in names if name.casefold().startswith(prefix)))
+
+
+def main():
+    try:
+        current, words = int(sys.argv[1]), sys.argv[2:]
+    except (IndexError, ValueError):
+        print("Usage: completion.py CURRENT_WORD_INDEX kaban WORDS...", file=sys.stderr)
+        sys.exit(2)
+    kaban_dir = _KABAN_DIR
+    cache_path = os.path.join(kaban_dir, '.cache', 'completion.txt')
+    entries = read_cache(cache_path, kaban_dir)
+    if entries is None:
+        try:
+            _refresh()
+        except Exception:
+            return  # no completions is better than a traceback in the middle of the prompt
+        entries = read_cache(cache_path, kaban_dir) or {'command': [], 'bag': [], 'task': []}
+    for name in candidates(entries, words, current):
+        print(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+# bash completion for kaban: commands, bag and task titles, straight from kaban's
+# completion cache. Source it from your ~/.bashrc:
+#     source /path/to/kaban/completions/kaban.bash
+
+_kaban_completion_stub="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/completion.py"
+
+_kaban() {
+    local IFS=$'\n'
+    local candidate
+    local -a candidates
+    candidates=($("${KABAN_PYTHON:-python3}" "$_kaban_completion_stub" "$COMP_CWORD" "${COMP_WORDS[@]}" 2>/dev/null))
+    COMPREPLY=()
+    for candidate in "${candidates[@]}"; do
+        # titles with spaces in them have to stay one word
+        COMPREPLY+=("$(printf '%q' "$candidate")")
+    done
+}
+
+complete -F _kaban kaban
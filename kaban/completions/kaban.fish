@@ -0,0 +1,14 @@
+# fish completion for kaban: commands, bag and task titles, straight from kaban's
+# completion cache. Link it into your completions directory:
+#     ln -s /path/to/kaban/completions/kaban.fish ~/.config/fish/completions/
+
+set -g __kaban_completion_stub (dirname (realpath (status filename)))/../completion.py
+
+function __kaban_complete
+    set -l words (commandline -opc)
+    set -l python python3
+    set -q KABAN_PYTHON; and set python $KABAN_PYTHON
+    $python $__kaban_completion_stub (count $words) $words (commandline -ct) 2>/dev/null
+end
+
+complete -c kaban -f -a '(__kaban_complete)'
@@ -1,12 +1,26 @@
+import os
+from contextlib import contextmanager
 from dataclasses import dataclass, asdict
 
 from pathlib import Path
 
-from tomlkit import comment
-from tomlkit.toml_document import TOMLDocument
-from tomlkit.toml_file import TOMLFile
+try:
+    # reading is all most commands do, and the stdlib parser is a lot quicker to import
+    import tomllib
+except ImportError:
+    tomllib = None  # Python < 3.11, tomlkit will have to do
 
 import kaban.defaults as defaults
+from kaban import trace
+
+
+# how long to wait between pushes for each `autopush` setting, see kaban.sync
+AUTOPUSH_INTERVALS = {'true': 0, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+
+
+def autopush_interval(setting):
+    """Seconds between pushes for an `autopush` config value, None if it's off."""
+    return AUTOPUSH_INTERVALS.get(str(setting).lower())
 
 
 @dataclass
@@ -15,25 +29,77 @@ class KabanConfig:
     path: Path  = defaults.DEFAULT_PATHS.config_file_path
     format: str = 'toml'
     local: bool = False
+    # 'true', 'hour', 'day' or 'false', see kaban.sync
+    autopush: str = 'false'
     quiet: bool = False
+    # commit journaled changes once this many commands' worth have piled up...
+    flush_count: int = 20
+    # ...or once the oldest of them is this many seconds old
+    flush_age: int = 600
+
+    def __post_init__(self):
+        # bookkeeping, not config options, so keep them out of the dataclass fields
+        object.__setattr__(self, '_dirty', False)
+        object.__setattr__(self, '_transaction_depth', 0)
 
     def __setattr__(self, attr, value):
-        """Write every change to file automatically."""
+        """Write every change to file automatically, or once at the end of a transaction."""
+        if attr.startswith('_'):
+            super().__setattr__(attr, value)
+            return
+        # the dataclass __init__ comes through here too, that must not write anything
+        initializing = '_dirty' not in self.__dict__
+        changed = attr not in self.__dict__ or getattr(self, attr) != value
         super().__setattr__(attr, value)
-        self.save_to_file()
+        if initializing or not changed or 'path' == attr:
+            return
+        self._dirty = True
+        if 0 == self._transaction_depth:
+            self.save_to_file()
+
+    @contextmanager
+    def transaction(self):
+        """Batch config changes into a single write, made when the outermost transaction ends.
+        If an exception escapes, all changes made during the transaction are rolled back."""
+        saved_values = asdict(self)
+        was_dirty = self._dirty
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if 0 == self._transaction_depth:
+                for attr_name, value in saved_values.items():
+                    object.__setattr__(self, attr_name, value)
+                self._dirty = was_dirty
+            raise
+        self._transaction_depth -= 1
+        if 0 == self._transaction_depth and self._dirty:
+            self.save_to_file()
 
     def load_from_file(self, filepath=None):
         """Destructively load all config options from the config file."""
         # sic, because KabanControl.__init__ may pass us an explicit None argument
         if filepath is not None:
             self.path = filepath
-        toml_document = TOMLFile(self.path).read()
+        if tomllib is not None:
+            with open(self.path, 'rb') as config_file:
+                toml_document = tomllib.load(config_file)
+        else:
+            from tomlkit.toml_file import TOMLFile
+            toml_document = TOMLFile(self.path).read()
+        trace.count_read(self.path)
         for attr_name in toml_document:
             assert hasattr(self, attr_name)
-            setattr(self, attr_name, toml_document[attr_name])
+            # bypass __setattr__, what we just read is by definition already on disk
+            object.__setattr__(self, attr_name, toml_document[attr_name])
+        self._dirty = False
 
     def save_to_file(self, filepath=None):
-        """Serialize and write all current settings to file."""
+        """Serialize and atomically write all current settings to file."""
+        # tomlkit is only needed for writing, so import it here
+        from tomlkit import comment, dumps
+        from tomlkit.toml_document import TOMLDocument
         if filepath is not None:
             self.path = filepath
         toml_document = TOMLDocument()
@@ -43,5 +109,12 @@ class KabanConfig:
             if 'path' == attr_name:
                 continue
             toml_document.append(attr_name, config_dict[attr_name])
-        TOMLFile(self.path).write(toml_document)
-
+        # write a temp file and rename it over the old one so a crash can't leave half a config behind
+        temp_path = Path(self.path).with_name(Path(self.path).name + f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8', newline='') as config_file:
+            config_file.write(dumps(toml_document))
+            config_file.flush()
+            os.fsync(config_file.fileno())
+            trace.count_written(config_file.tell())
+        os.replace(temp_path, self.path)
+        self._dirty = False
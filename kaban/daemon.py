@@ -0,0 +1,207 @@
+"""Keep kaban loaded in a background process that takes commands over a Unix domain socket.
+
+`kaban serve` runs the daemon. Every other kaban invocation tries the socket first (see
+kaban.client) and only runs the command itself when nobody is listening.
+"""
+
+import io
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from time import perf_counter
+
+from kaban import trace
+from kaban.cache import dir_fingerprint
+from kaban.client import EXIT, REQUEST, STDERR, STDOUT, connect, decode_request, recv_frame, send_frame
+
+
+# how often the daemon checks if there's something to push when it's got nothing else to do
+IDLE_CHECK_INTERVAL = 60
+
+
+class _FrameWriter(io.RawIOBase):
+    """Binary stream sending everything written to it as frames of the given kind."""
+
+    def __init__(self, sock, kind):
+        self.sock = sock
+        self.kind = kind
+        self.hung_up = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if not self.hung_up:
+            try:
+                send_frame(self.sock, self.kind, bytes(data))
+            except OSError:
+                # the client went away (`kaban list | head` say), but a command
+                # that has started changing things must get to finish regardless
+                self.hung_up = True
+        return len(data)
+
+
+def _text_stream(sock, kind):
+    # line buffered so the client sees output as it's printed, like on a terminal
+    return io.TextIOWrapper(io.BufferedWriter(_FrameWriter(sock, kind)), encoding='utf-8',
+                            line_buffering=True)
+
+
+def _stat_or_none(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    # the inode catches files replaced wholesale within the same mtime tick
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class KabanDaemon:
+    """Runs commands sent over the socket one at a time, all on the same KabanControl
+    so config, tasks, index and repo stay loaded from one command to the next."""
+
+    def __init__(self, control):
+        self.control = control
+        self.paths = control.paths
+        self.running = False
+        # what the files we've loaded things from looked like after the last command
+        self._seen = None
+        self._config_arg = control.args.config
+
+    def _watched_paths(self):
+        git_dir = Path(self.paths.kaban_dir) / '.git'
+        # refs/heads is there for its mtime, git renames a new file into it for every commit
+        return [ self.paths.toml_file_path, self.paths.yaml_file_path, self.paths.journal_file_path
+               , self.paths.config_file_path
+               , git_dir / 'HEAD', git_dir / 'config', git_dir / 'index', git_dir / 'packed-refs'
+               , git_dir / 'refs' / 'heads'
+               ]
+
+    def _disk_state(self):
+        # with one file per bag, any one of them may have changed
+        return [_stat_or_none(path) for path in self._watched_paths()] + [dir_fingerprint(self.paths.shard_dir)]
+
+    def alive(self):
+        """Is there a daemon listening on our socket already?"""
+        client = connect(self.paths.socket_file_path)
+        if client is None:
+            return False
+        client.close()
+        return True
+
+    def serve_forever(self):
+        """Listen for commands until told to stop, return False if another daemon beat us to it."""
+        socket_path = self.paths.socket_file_path
+        if self.alive():
+            print(f"There's a kaban daemon listening at '{socket_path}' already.")
+            return False
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        # whatever is left there belongs to a daemon that didn't get to clean up after itself
+        socket_path.unlink(missing_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # nobody else gets to run commands on our tasks
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(str(socket_path))
+        finally:
+            os.umask(old_umask)
+        server.listen()
+        if threading.current_thread() is threading.main_thread():
+            # make `kill` clean up the socket like Ctrl+C does
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if self.control.data is not None:
+            # warm up everything grep and complete are going to want
+            self.control.index
+        self._seen = self._disk_state()
+        self.running = True
+        self.control._daemon = self
+        print(f"Serving kaban commands at '{socket_path}'. Ctrl+C or `kaban serve stop` to quit.")
+        sys.stdout.flush()
+        try:
+            with server:
+                # wake up every now and then even if nobody calls, for autopush hour/day's sake
+                server.settimeout(IDLE_CHECK_INTERVAL)
+                while self.running:
+                    try:
+                        connection, _ = server.accept()
+                    except socket.timeout:
+                        self._idle()
+                        continue
+                    with connection:
+                        self._handle(connection)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.control._daemon = None
+            socket_path.unlink(missing_ok=True)
+        return True
+
+    def _idle(self):
+        if self._disk_state() != self._seen:
+            self.control._forget()
+        try:
+            # load the config if it's been forgotten, autopush is in there
+            self.control.config_object
+            self.control._schedule_push()
+        except Exception:
+            pass  # it's all best effort, next time perhaps
+        self._seen = self._disk_state()
+
+    def _handle(self, connection):
+        try:
+            kind, payload = recv_frame(connection)
+        except (EOFError, OSError):
+            return
+        if kind != REQUEST:
+            return
+        cwd, argv = decode_request(payload)
+        stdout = _text_stream(connection, STDOUT)
+        stderr = _text_stream(connection, STDERR)
+        own_cwd = os.getcwd()
+        try:
+            # relative paths on the command line are relative to where the client is
+            os.chdir(cwd)
+        except OSError:
+            pass
+        try:
+            status = self._run(argv, stdout, stderr)
+        finally:
+            os.chdir(own_cwd)
+        stdout.flush()
+        stderr.flush()
+        try:
+            send_frame(connection, EXIT, str(status).encode())
+        except OSError:
+            pass
+
+    def _run(self, argv, stdout, stderr):
+        """Run one command, return its exit status."""
+        control = self.control
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                started = perf_counter()
+                control._parse_args(argv)
+                control._start_trace(started)
+                if self._disk_state() != self._seen or control.args.config != self._config_arg:
+                    # someone's been at our files (a manual `git pull` perhaps), start over
+                    control._forget()
+                    self._config_arg = control.args.config
+                control._startup(control._command_needs())
+                status = int(not control._execute_command())
+                # goes to the client along with everything else the command printed
+                trace.finish()
+            except SystemExit as exit:
+                status = exit.code if isinstance(exit.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                # no telling what state that left things in
+                control._forget()
+                status = 1
+        self._seen = self._disk_state()
+        return status
+
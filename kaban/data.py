@@ -1,18 +1,26 @@
-from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import List, Optional
+import functools
+import hashlib
+import json
+import os
+import re
+import sys
+from collections.abc import MutableSequence
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
 
-from tomlkit.toml_document import TOMLDocument
-from tomlkit.toml_file import TOMLFile
-from tomlkit.exceptions import NonExistentKey
+from kaban import trace
+from kaban.cache import fingerprint, load_snapshot, save_snapshot
 
 try:
-    import yaml
+    import tomllib
 except ImportError:
-    pass  # oh well
+    tomllib = None  # Python < 3.11, tomlkit will have to do
 
 
-@dataclass
+# slots save the per-instance __dict__, which adds up quickly with a big archive of tasks
+@dataclass(slots=True)
 class KabanTask:
     title: str
     date_added: datetime
@@ -21,45 +29,469 @@ class KabanTask:
     notes: Optional[str] = None
     estimate: Optional[timedelta] = None
     done: timedelta = timedelta(0)
+    deadline: Optional[date] = None
+    # when the next instance of a recurring task is due
+    next_due: Optional[date] = None
     #color: None  # TODO eventually
 
 
-class KabanBag(KabanTask, list):
+class KabanBag(KabanTask, MutableSequence):
+    """A task made up of other tasks. Behaves like a list of them too."""
+
+    # can't inherit from list like it used to, its instance layout doesn't mix with slots
+    __slots__ = ('_tasks', 'load_tasks')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tasks = []
+
+    @property
+    def tasks(self):
+        # a bag from a sharded task store only reads its file once its tasks are asked for
+        if self.load_tasks is not None:
+            load_tasks, self.load_tasks = self.load_tasks, None
+            self._tasks = load_tasks()
+        return self._tasks
+
+    @tasks.setter
+    def tasks(self, tasks):
+        self._tasks = tasks
+        self.load_tasks = None
+
+    def loaded(self):
+        """Have the tasks in this bag been read yet?"""
+        return self.load_tasks is None
+
+    def __getitem__(self, index):
+        return self.tasks[index]
+
+    def __setitem__(self, index, task):
+        self.tasks[index] = task
+
+    def __delitem__(self, index):
+        del self.tasks[index]
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def insert(self, index, task):
+        self.tasks.insert(index, task)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return KabanTask.__eq__(self, other) and self.tasks == other.tasks
+
+
+# durations are stored as a number of hours
+DURATION_FIELDS = ['estimate', 'done']
+
+
+def _from_document(table, shared=None):
+    """Turn a task table from the task file into keyword arguments for KabanTask.
+    Pass the same `shared` dict for every task of a file to have equal dates and
+    durations stored only once."""
+    task_fields = dict(table)
+    for field in DURATION_FIELDS:
+        if isinstance(task_fields.get(field), (int, float)):
+            task_fields[field] = timedelta(hours=task_fields[field])
+    if shared is not None:
+        for field in ['date_added', 'date_last_logged', 'deadline', 'next_due'] + DURATION_FIELDS:
+            if task_fields.get(field) is not None:
+                task_fields[field] = shared.setdefault(task_fields[field], task_fields[field])
+    if task_fields.get('recurring') is not None:
+        task_fields['recurring'] = sys.intern(task_fields['recurring'])
+    return task_fields
+
+
+def _to_document(task, with_tasks=True):
+    """Turn a task into a table for the task file, the inverse of _from_document."""
+    table = {}
+    for field in fields(KabanTask):
+        value = getattr(task, field.name)
+        if value is None or value == field.default:
+            # TOML has no null, and there's no need to spell out defaults either
+            continue
+        if field.name in DURATION_FIELDS:
+            value = value / timedelta(hours=1)
+        table[field.name] = value
+    if with_tasks and isinstance(task, KabanBag):
+        table['tasks'] = [_to_document(bag_task) for bag_task in task]
+    return table
+
+
+def task_from_document(table, shared=None):
+    """Create a KabanTask, or a KabanBag if the table has a 'tasks' subarray."""
+    table = dict(table)
+    if 'tasks' in table:
+        bag_tasks = table.pop('tasks')
+        bag = KabanBag(**_from_document(table, shared))
+        bag.tasks = [KabanTask(**_from_document(bag_task, shared)) for bag_task in bag_tasks]
+        return bag
+    return KabanTask(**_from_document(table, shared))
+
+
+_BARE_KEY = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return 'nan'
+        if value in [float('inf'), float('-inf')]:
+            return 'inf' if value > 0 else '-inf'
+        return repr(value)
+    if isinstance(value, str):
+        # JSON string escapes are all valid in TOML too, and DEL is the one character
+        # TOML wants escaped that JSON doesn't
+        return json.dumps(value, ensure_ascii=False).replace('\x7f', '\\u007f')
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def _toml_key(key):
+    return key if _BARE_KEY.fullmatch(key) else _toml_value(key)
+
+
+def _dump_toml(document):
+    """Serialize a task file document: scalars at the root and arrays of task tables, which
+    may have a 'tasks' array of tables of their own. Does only what we need, but does it
+    a whole lot quicker than tomlkit, which adds up with thousands of tasks."""
+    lines = []
+
+    def add_table(header, table):
+        if lines:
+            lines.append('')
+        lines.append(f'[[{header}]]')
+        for key, value in table.items():
+            if not isinstance(value, list):
+                lines.append(f'{_toml_key(key)} = {_toml_value(value)}')
+        for key, value in table.items():
+            if isinstance(value, list):
+                for subtable in value:
+                    add_table(f'{header}.{_toml_key(key)}', subtable)
+
+    for key, value in document.items():
+        if not isinstance(value, list):
+            lines.append(f'{_toml_key(key)} = {_toml_value(value)}')
+    for key, value in document.items():
+        if isinstance(value, list):
+            for table in value:
+                add_table(_toml_key(key), table)
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _digest(text):
+    """A digest of a shard's text that stays the same from one run to the next, unlike hash()."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _write_atomically(filepath, text):
+    temp_path = Path(filepath).with_name(Path(filepath).name + f'.{os.getpid()}.tmp')
+    with open(temp_path, 'w', encoding='utf-8', newline='') as file:
+        file.write(text)
+    os.replace(temp_path, filepath)
+    trace.count_written(len(text))
+
+
+def _parse_toml(text):
+    trace.count('bytes parsed', len(text))
+    if tomllib is not None:
+        return tomllib.loads(text)
+    from tomlkit import parse
+    return parse(text).unwrap()
+
+
+_ARRAY_TABLE_HEADER = re.compile(r'\s*\[\[\s*([\w.]+)\s*\]\]\s*(#.*)?$')
+_TABLE_HEADER = re.compile(r'\s*\[[^\[].*\]\s*(#.*)?$')
+
+
+class _NotStreamable(Exception):
     pass
 
 
+def _stream_tables(file, shared):
+    """Split a task file at its table headers and parse one table at a time."""
+    header = None
+    lines = []
+    current_bag = None
+    # which kind of multi-line string we're in, if any, since those may well contain '[['
+    in_string = None
+
+    def finish_table():
+        nonlocal current_bag
+        if header is None:
+            # root level keys, the only thing that can come before the first table
+            if any(line.strip() and not line.strip().startswith('#') for line in lines):
+                raise _NotStreamable
+            return None
+        if 'tasks' == header:
+            return None, KabanTask(**_from_document(_parse_toml(''.join(lines)), shared))
+        if 'bags' == header:
+            table = _parse_toml(''.join(lines))
+            table.setdefault('tasks', [])
+            current_bag = task_from_document(table, shared)
+            return None, current_bag
+        if 'bags.tasks' == header:
+            return current_bag, KabanTask(**_from_document(_parse_toml(''.join(lines)), shared))
+        return None  # not one of ours, skip it
+
+    for line in file:
+        if in_string is None:
+            match = _ARRAY_TABLE_HEADER.match(line)
+            if match is not None or _TABLE_HEADER.match(line):
+                record = finish_table()
+                if record is not None:
+                    yield record
+                header = match.group(1) if match is not None else ''
+                lines = []
+                continue
+        for quotes in ['"""', "'''"]:
+            if in_string in [None, quotes] and line.count(quotes) % 2 == 1:
+                in_string = quotes if in_string is None else None
+        lines.append(line)
+    record = finish_table()
+    if record is not None:
+        yield record
+
+
+def iter_tasks(filepath, shared=None):
+    """Yield the tasks in a TOML task file as (bag, task) pairs, one table at a time.
+    Top-level tasks come with a None bag. A bag comes as (None, bag) first, still empty,
+    followed by a (bag, task) pair for each of its tasks, which are *not* added to it.
+    Memory use is bounded by the largest table rather than the whole file."""
+    if shared is None:
+        shared = {}
+    with open(filepath, 'r', encoding='utf-8') as file:
+        try:
+            yield from _stream_tables(file, shared)
+            return
+        except _NotStreamable:
+            pass
+        # can only happen before the first table, so nothing has been yielded yet
+        file.seek(0)
+        document = _parse_toml(file.read())
+    for task in document.get('tasks', []):
+        yield None, KabanTask(**_from_document(task, shared))
+    for bag in document.get('bags', []):
+        bag = dict(bag)
+        bag.setdefault('tasks', [])
+        yield None, task_from_document(bag, shared)
+
+
+MANIFEST_FILE_NAME = 'manifest.toml'
+TOP_LEVEL_FILE_NAME = 'top.toml'
+SHARDS_VERSION = 1
+
+
+def _shard_file_name(title, taken):
+    """A file name for a new bag's shard that's recognizable and not taken yet."""
+    slug = re.sub(r'[^\w-]+', '-', title.casefold(), flags=re.ASCII).strip('-')[:40] or 'bag'
+    name = f'bag-{slug}.toml'
+    number = 1
+    while name in taken:
+        number += 1
+        name = f'bag-{slug}-{number}.toml'
+    return name
+
+
 class KabanData(list):
-    """The Python class corresponding to the contents of a kaban YAML or TOML file."""
+    """The Python class corresponding to the contents of a kaban YAML or TOML file,
+    or of a directory of them with one file per bag."""
 
     def __init__(self):
         self.toml_document = None
         self.last_task = None
         self.tasks = None
+        # only used for sharded task stores, see load_from_shards
+        self.shard_dir = None
+        self.shard_files = {}
+        self.shard_digests = {}
+        self.read_text = None
 
-    def load_from_file(self, filepath, format='toml'):
+    def load_from_file(self, filepath, format='toml', snapshot_path=None):
+        """Load all tasks from file, or from a snapshot of it if we've parsed it before."""
+        if snapshot_path is not None:
+            # fingerprint before parsing so an edit made meanwhile invalidates the snapshot
+            key = fingerprint(filepath)
+            tasks = load_snapshot(snapshot_path, filepath)
+            if tasks is not None:
+                trace.count_read(snapshot_path)
+                self.extend(tasks)
+                return
+        trace.count_read(filepath)
         if format == 'toml':
-            self.toml_document = TOMLFile(filepath).read()
+            bags = []
+            for bag, task in iter_tasks(filepath):
+                if bag is not None:
+                    bag.append(task)
+                elif isinstance(task, KabanBag):
+                    bags.append(task)
+                else:
+                    self.append(task)
+            # top-level tasks always come first, whatever order they're in in the file
+            self.extend(bags)
         elif format == 'yaml':
+            # optional, and slow to import anyway
+            import yaml
             with open(filepath, 'r', encoding='utf-8') as file:
                 self.yaml_document = yaml.safe_load(file)
+            self._load_document(self.yaml_document or {})
         else:
             assert False
+        if snapshot_path is not None:
+            save_snapshot(snapshot_path, filepath, list(self), key=key)
+
+    def load_from_text(self, text, format='toml'):
+        """Load all tasks from the contents of a task file, say an older version of it out of git."""
+        if format == 'toml':
+            document = _parse_toml(text)
+        elif format == 'yaml':
+            import yaml
+            document = yaml.safe_load(text)
+        else:
+            assert False
+        self._load_document(document or {})
+
+    def _load_document(self, document):
+        shared = {}
         try:
             # process top-level tasks
-            for task in self.toml_document['tasks']:
-                self.append(KabanTask(**task))
-        except NonExistentKey:
+            for task in document['tasks']:
+                self.append(KabanTask(**_from_document(task, shared)))
+        except KeyError:
             pass  # no top-level tasks found
-        # process bags
+        # process bags, the tasks in them are in a subarray below the 'bags' array
         try:
-            for bag in self.toml_document['bags']:
-                try:
-                    self.append(KabanBag(**bag))
-                except TypeError as te:
-                    # this must be a subarray below the 'bags' array
-                    pass  # TODO
-        except NonExistentKey:
+            for bag in document['bags']:
+                bag = dict(bag)
+                bag.setdefault('tasks', [])
+                self.append(task_from_document(bag, shared))
+        except KeyError:
             pass  # no bags found
-        print("good so far:")
-        print(self)
 
+    def _read_shard(self, name):
+        """Parse one file of a sharded task store, remembering what it looked like."""
+        if self.read_text is not None:
+            text = self.read_text(name) or ''
+        else:
+            try:
+                with open(self.shard_dir / name, 'r', encoding='utf-8') as file:
+                    text = file.read()
+            except FileNotFoundError:
+                text = ''
+            trace.count_read(self.shard_dir / name, len(text))
+        # to tell later whether it needs rewriting, the text itself would take up too much room
+        self.shard_digests[name] = _digest(text)
+        return _parse_toml(text)
+
+    def _read_bag_shard(self, name, shared):
+        tables = self._read_shard(name).get('tasks', [])
+        return [KabanTask(**_from_document(table, shared)) for table in tables]
+
+    def load_from_shards(self, shard_dir, read_text=None):
+        """Load top-level tasks and bags from a sharded task store: a manifest listing the bags,
+        a file of top-level tasks and one file per bag. Bags' files are read on first access.
+        Pass `read_text` to get the text of the files by name some other way than from disk."""
+        self.shard_dir = Path(shard_dir)
+        self.read_text = read_text
+        shared = {}
+        manifest = self._read_shard(MANIFEST_FILE_NAME)
+        for table in self._read_shard(TOP_LEVEL_FILE_NAME).get('tasks', []):
+            self.append(KabanTask(**_from_document(table, shared)))
+        for table in manifest.get('bags', []):
+            table = dict(table)
+            name = table.pop('file')
+            bag = KabanBag(**_from_document(table, shared))
+            bag.load_tasks = functools.partial(self._read_bag_shard, name, shared)
+            # holding on to the bag itself keeps its id from being reused
+            self.shard_files[id(bag)] = (bag, name)
+            self.append(bag)
+
+    def save_to_shards(self, shard_dir):
+        """Write the task store out as one file per bag, skipping every file that would come
+        out the same as it is now. Return the files written and the files deleted."""
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        written = []
+
+        def write(name, document):
+            text = _dump_toml(document) if document else ''
+            if self.shard_digests.get(name) == _digest(text) and (self.shard_dir / name).exists():
+                return
+            _write_atomically(self.shard_dir / name, text)
+            self.shard_digests[name] = _digest(text)
+            written.append(self.shard_dir / name)
+
+        bags = [bag for bag in self if isinstance(bag, KabanBag)]
+        top_level = [_to_document(task) for task in self if not isinstance(task, KabanBag)]
+        write(TOP_LEVEL_FILE_NAME, {'tasks': top_level} if top_level else {})
+        old_files = self.shard_files
+        # bags keep their file for life, even when renamed
+        taken = {MANIFEST_FILE_NAME, TOP_LEVEL_FILE_NAME}
+        taken |= {old_files[id(bag)][1] for bag in bags if id(bag) in old_files}
+        self.shard_files = {}
+        manifest_bags = []
+        for bag in bags:
+            if id(bag) in old_files:
+                name = old_files[id(bag)][1]
+            else:
+                name = _shard_file_name(bag.title, taken)
+                taken.add(name)
+            self.shard_files[id(bag)] = (bag, name)
+            # a bag that hasn't been read can't have changed
+            if bag.loaded():
+                write(name, {'tasks': [_to_document(task) for task in bag]} if len(bag) else {})
+            manifest_bags.append({**_to_document(bag, with_tasks=False), 'file': name})
+        write(MANIFEST_FILE_NAME, {'version': SHARDS_VERSION, 'bags': manifest_bags} if manifest_bags
+                                  else {'version': SHARDS_VERSION})
+        removed = []
+        for name in {name for _, name in old_files.values()} - taken:
+            (self.shard_dir / name).unlink(missing_ok=True)
+            self.shard_digests.pop(name, None)
+            removed.append(self.shard_dir / name)
+        return written, removed
+
+    def shard_file(self, bag):
+        """Name of the file a bag of a sharded task store is kept in, None if it has none (yet)."""
+        entry = self.shard_files.get(id(bag))
+        return entry[1] if entry is not None else None
+
+    def top_level_count(self):
+        """Number of top-level tasks, which always come before the bags."""
+        count = 0
+        for item in self:
+            if isinstance(item, KabanBag):
+                break
+            count += 1
+        return count
+
+    def find_bag(self, title):
+        """Return the index of the bag with the given title, or None."""
+        for index in range(self.top_level_count(), len(self)):
+            if self[index].title == title:
+                return index
+        return None
+
+    def save_to_file(self, filepath, format='toml', snapshot_path=None):
+        """Serialize all tasks and atomically replace the task file with them."""
+        document = { 'tasks': [_to_document(task) for task in self if not isinstance(task, KabanBag)]
+                   , 'bags' : [_to_document(bag) for bag in self if isinstance(bag, KabanBag)]
+                   }
+        # leave out empty arrays, otherwise an empty data set would be written as 'tasks = []'
+        document = {key: value for key, value in document.items() if value}
+        if format == 'toml':
+            serialized = _dump_toml(document)
+        elif format == 'yaml':
+            import yaml
+            serialized = yaml.safe_dump(document, sort_keys=False)
+        else:
+            assert False
+        _write_atomically(filepath, serialized)
+        if snapshot_path is not None:
+            save_snapshot(snapshot_path, filepath, list(self))
@@ -12,14 +12,130 @@ class Paths:
     yaml_file_path   : Path
     config_file_path : Path
 
+    @classmethod
+    def for_dir(cls, kaban_dir):
+        """The usual file names in a given kaban dir."""
+        kaban_dir = Path(kaban_dir)
+        return cls( kaban_dir
+                  , kaban_dir / 'my_kaban_tasks.toml'
+                  , kaban_dir / 'my_kaban_tasks.yaml'
+                  , kaban_dir / 'config.toml'
+                  )
+
+    @property
+    def gitignore_file_path(self):
+        return Path(self.kaban_dir) / '.gitignore'
+
+    @property
+    def shard_dir(self):
+        """Where the task store lives when it's split up into one file per bag."""
+        return Path(self.kaban_dir) / 'tasks'
+
+    @property
+    def manifest_file_path(self):
+        return self.shard_dir / 'manifest.toml'
+
+    @property
+    def cache_dir(self):
+        """Where we keep derived data that can be thrown away at any time, not tracked by git."""
+        return Path(self.kaban_dir) / '.cache'
+
+    @property
+    def snapshot_file_path(self):
+        return self.cache_dir / 'tasks.pickle'
+
+    @property
+    def index_file_path(self):
+        return self.cache_dir / 'index.pickle'
+
+    @property
+    def words_file_path(self):
+        return self.cache_dir / 'words.pickle'
+
+    @property
+    def completion_file_path(self):
+        """What shell completion needs, in plain text, see kaban.completion."""
+        return self.cache_dir / 'completion.txt'
+
+    @property
+    def schedule_file_path(self):
+        return self.cache_dir / 'schedule.pickle'
+
+    def field_index_path(self, field):
+        return self.cache_dir / f'fields-{field}.pickle'
+
+    @property
+    def stats_file_path(self):
+        return self.cache_dir / 'stats.pickle'
+
+    @property
+    def history_file_path(self):
+        return self.cache_dir / 'history.jsonl'
+
+    @property
+    def socket_file_path(self):
+        """Where `kaban serve` listens for commands."""
+        return self.cache_dir / 'kaban.sock'
+
+    @property
+    def sync_file_path(self):
+        return self.cache_dir / 'sync.json'
+
+    @property
+    def sync_lock_path(self):
+        return self.cache_dir / 'sync.lock'
+
+    @property
+    def maintenance_file_path(self):
+        return self.cache_dir / 'maintenance.json'
+
+    @property
+    def maintenance_lock_path(self):
+        return self.cache_dir / 'maintenance.lock'
+
+    @property
+    def journal_file_path(self):
+        """Changes not committed yet, definitely not throwaway."""
+        return Path(self.kaban_dir) / '.journal.jsonl'
+
+    @property
+    def undo_file_path(self):
+        return Path(self.kaban_dir) / '.undo.json'
+
+    @property
+    def registry_file_path(self):
+        """The other kaban repos `--all` works across, see kaban.registry."""
+        return Path(self.kaban_dir) / '.repos.json'
+
+    @property
+    def timelog_file_path(self):
+        """Time logged but not folded into the tasks yet, not throwaway either."""
+        return Path(self.kaban_dir) / '.timelog.jsonl'
+
+    @property
+    def timer_file_path(self):
+        return Path(self.kaban_dir) / '.timer.json'
+
+    @property
+    def timelog_totals_path(self):
+        return self.cache_dir / 'timelog.pickle'
+
+
+# what kaban keeps next to the task files for itself, none of which belongs in git
+IGNORED_FILES = [ '.cache/'
+                , '.journal.jsonl'
+                , '.journal.jsonl.*'
+                , '.undo.json'
+                , '.timelog.jsonl'
+                , '.timelog.jsonl.*'
+                , '.timer.json'
+                , '.repos.json'
+                , '*.tmp'
+                ]
 
 _DEFAULT_KABAN_DIR = Path.home() / '.kaban'
 
-DEFAULT_PATHS = Paths( _DEFAULT_KABAN_DIR
-                     , _DEFAULT_KABAN_DIR / 'my_kaban_tasks.toml'
-                     , _DEFAULT_KABAN_DIR / 'my_kaban_tasks.yaml'
-                     , _DEFAULT_KABAN_DIR / 'config.toml'
-                     )
+DEFAULT_PATHS = Paths.for_dir(_DEFAULT_KABAN_DIR)
 
 # KABAN_DIR = Path.home() / '.kaban'
 
@@ -0,0 +1,148 @@
+"""A table of everything that's ever been committed, so `kaban hist` never has to walk the history.
+
+Every committed operation gets a row in the history index, one JSON object per line:
+    {"commit": "...", "time": ..., "message": "...", "bags": [...], "tasks": [...]}
+listing the titles of the bags and tasks it touched. A commit that didn't come out of
+the journal (`kaban init`, or something committed by hand) gets a single row with its
+summary line for a message.
+
+Rows are only ever appended, oldest first, picking up after the last commit indexed,
+and they're read back newest first from the end of the file. So showing the latest
+changes costs the same however long the history is. If the history has been rewritten
+under us (a `git reset`, say) the index is thrown away and built again from scratch.
+"""
+
+import json
+import os
+
+from kaban.journal import parse_commit_message
+
+
+# bump this whenever the rows change shape
+HISTORY_VERSION = 1
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def touched(operation):
+    """Titles of the bags and of the tasks an operation changed, in order of appearance."""
+    bags, tasks = [], []
+    def note(titles, title):
+        if title is not None and title not in titles:
+            titles.append(title)
+    for change in operation['changes']:
+        note(bags, change.get('bag_title'))
+        note(tasks, change.get('task_title'))
+        if 'task' in change:
+            is_bag = len(change['path']) == 1 and 'tasks' in change['task']
+            note(bags if is_bag else tasks, change['task'].get('title'))
+        if change.get('field') == 'title':
+            # renamed, so it goes by both titles
+            note(tasks if 'task_title' in change else bags, change['new'])
+    for title in operation.get('bulk', {}).get('bags', []):
+        # too many changes to spell out, but the bags they went into are noted
+        note(bags, title)
+    return bags, tasks
+
+
+def operation_row(operation, commit=None):
+    """The row for an operation, committed or not."""
+    bags, tasks = touched(operation)
+    return { 'commit': commit, 'time': operation['time'], 'message': operation['message']
+           , 'bags': bags, 'tasks': tasks
+           }
+
+
+def commit_rows(commit, commit_time, message):
+    """The rows for a commit, one per operation in it."""
+    operations = parse_commit_message(message)
+    if not operations:
+        return [{'commit': commit, 'time': commit_time, 'message': message.split('\n')[0], 'bags': [], 'tasks': []}]
+    return [operation_row(operation, commit) for operation in operations]
+
+
+def _lines_newest_first(path):
+    """The lines of a file from the last one backwards, read a block at a time from the end."""
+    with open(path, 'rb') as history_file:
+        position = history_file.seek(0, os.SEEK_END)
+        rest = b''
+        while position > 0:
+            size = min(READ_BLOCK_SIZE, position)
+            position -= size
+            history_file.seek(position)
+            lines = (history_file.read(size) + rest).split(b'\n')
+            # the first one may well be the tail end of a line in the block before
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if rest:
+            yield rest
+
+
+def _indexed_tip(path):
+    """The last commit in the index, None if there's none yet. Raises ValueError if the
+    index isn't one we can extend."""
+    with open(path, 'rb') as history_file:
+        if json.loads(history_file.readline()) != {'version': HISTORY_VERSION}:
+            raise ValueError
+    last_row = json.loads(next(_lines_newest_first(path)))
+    return last_row.get('commit')
+
+
+def update_history(path, repo):
+    """Index whatever has been committed since the last time, return how many commits that was."""
+    head = repo.head_commit()
+    try:
+        tip = _indexed_tip(path)
+    except (OSError, ValueError, KeyError):
+        tip = None  # missing, truncated or outdated
+        rebuild = True
+    else:
+        rebuild = False
+    if head is None or (tip == head and not rebuild):
+        return 0
+    if tip is not None and not repo.is_ancestor(tip):
+        # what we've indexed is no longer history
+        tip = None
+        rebuild = True
+    commits = repo.log(since=tip)
+    lines = [json.dumps(row, ensure_ascii=False) + '\n' for commit in commits for row in commit_rows(*commit)]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if rebuild:
+        temp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as history_file:
+            history_file.write(json.dumps({'version': HISTORY_VERSION}) + '\n')
+            history_file.writelines(lines)
+        os.replace(temp_path, path)
+    else:
+        with open(path, 'a', encoding='utf-8') as history_file:
+            history_file.writelines(lines)
+    return len(commits)
+
+
+def iter_history(path):
+    """Rows of the index, latest first."""
+    try:
+        for line in _lines_newest_first(path):
+            row = json.loads(line)
+            if 'commit' in row:
+                yield row
+    except FileNotFoundError:
+        return
+
+
+def select_rows(rows, since=None, bag=None, task=None):
+    """Rows (latest first) since a Unix timestamp, touching a bag or task with the given
+    text in its title."""
+    def mentions(titles, text):
+        return any(text.casefold() in title.casefold() for title in titles)
+    for row in rows:
+        if since is not None and row['time'] < since:
+            # rows are in commit order, a backdated or merged commit can be older than the ones before it
+            continue
+        if bag is not None and not mentions(row['bags'], bag):
+            continue
+        if task is not None and not mentions(row['tasks'], task):
+            continue
+        yield row
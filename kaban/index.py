@@ -0,0 +1,359 @@
+"""Lookup structures over task and bag titles and notes, and over the fields tasks can be
+sorted by, kept up to date as tasks change.
+
+Tasks are identified by (bag title, task title) here, with '' for the top level,
+since positions shift around too much to be worth persisting.
+"""
+
+import bisect
+import gc
+import os
+import pickle
+import re
+from dataclasses import replace
+from datetime import datetime, time, timedelta
+
+from kaban.cache import dir_fingerprint, fingerprint
+from kaban.data import DURATION_FIELDS, KabanBag
+from kaban.journal import decode_task, decode_value
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+def _fingerprint_or_none(filepath):
+    try:
+        return fingerprint(filepath)
+    except FileNotFoundError:
+        return None
+
+
+class KabanIndex:
+    """A sorted title list for prefix lookups plus an inverted index of the words in titles and notes."""
+
+    def __init__(self):
+        # sorted (casefolded title, bag title, title) triples, duplicates allowed
+        self.titles = []
+        # sorted (casefolded title, title) pairs
+        self.bags = []
+        # word -> {(bag title, title): how many such tasks mention the word}
+        self.words = {}
+
+    @classmethod
+    def build(cls, data):
+        index = cls()
+        for item in data:
+            if isinstance(item, KabanBag):
+                index.add_bag(item)
+            else:
+                index.add_task('', item)
+        return index
+
+    def _words_of(self, task):
+        return set(tokenize(task.title) + tokenize(task.notes or ''))
+
+    def add_task(self, bag_title, task):
+        bisect.insort(self.titles, (task.title.casefold(), bag_title, task.title))
+        # one key object for all words keeps the pickled index a lot smaller
+        key = (bag_title, task.title)
+        for word in self._words_of(task):
+            postings = self.words.setdefault(word, {})
+            postings[key] = postings.get(key, 0) + 1
+
+    def remove_task(self, bag_title, task):
+        entry = (task.title.casefold(), bag_title, task.title)
+        position = bisect.bisect_left(self.titles, entry)
+        if position < len(self.titles) and self.titles[position] == entry:
+            del self.titles[position]
+        key = (bag_title, task.title)
+        for word in self._words_of(task):
+            postings = self.words.get(word, {})
+            if postings.get(key, 0) > 1:
+                postings[key] -= 1
+            else:
+                postings.pop(key, None)
+                if not postings:
+                    self.words.pop(word, None)
+
+    def add_bag(self, bag):
+        bisect.insort(self.bags, (bag.title.casefold(), bag.title))
+        for task in bag:
+            self.add_task(bag.title, task)
+
+    def remove_bag(self, bag):
+        entry = (bag.title.casefold(), bag.title)
+        position = bisect.bisect_left(self.bags, entry)
+        if position < len(self.bags) and self.bags[position] == entry:
+            del self.bags[position]
+        for task in bag:
+            self.remove_task(bag.title, task)
+
+    def _prefix_range(self, entries, prefix):
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(entries, (prefix,))
+        # every string starting with the prefix sorts before prefix + the largest code point
+        end = bisect.bisect_left(entries, (prefix + '\U0010ffff',))
+        return entries[start:end]
+
+    def complete(self, prefix, limit=None):
+        """Task and bag titles starting with `prefix`, case-insensitive."""
+        matches = [title for _, title in self._prefix_range(self.bags, prefix)]
+        matches += [entry[2] for entry in self._prefix_range(self.titles, prefix)]
+        # the same title may well be in several bags
+        matches = list(dict.fromkeys(matches))
+        return matches[:limit] if limit is not None else matches
+
+    def find(self, title):
+        """All (bag title, title) pairs of tasks with exactly this title, case-insensitive."""
+        folded = title.casefold()
+        return [(bag_title, task_title) for _, bag_title, task_title
+                in self._prefix_range(self.titles, folded) if task_title.casefold() == folded]
+
+    def grep(self, query):
+        """All (bag title, title) pairs of tasks whose title or notes contain every word in the query."""
+        words = tokenize(query)
+        if not words:
+            return []
+        # start from the rarest word so the intersection stays small
+        postings = sorted((self.words.get(word, {}) for word in words), key=len)
+        matches = set(postings[0])
+        for more in postings[1:]:
+            matches &= more.keys()
+        return sorted(matches)
+
+    def needs_data(self, change):
+        """Does `apply_change` have to look at the tasks to set a field? Not if it's a field
+        the index doesn't care about."""
+        return change['field'] in ['title', 'notes']
+
+    def apply_change(self, data, change):
+        """Update the index for a journal change, before it gets applied to `data`.
+        An annotated insert or remove can do without `data`, pass None for it."""
+        path = change['path']
+        bag_title = (data[path[0]].title if data is not None else change['bag_title']) if len(path) == 2 else ''
+        if change['change'] in ['insert', 'remove']:
+            task = decode_task(change['task'])
+            if isinstance(task, KabanBag):
+                (self.add_bag if 'insert' == change['change'] else self.remove_bag)(task)
+            else:
+                (self.add_task if 'insert' == change['change'] else self.remove_task)(bag_title, task)
+        elif 'set' == change['change'] and change['field'] in ['title', 'notes']:
+            container = data if len(path) == 1 else data[path[0]]
+            task = container[path[-1]]
+            new_value = decode_value(change['field'], change['new'])
+            if isinstance(task, KabanBag):
+                if 'title' == change['field']:
+                    self.remove_bag(task)
+                    bisect.insort(self.bags, (new_value.casefold(), new_value))
+                    for bag_task in task:
+                        self.add_task(new_value, bag_task)
+            else:
+                self.remove_task(bag_title, task)
+                self.add_task(bag_title, replace(task, **{change['field']: new_value}))
+
+
+# the fields `kaban list --sortby` can sort on
+SORTABLE_FIELDS = ['date_added', 'date_last_logged', 'estimate', 'done', 'deadline']
+
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def _sort_key(value):
+    """Dates, datetimes and durations as a number of seconds: plain dates from hand-written task
+    files line up with datetimes that way, and floats pickle a lot quicker too."""
+    if isinstance(value, timedelta):
+        return value / _SECOND
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    return (value.replace(tzinfo=None) - _EPOCH) / _SECOND
+
+
+def field_value(field, key):
+    """The inverse of _sort_key, as far as a plain date goes."""
+    return timedelta(seconds=key) if field in DURATION_FIELDS else _EPOCH + timedelta(seconds=key)
+
+
+class KabanFieldIndex:
+    """The tasks in order of each sortable field, as sorted (key, bag title, title) triples
+    where the key is the value in seconds, see `field_value`. Tasks that have no value for
+    a field are left out of its list."""
+
+    def __init__(self, fields=SORTABLE_FIELDS):
+        self.fields = {field: [] for field in fields}
+
+    @classmethod
+    def build(cls, data):
+        index = cls()
+        for item in data:
+            if isinstance(item, KabanBag):
+                index.add_bag(item)
+            else:
+                index.add_task('', item)
+        return index
+
+    def _entries_of(self, bag_title, task):
+        for field, entries in self.fields.items():
+            value = getattr(task, field)
+            # no time spent, or no time estimated, is as good as no value
+            if value:
+                yield entries, (_sort_key(value), bag_title, task.title)
+
+    def add_task(self, bag_title, task):
+        for entries, entry in self._entries_of(bag_title, task):
+            bisect.insort(entries, entry)
+
+    def remove_task(self, bag_title, task):
+        for entries, entry in self._entries_of(bag_title, task):
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def add_bag(self, bag):
+        for task in bag:
+            self.add_task(bag.title, task)
+
+    def remove_bag(self, bag):
+        for task in bag:
+            self.remove_task(bag.title, task)
+
+    def first(self, field, limit=None, start=None):
+        """Up to `limit` (key, bag title, title) triples in order of the field, from `start` on."""
+        entries = self.fields[field]
+        position = bisect.bisect_left(entries, (_sort_key(start),)) if start is not None else 0
+        return entries[position:] if limit is None else entries[position:position + limit]
+
+    def last(self, field, limit=None):
+        """Up to `limit` (key, bag title, title) triples in reverse order of the field."""
+        entries = self.fields[field]
+        return entries[::-1] if limit is None else entries[:-limit - 1:-1]
+
+    def needs_data(self, change):
+        # a sortable field of a task is all in the change, see `apply_change`
+        return 'title' == change['field'] or (change['field'] in self.fields and 'task_title' not in change)
+
+    def apply_change(self, data, change):
+        """Update the index for a journal change, before it gets applied to `data`.
+        An annotated insert or remove, or setting a sortable field of a task, can do without
+        `data`, pass None for it."""
+        path = change['path']
+        bag_title = (data[path[0]].title if data is not None else change['bag_title']) if len(path) == 2 else ''
+        if change['change'] in ['insert', 'remove']:
+            task = decode_task(change['task'])
+            if isinstance(task, KabanBag):
+                (self.add_bag if 'insert' == change['change'] else self.remove_bag)(task)
+            else:
+                (self.add_task if 'insert' == change['change'] else self.remove_task)(bag_title, task)
+        elif 'set' == change['change'] and data is None:
+            field = change['field']
+            if field in self.fields:
+                entries = self.fields[field]
+                old_value, new_value = decode_value(field, change['old']), decode_value(field, change['new'])
+                if old_value:
+                    entry = (_sort_key(old_value), bag_title, change['task_title'])
+                    position = bisect.bisect_left(entries, entry)
+                    if position < len(entries) and entries[position] == entry:
+                        del entries[position]
+                if new_value:
+                    bisect.insort(entries, (_sort_key(new_value), bag_title, change['task_title']))
+        elif 'set' == change['change'] and change['field'] in SORTABLE_FIELDS + ['title']:
+            container = data if len(path) == 1 else data[path[0]]
+            task = container[path[-1]]
+            new_value = decode_value(change['field'], change['new'])
+            if isinstance(task, KabanBag):
+                if 'title' == change['field']:
+                    self.remove_bag(task)
+                    for bag_task in task:
+                        self.add_task(new_value, bag_task)
+            else:
+                self.remove_task(bag_title, task)
+                self.add_task(bag_title, replace(task, **{change['field']: new_value}))
+
+
+def index_key(paths):
+    """What the index is derived from: the task file or files. The changes in the journal are
+    gone through again whenever it's loaded, see `KabanControl._caught_up`."""
+    return _fingerprint_or_none(paths.toml_file_path), dir_fingerprint(paths.shard_dir)
+
+
+def _save_part(filepath, key, part):
+    temp_path = filepath.with_name(filepath.name + f'.{os.getpid()}.tmp')
+    with open(temp_path, 'wb') as index_file:
+        pickle.dump(key, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(part, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path.replace(filepath)
+
+
+def _load_part(filepath, key):
+    with open(filepath, 'rb') as index_file:
+        if pickle.load(index_file) != key:
+            return None
+        # the cycle collector has nothing to find in here, and it can easily double the load time
+        gc.disable()
+        try:
+            return pickle.load(index_file)
+        finally:
+            gc.enable()
+
+
+def load_index(paths, words=True):
+    """The persisted index if it's still up to date, None otherwise.
+    Titles and words are stored separately, completion and title lookups can do without
+    the latter. Such an index has `words` set to None and is not to be saved."""
+    key = index_key(paths)
+    try:
+        index = KabanIndex()
+        parts = _load_part(paths.index_file_path, key)
+        if parts is None:
+            return None
+        index.titles, index.bags = parts
+        if words:
+            index.words = _load_part(paths.words_file_path, key)
+            if index.words is None:
+                return None
+        else:
+            index.words = None
+        return index
+    except Exception:
+        # missing, corrupt or from an older kaban, all the same to us
+        return None
+
+
+def save_index(paths, index):
+    assert index.words is not None
+    key = index_key(paths)
+    try:
+        paths.index_file_path.parent.mkdir(parents=True, exist_ok=True)
+        _save_part(paths.index_file_path, key, (index.titles, index.bags))
+        _save_part(paths.words_file_path, key, index.words)
+    except OSError:
+        pass  # we'll just rebuild it next time
+
+
+def load_field_index(paths, fields=SORTABLE_FIELDS):
+    """The persisted field index if it's still up to date, None otherwise.
+    Every field is stored separately, so looking something up in one of them doesn't
+    cost loading them all. An index with only some of the fields is not to be saved."""
+    key = index_key(paths)
+    index = KabanFieldIndex(fields)
+    try:
+        for field in fields:
+            index.fields[field] = _load_part(paths.field_index_path(field), key)
+            if index.fields[field] is None:
+                return None
+    except Exception:
+        return None
+    return index
+
+
+def save_field_index(paths, index):
+    assert len(index.fields) == len(SORTABLE_FIELDS)
+    key = index_key(paths)
+    try:
+        paths.cache_dir.mkdir(parents=True, exist_ok=True)
+        for field, entries in index.fields.items():
+            _save_part(paths.field_index_path(field), key, entries)
+    except OSError:
+        pass  # we'll just rebuild it next time
@@ -0,0 +1,233 @@
+"""Append-only log of changes that haven't been written to the task file and committed yet.
+
+Mutating commands append one operation per command to the journal, which is O(1)
+no matter how many tasks there are. Every so often (or on `kaban flush`) all pending
+operations get written to the task file in one go and committed together.
+
+An operation is a JSON object on a single line:
+    {"id": ..., "time": ..., "message": "...", "changes": [...]}
+where each change is one of
+    {"change": "insert", "path": [...], "task": {...}}
+    {"change": "remove", "path": [...], "task": {...}}
+    {"change": "set",    "path": [...], "field": "...", "old": ..., "new": ...}
+and a path is [i] for the i-th item at the top level or [i, j] for the j-th task in bag i.
+Changes may also carry the "bag_title" and "task_title" they were made to, for the
+history index's sake (see kaban.history), the path is all they need to be applied.
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from kaban import trace
+from kaban.data import DURATION_FIELDS, KabanBag, _to_document, task_from_document
+
+
+DATE_FIELDS = ['date_added', 'date_last_logged', 'deadline', 'next_due']
+
+
+def encode_value(field, value):
+    """Make a task field value JSON friendly."""
+    if value is None:
+        return None
+    if field in DURATION_FIELDS:
+        return value / timedelta(hours=1)
+    if field in DATE_FIELDS:
+        return value.isoformat()
+    return value
+
+
+def decode_value(field, value):
+    """The inverse of encode_value."""
+    if value is None:
+        return None
+    if field in DURATION_FIELDS:
+        return timedelta(hours=value)
+    if field in DATE_FIELDS:
+        # plain dates are what you get from hand-written task files
+        return date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+    return value
+
+
+def encode_task(task):
+    """A task or bag as a JSON friendly dict."""
+    def encode_dates(table):
+        for field in DATE_FIELDS:
+            if field in table:
+                table[field] = encode_value(field, table[field])
+        for bag_task in table.get('tasks', []):
+            encode_dates(bag_task)
+        return table
+    return encode_dates(_to_document(task))
+
+
+def decode_task(table):
+    """The inverse of encode_task."""
+    def decode_dates(table):
+        table = dict(table)
+        for field in DATE_FIELDS:
+            if field in table:
+                table[field] = decode_value(field, table[field])
+        if 'tasks' in table:
+            table['tasks'] = [decode_dates(bag_task) for bag_task in table['tasks']]
+        return table
+    return task_from_document(decode_dates(table))
+
+
+def _container(data, path):
+    """The list that the last index of the path refers into."""
+    return data if len(path) == 1 else data[path[0]]
+
+
+def annotate_change(data, change):
+    """Note down the titles of the bag and the task a change is about, before it's applied."""
+    if 'bag_title' in change or 'task_title' in change:
+        return  # an undo or a redo, it's about the same things as the original
+    path = change['path']
+    if len(path) > 1:
+        change['bag_title'] = data[path[0]].title
+    if 'set' == change['change']:
+        target = _container(data, path)[path[-1]]
+        change['bag_title' if isinstance(target, KabanBag) else 'task_title'] = target.title
+
+
+def apply_changes(data, changes):
+    """Perform the changes of an operation on the data model."""
+    for change in changes:
+        path = change['path']
+        container = _container(data, path)
+        if 'insert' == change['change']:
+            container.insert(path[-1], decode_task(change['task']))
+        elif 'remove' == change['change']:
+            container.pop(path[-1])
+        elif 'set' == change['change']:
+            setattr(container[path[-1]], change['field'], decode_value(change['field'], change['new']))
+        else:
+            assert False
+
+
+def invert_changes(changes):
+    """Return the changes that undo the given ones."""
+    inverse = []
+    for change in reversed(changes):
+        if 'insert' == change['change']:
+            inverse.append(dict(change, change='remove'))
+        elif 'remove' == change['change']:
+            inverse.append(dict(change, change='insert'))
+        elif 'set' == change['change']:
+            inverse.append(dict(change, old=change['new'], new=change['old']))
+        else:
+            assert False
+    return inverse
+
+
+def new_operation(message, changes, **extra):
+    return dict(id=uuid.uuid4().hex, time=time.time(), message=message, changes=changes, **extra)
+
+
+def format_commit_message(operations):
+    """Commit message for a batch of operations: a summary line and every operation verbatim,
+    so the history alone is enough to undo them one by one later."""
+    summary = operations[0]['message']
+    if len(operations) > 1:
+        summary += f" (+{len(operations) - 1} more)"
+    body = '\n'.join(json.dumps(operation, ensure_ascii=False) for operation in operations)
+    return summary + '\n\n' + body + '\n'
+
+
+def parse_commit_message(message):
+    """The operations recorded in a commit message by format_commit_message."""
+    operations = []
+    for line in message.split('\n')[2:]:
+        if line.startswith('{'):
+            try:
+                operations.append(json.loads(line))
+            except ValueError:
+                pass  # someone's been hand-editing history
+    return operations
+
+
+class KabanJournal:
+    """The file of pending operations."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def flushing_path(self):
+        """Where the journal goes while it's being flushed, in case we crash halfway."""
+        return self.path.with_name(self.path.name + '.flushing')
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as journal_file:
+                lines = journal_file.readlines()
+        except FileNotFoundError:
+            return []
+        operations = []
+        for line in lines:
+            try:
+                operations.append(json.loads(line))
+            except ValueError:
+                # a torn write from a crash
+                continue
+        return operations
+
+    def pending(self):
+        return self._read(self.path)
+
+    def append(self, operation):
+        """Record an operation, a single small write however big the task file is."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(operation, ensure_ascii=False) + '\n'
+        with open(self.path, 'ab+') as journal_file:
+            # make sure a torn line left by a crash doesn't swallow this one too
+            if journal_file.tell() > 0:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b'\n':
+                    line = '\n' + line
+            journal_file.write(line.encode('utf-8'))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        trace.count('journal appends')
+
+    def drop_last(self):
+        """Forget the most recent pending operation and return it."""
+        operations = self.pending()
+        if not operations:
+            return None
+        with open(self.path, 'rb+') as journal_file:
+            content = journal_file.read()
+            # cut right after the second to last newline
+            journal_file.truncate(content.rstrip(b'\n').rfind(b'\n') + 1)
+        return operations[-1]
+
+    def rewrite(self, operations):
+        """Make these the pending operations, whatever was journaled before."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as journal_file:
+            for operation in operations:
+                journal_file.write(json.dumps(operation, ensure_ascii=False) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def begin_flush(self):
+        """Set the pending operations aside for flushing and return them."""
+        os.replace(self.path, self.flushing_path)
+        return self._read(self.flushing_path)
+
+    def end_flush(self):
+        self.flushing_path.unlink()
+
+    def interrupted_flush(self):
+        """Operations from a flush that never finished, if any."""
+        return self._read(self.flushing_path)
+
+    def age(self):
+        """Seconds since the oldest pending operation."""
+        operations = self.pending()
+        return time.time() - operations[0]['time'] if operations else 0
@@ -0,0 +1,171 @@
+"""Keeping the git repo tidy, so years of one commit per change don't slow kaban down.
+
+Every commit leaves a few loose objects behind, and git has to look through all of them
+(and through every pack) whenever it opens the repo or reads an object. Every so often
+they get packed up, a commit-graph is written so walking the history doesn't have to
+parse every commit, and objects nothing refers to anymore are pruned, but only once
+they're old enough that no command could still be about to use them. Refs are never
+deleted, least of all the ones under refs/kaban/ that `kaban undo` relies on: they're
+checked before and after, and put back if anything went missing.
+
+`kaban gc` does it right away. Other commands that touched git check whether it's due,
+which only takes a peek at two directories, and if so start a detached worker
+(`python -m kaban.maintenance KABAN_DIR`) to do it, much like kaban.sync pushes.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from kaban import worker
+from kaban.defaults import Paths
+from kaban.repo import KabanRepo
+from kaban.worker import worker_alive
+
+
+# tidy up once there are about this many loose objects, a few hundred commits' worth...
+LOOSE_LIMIT = 1000
+# ...or this many packs, which is when they get packed into a single one
+PACK_LIMIT = 10
+# but no more than once a day on our own
+MIN_INTERVAL = 24 * 60 * 60
+
+# unreachable objects younger than this stay, a command running right now may be about to refer to them
+PRUNE_EXPIRE = '2.weeks.ago'
+
+# refs we'd never let go of
+KEPT_REF_PREFIX = 'refs/kaban/'
+
+
+def estimate_loose(kaban_dir):
+    """Roughly how many loose objects there are, going by one of the 256 directories they're in,
+    the same way `git gc --auto` does."""
+    try:
+        return len(os.listdir(Path(kaban_dir) / '.git' / 'objects' / '17')) * 256
+    except OSError:
+        return 0
+
+
+def count_packs(kaban_dir):
+    try:
+        return sum(name.endswith('.pack') for name in os.listdir(Path(kaban_dir) / '.git' / 'objects' / 'pack'))
+    except OSError:
+        return 0
+
+
+def load_state(paths):
+    """What we know about tidying up so far: see `save_state`."""
+    return worker.load_state(paths.maintenance_file_path)
+
+
+def save_state(paths, state):
+    """Atomically write the maintenance state. The keys are
+    last_run   \twhen the repo was last tidied up, as a Unix timestamp
+    last_error \twhat git had to say if something went wrong then
+    worker     \tpid of the worker process tidying up right now, if any"""
+    worker.save_state(paths.maintenance_file_path, state)
+
+
+def gc_due(state, loose, packs, now=None):
+    """Has enough piled up since the last time, and has it been long enough?"""
+    now = time.time() if now is None else now
+    if loose < LOOSE_LIMIT and packs < PACK_LIMIT:
+        return False
+    return now - state.get('last_run', 0) >= MIN_INTERVAL
+
+
+def schedule_gc(paths):
+    """Start tidying up in the background if it's due and nobody's at it already, return whether we did."""
+    loose, packs = estimate_loose(paths.kaban_dir), count_packs(paths.kaban_dir)
+    if loose < LOOSE_LIMIT and packs < PACK_LIMIT:
+        # the usual case, and we didn't even have to read the state file to know
+        return False
+    state = load_state(paths)
+    if worker_alive(state) or not gc_due(state, loose, packs):
+        return False
+    worker.start_worker(paths.maintenance_file_path, state, 'kaban.maintenance', paths.kaban_dir)
+    return True
+
+
+def tidy_up(repo, full=False):
+    """Pack loose objects, prune what's unreachable and old enough, and write the commit-graph.
+    Everything goes into a single pack if `full` or if there are too many packs, otherwise
+    only the loose objects get packed, which is a lot quicker with a long history. Return
+    the refs under refs/kaban/ that had to be put back, which should be none."""
+    kept = repo.ref_targets(KEPT_REF_PREFIX)
+    # a file per ref adds up with every undo step pinned down, one file for all of them doesn't
+    repo._git('pack-refs', '--all')
+    if full or count_packs(repo.path) >= PACK_LIMIT:
+        # -A rather than -a keeps unreachable objects around (loose) for prune to judge
+        repo._git('repack', '-A', '-d', '-q')
+    else:
+        repo._git('repack', '-d', '-q')
+    repo._git('prune', f'--expire={PRUNE_EXPIRE}')
+    try:
+        repo._git('commit-graph', 'write', '--reachable', '--split')
+    except subprocess.CalledProcessError:
+        pass  # a git from before 2.18, walking the history just stays as slow as it was
+    after = repo.ref_targets(KEPT_REF_PREFIX)
+    missing = {ref: hexsha for ref, hexsha in kept.items() if after.get(ref) != hexsha}
+    repo.update_refs(missing)
+    return sorted(missing)
+
+
+def probe(kaban_dir, runs=3):
+    """{what: milliseconds} for a few of the git operations kaban does all the time, the best of a few runs."""
+    def open_repo(repo):
+        if repo.use_gitpython:
+            repo.repo.head.commit.tree
+        else:
+            repo.head_commit()
+    probes = { 'open repo'   : open_repo
+             , 'read tree'   : lambda repo: repo._run('ls-tree', '-r', 'HEAD')
+             , 'walk history': lambda repo: repo._run('rev-list', '--count', 'HEAD')
+             , 'status'      : lambda repo: repo.is_dirty()
+             }
+    timings = {}
+    for what, operation in probes.items():
+        best = None
+        for _ in range(runs):
+            # a fresh handle every time, opening the repo is part of what we're timing
+            repo = KabanRepo(kaban_dir)
+            started = time.perf_counter()
+            operation(repo)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[what] = best
+    return timings
+
+
+def run(paths, full=False):
+    """Tidy up and keep track of it in the state file. This is what the worker runs."""
+    with worker.holding_lock(paths.maintenance_lock_path) as locked:
+        if not locked:
+            return None  # another worker has it covered
+        state = load_state(paths)
+        state['worker'] = os.getpid()
+        save_state(paths, state)
+        try:
+            restored = tidy_up(KabanRepo(paths.kaban_dir, use_gitpython=False), full)
+            state.update(last_run=time.time(), last_error=None)
+            return restored
+        except (OSError, subprocess.CalledProcessError) as error:
+            lines = (getattr(error, 'stderr', None) or str(error)).strip().splitlines()
+            state.update(last_run=time.time(), last_error=lines[-1] if lines else str(error))
+            raise
+        finally:
+            state['worker'] = None
+            save_state(paths, state)
+
+
+def main():
+    try:
+        run(Paths.for_dir(sys.argv[1]))
+    except (OSError, subprocess.CalledProcessError):
+        pass  # it's in the state file, the next `kaban gc` will tell
+
+
+if __name__ == '__main__':
+    main()
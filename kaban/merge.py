@@ -0,0 +1,296 @@
+"""Three-way merge of task stores, task by task rather than line by line.
+
+The common ancestor, our tasks and the remote's tasks are each turned into a table of
+items by identity. A task is identified by when it was added, to the microsecond, and
+its title, and a task whose title is all that changed on one side is matched back up
+with the original by when it was added alone. Then it's one field at a time: a field
+changed on one side only takes that side's value, and a field changed on both sides to
+different values is a conflict that we resolve in our own favor, reporting it. Time
+spent is the exception, what was logged on either side adds up, and the latest time
+anything was logged wins.
+
+The outcome is a list of journal changes (see kaban.journal) to apply to our tasks, so
+the merge is recorded, committed and undone like any other operation, and only the
+tasks it touches get looked at or written again. With one file per bag, the bags whose
+files are the same on all three sides aren't even read.
+"""
+
+from collections import Counter
+from dataclasses import fields
+from datetime import timedelta
+
+from kaban.data import KabanBag, KabanTask
+from kaban.journal import encode_task, encode_value
+
+
+FIELDS = [field.name for field in fields(KabanTask)]
+
+
+def _values(item):
+    return tuple(getattr(item, name) for name in FIELDS)
+
+
+def _bare_bag(bag):
+    """A copy of a bag without its tasks."""
+    return KabanBag(**{name: getattr(bag, name) for name in FIELDS})
+
+
+def merge_field(name, base, ours, theirs):
+    """The merged value of a field and whether both sides changed it in different ways."""
+    if 'done' == name:
+        # time was spent on both sides, so all of it counts
+        return max(ours + theirs - (base or timedelta(0)), timedelta(0)), False
+    if 'date_last_logged' == name:
+        logged = [value for value in [ours, theirs] if value is not None]
+        return (max(logged) if logged else None), False
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+    return ours, True
+
+
+class _Side:
+    """One version of the task store, item by item."""
+
+    def __init__(self, data, changed_files=None):
+        # (identity, item, path in `data`, title of its bag or None) with bags followed by their tasks
+        self.entries = []
+        # positions of the bags we've looked in
+        self.opened = set()
+        for position, item in enumerate(data):
+            self.entries.append(((item.date_added, item.title), item, [position], None))
+            if isinstance(item, KabanBag) and (changed_files is None or data.shard_file(item) in changed_files):
+                self.opened.add(position)
+                for index, task in enumerate(item):
+                    self.entries.append(((task.date_added, task.title), task, [position, index], item.title))
+
+    def ambiguous(self):
+        """Identities more than one task goes by."""
+        counts = Counter(key for key, item, _, _ in self.entries if not isinstance(item, KabanBag))
+        return {key for key, count in counts.items() if count > 1}
+
+    def identify(self, ambiguous):
+        """Settle on an identity for every item, telling apart the tasks in `ambiguous` by the
+        title of their bag."""
+        # identity -> task or bag
+        self.items = {}
+        # identity of a task -> identity of its bag, None at the top level
+        self.where = {}
+        # identity -> where it is in the data
+        self.paths = {}
+        self.bags = []
+        # identity of a bag -> identities of its tasks, for the bags we've looked in
+        self.contents = {}
+        bag_key = None
+        for key, item, path, bag_title in self.entries:
+            if key in ambiguous and not isinstance(item, KabanBag):
+                key += (bag_title,)
+            while key in self.items:
+                # the very same thing twice over, tell them apart by order of appearance
+                key += ('again',)
+            self.items[key] = item
+            self.paths[key] = path
+            if isinstance(item, KabanBag):
+                bag_key = key
+                self.bags.append(key)
+                if path[0] in self.opened:
+                    self.contents[key] = []
+            elif len(path) == 2:
+                self.contents[bag_key].append(key)
+                self.where[key] = bag_key
+            else:
+                self.where[key] = None
+
+    def rebase(self, base):
+        """Go by the identities in `base` for anything that has only been renamed since."""
+        def by_date(keys, side):
+            groups = {}
+            for key in keys:
+                groups.setdefault((key[0], isinstance(side.items[key], KabanBag)), []).append(key)
+            return groups
+        gone = by_date([key for key in base.items if key not in self.items], base)
+        new = by_date([key for key in self.items if key not in base.items], self)
+        renamed = {keys[0]: gone[group][0] for group, keys in new.items()
+                   if len(keys) == 1 and len(gone.get(group, [])) == 1}
+        if not renamed:
+            return
+        rekey = lambda key: renamed.get(key, key)
+        self.items = {rekey(key): item for key, item in self.items.items()}
+        self.where = {rekey(key): rekey(bag_key) if bag_key is not None else None
+                      for key, bag_key in self.where.items()}
+        self.paths = {rekey(key): path for key, path in self.paths.items()}
+        self.bags = [rekey(key) for key in self.bags]
+        self.contents = {rekey(key): [rekey(task_key) for task_key in task_keys]
+                         for key, task_keys in self.contents.items()}
+
+    def changed(self, base, key):
+        """Has the item changed since `base`, or moved to another bag?"""
+        if key not in base.items:
+            return True
+        if _values(self.items[key]) != _values(base.items[key]) or self.where.get(key) != base.where.get(key):
+            return True
+        if key in self.contents:
+            return (self.contents[key] != base.contents.get(key)
+                    or any(self.changed(base, task_key) for task_key in self.contents[key]))
+        return False
+
+
+class _Merger:
+
+    def __init__(self, base, ours, theirs):
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+        self.conflicts = []
+        # identity -> {field: new value} for the items we keep where they are
+        self.sets = {}
+        # identities of our items that go, and of the ones they're replaced with (a task
+        # moving to another bag is both)
+        self.removed = set()
+        self.inserted = []
+        # identities of the bags we end up with, and of the ones coming over from the remote
+        self.kept_bags = set()
+        self.new_bags = []
+        # bags the remote removed that we keep whole because we changed them
+        self.rescued = set()
+
+    def _describe(self, key):
+        item = (self.ours.items.get(key) or self.theirs.items.get(key))
+        return f"'{item.title}' bag" if isinstance(item, KabanBag) else f"'{item.title}'"
+
+    def _merge_fields(self, key):
+        base = self.base.items.get(key)
+        ours, theirs = self.ours.items[key], self.theirs.items[key]
+        merged = {}
+        for name in FIELDS:
+            value, conflict = merge_field(name, getattr(base, name) if base is not None else None,
+                                          getattr(ours, name), getattr(theirs, name))
+            if conflict:
+                self.conflicts.append(f"{self._describe(key)}: {name} was changed on both sides, kept yours")
+            if value != getattr(ours, name):
+                merged[name] = value
+        return merged
+
+    def merge_bags(self):
+        for key in self.ours.bags:
+            if key in self.theirs.items:
+                self.kept_bags.add(key)
+                self.sets[key] = self._merge_fields(key)
+            elif key not in self.base.items:
+                self.kept_bags.add(key)  # new on our side
+            elif self.ours.changed(self.base, key):
+                self.kept_bags.add(key)
+                self.rescued.add(key)
+                self.conflicts.append(f"{self._describe(key)}: removed on the remote but changed here, kept it")
+            else:
+                self.removed.add(key)
+        for key in self.theirs.bags:
+            if key in self.ours.items:
+                continue
+            if key in self.base.items:
+                if not self.theirs.changed(self.base, key):
+                    continue  # we removed it and that's that
+                self.conflicts.append(f"{self._describe(key)}: removed here but changed on the remote, brought it back")
+            self.kept_bags.add(key)
+            self.new_bags.append(key)
+
+    def _settle(self, bag_key, fallback):
+        """Where a task goes if it's meant to go in a bag, which might not be around anymore."""
+        if bag_key is None or bag_key in self.kept_bags:
+            return bag_key
+        return fallback if fallback is None or fallback in self.kept_bags else None
+
+    def merge_tasks(self):
+        for key, ours_bag in self.ours.where.items():
+            if key in self.theirs.items:
+                theirs_bag = self.theirs.where[key]
+                base_bag = self.base.where.get(key, ours_bag)
+                bag_key = self._settle(theirs_bag if ours_bag == base_bag else ours_bag, ours_bag)
+                merged = self._merge_fields(key)
+                if bag_key == ours_bag and ours_bag not in self.removed:
+                    self.sets[key] = merged
+                else:
+                    if ours_bag not in self.removed:
+                        self.removed.add(key)
+                    # otherwise it's moving out of a bag that's going away
+                    self.inserted.append((bag_key, key, merged))
+            elif ours_bag in self.removed:
+                pass  # goes with its bag
+            elif key not in self.base.items or ours_bag in self.rescued:
+                pass  # new on our side, or stays with its bag
+            elif self.ours.changed(self.base, key):
+                self.conflicts.append(f"{self._describe(key)}: removed on the remote but changed here, kept it")
+            else:
+                self.removed.add(key)
+        for key, theirs_bag in self.theirs.where.items():
+            if key in self.ours.items:
+                continue
+            if key in self.base.items and theirs_bag not in self.new_bags:
+                if not self.theirs.changed(self.base, key):
+                    continue  # we removed it and that's that
+                self.conflicts.append(f"{self._describe(key)}: removed here but changed on the remote, brought it back")
+            self.inserted.append((self._settle(theirs_bag, None), key, None))
+
+    def changes(self):
+        """The journal changes that turn our tasks into the merged ones, in an order that
+        they can be applied in: first the fields, then the removals from the back so no
+        path shifts under another, then insertions into bags, new bags and finally
+        top-level tasks, which shift all the bags along."""
+        changes = []
+        for key, merged in self.sets.items():
+            for name, value in merged.items():
+                changes.append({ 'change': 'set', 'path': self.ours.paths[key], 'field': name
+                               , 'old': encode_value(name, getattr(self.ours.items[key], name))
+                               , 'new': encode_value(name, value)
+                               })
+        for key in sorted(self.removed, key=lambda key: (len(self.ours.paths[key]) == 2, self.ours.paths[key]),
+                          reverse=True):
+            changes.append({'change': 'remove', 'path': self.ours.paths[key], 'task': encode_task(self.ours.items[key])})
+        # where everything that's left ends up
+        top_count = sum(1 for key, bag_key in self.ours.where.items()
+                        if bag_key is None and key not in self.removed)
+        positions = {}
+        for key in self.ours.bags:
+            if key not in self.removed:
+                positions[key] = top_count + len(positions)
+        sizes = {key: sum(1 for task_key in self.ours.contents.get(key, []) if task_key not in self.removed)
+                 for key in positions}
+        for key in self.new_bags:
+            positions[key] = top_count + len(positions)
+            sizes[key] = 0
+            changes.append({'change': 'insert', 'path': [positions[key]],
+                            'task': encode_task(_bare_bag(self.theirs.items[key]))})
+        top_inserts = []
+        for bag_key, key, merged in self.inserted:
+            task = self.theirs.items[key]
+            if merged:
+                task = KabanTask(**{name: merged.get(name, getattr(self.ours.items[key], name)) for name in FIELDS})
+            elif key in self.ours.items:
+                task = self.ours.items[key]
+            if bag_key is None:
+                top_inserts.append(task)
+                continue
+            changes.append({'change': 'insert', 'path': [positions[bag_key], sizes[bag_key]], 'task': encode_task(task)})
+            sizes[bag_key] += 1
+        for position, task in enumerate(top_inserts, start=top_count):
+            changes.append({'change': 'insert', 'path': [position], 'task': encode_task(task)})
+        return changes
+
+
+def merge_tasks(base, ours, theirs, changed_files=None):
+    """Merge the tasks of two versions of a task store (KabanData) that have `base` in common.
+    Return the journal changes that get `ours` there and a list of the conflicts we ran into.
+    For sharded task stores pass the names of the files that changed on either side, the
+    bags in the others are the same everywhere and nobody needs to look at them."""
+    sides = [_Side(data, changed_files) for data in [base, ours, theirs]]
+    ambiguous = set().union(*(side.ambiguous() for side in sides))
+    for side in sides:
+        side.identify(ambiguous)
+    base, ours, theirs = sides
+    ours.rebase(base)
+    theirs.rebase(base)
+    merger = _Merger(base, ours, theirs)
+    merger.merge_bags()
+    merger.merge_tasks()
+    return merger.changes(), merger.conflicts
@@ -0,0 +1,218 @@
+"""Recurring tasks: rules parsed once, and a priority queue of when each task is due again.
+
+A recurring task has a rule in its `recurring` field, like 'daily', 'weekly' or
+'every 3 days', and the date its next instance is due in `next_due`. Whenever that
+date comes, a copy of the task without the rule gets added at the end of its bag (or of
+the top level), one for every time it came due if kaban hasn't run in a while, and
+`next_due` moves on.
+
+The queue is derived from the tasks like the indexes are, and kept in the cache. The
+earliest due date is stored up front, so checking whether anything is due doesn't
+even load the queue, let alone the tasks.
+"""
+
+import calendar
+import functools
+import gc
+import heapq
+import os
+import pickle
+import re
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+
+from kaban.data import KabanBag
+from kaban.index import index_key
+from kaban.journal import decode_task, decode_value
+
+
+# no more than this many instances of the same task in one go, however long it's been
+MAX_CATCH_UP = 100
+
+_UNITS = {'day': 'days', 'week': 'weeks', 'month': 'months', 'year': 'years'}
+_ADVERBS = {'daily': 'days', 'weekly': 'weeks', 'monthly': 'months', 'yearly': 'years', 'annually': 'years'}
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Every `interval` days, weeks, months or years."""
+    unit: str
+    interval: int = 1
+
+    def next_after(self, day):
+        """The first day the rule comes due after the given one."""
+        if 'days' == self.unit:
+            return day + timedelta(days=self.interval)
+        if 'weeks' == self.unit:
+            return day + timedelta(weeks=self.interval)
+        months = self.interval * (12 if 'years' == self.unit else 1)
+        year, month = divmod(day.month - 1 + months, 12)
+        year += day.year
+        # the 31st of a month without one falls on its last day
+        return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rule(text):
+    """The Rule for a `recurring` value like 'weekly' or 'every 2 weeks', None if it isn't one."""
+    text = ' '.join(str(text).lower().split())
+    if text in _ADVERBS:
+        return Rule(_ADVERBS[text])
+    match = re.fullmatch(r'every (\d+ )?(day|week|month|year)s?', text)
+    if match is None:
+        return None
+    interval = int(match.group(1) or 1)
+    return Rule(_UNITS[match.group(2)], interval) if interval > 0 else None
+
+
+def first_due(task):
+    """When the next instance of a recurring task is due, None if it doesn't recur."""
+    rule = parse_rule(task.recurring) if task.recurring else None
+    if rule is None:
+        return None
+    if task.next_due is not None:
+        return task.next_due
+    # hand-written tasks won't have it, go by when they were added
+    added = task.date_added
+    return rule.next_after(added if type(added) is date else added.date())
+
+
+def due_dates(task, today):
+    """Every day an instance of the task came due up to and including today, and the next
+    due date after those."""
+    rule = parse_rule(task.recurring)
+    days = []
+    day = first_due(task)
+    while day <= today and len(days) < MAX_CATCH_UP:
+        days.append(day)
+        day = rule.next_after(day)
+    while day <= today:
+        day = rule.next_after(day)
+    return days, day
+
+
+class KabanSchedule:
+    """A heap of (due date ordinal, bag title, title) for every recurring task."""
+
+    def __init__(self):
+        self.heap = []
+
+    @classmethod
+    def build(cls, data):
+        schedule = cls()
+        for item in data:
+            if isinstance(item, KabanBag):
+                schedule.add_bag(item)
+            else:
+                schedule.add_task('', item)
+        return schedule
+
+    def _entry(self, bag_title, task):
+        due = first_due(task)
+        return None if due is None else (due.toordinal(), bag_title, task.title)
+
+    def add_task(self, bag_title, task):
+        entry = self._entry(bag_title, task)
+        if entry is not None:
+            heapq.heappush(self.heap, entry)
+
+    def remove_task(self, bag_title, task):
+        entry = self._entry(bag_title, task)
+        if entry is not None and entry in self.heap:
+            self.heap.remove(entry)
+            heapq.heapify(self.heap)
+
+    def add_bag(self, bag):
+        for task in bag:
+            self.add_task(bag.title, task)
+
+    def remove_bag(self, bag):
+        for task in bag:
+            self.remove_task(bag.title, task)
+
+    def earliest(self):
+        """The earliest due date as an ordinal, None if nothing recurs."""
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, today):
+        """(bag title, title) of the tasks due by today, earliest first. They stay in the queue
+        until the changes that move them on are applied."""
+        # only walk down the heap as far as it's due, never mind the rest of it
+        limit = today.toordinal()
+        found = []
+        positions = [0]
+        while positions:
+            position = positions.pop()
+            if position < len(self.heap) and self.heap[position][0] <= limit:
+                found.append(self.heap[position])
+                positions += [2 * position + 1, 2 * position + 2]
+        return [(bag_title, title) for _, bag_title, title in sorted(found)]
+
+    def needs_data(self, change):
+        return change['field'] in ['title', 'recurring', 'next_due', 'date_added']
+
+    def apply_change(self, data, change):
+        """Update the queue for a journal change, before it gets applied to `data`.
+        An annotated insert or remove can do without `data`, pass None for it."""
+        path = change['path']
+        bag_title = (data[path[0]].title if data is not None else change['bag_title']) if len(path) == 2 else ''
+        if change['change'] in ['insert', 'remove']:
+            task = decode_task(change['task'])
+            if isinstance(task, KabanBag):
+                (self.add_bag if 'insert' == change['change'] else self.remove_bag)(task)
+            else:
+                (self.add_task if 'insert' == change['change'] else self.remove_task)(bag_title, task)
+        elif 'set' == change['change'] and change['field'] in ['title', 'recurring', 'next_due', 'date_added']:
+            container = data if len(path) == 1 else data[path[0]]
+            task = container[path[-1]]
+            new_value = decode_value(change['field'], change['new'])
+            if isinstance(task, KabanBag):
+                if 'title' == change['field']:
+                    self.remove_bag(task)
+                    for bag_task in task:
+                        self.add_task(new_value, bag_task)
+            else:
+                self.remove_task(bag_title, task)
+                self.add_task(bag_title, replace(task, **{change['field']: new_value}))
+
+
+def load_earliest(paths):
+    """Just the earliest due date from the persisted queue: an ordinal, None if nothing recurs,
+    or False if the queue is out of date."""
+    try:
+        with open(paths.schedule_file_path, 'rb') as schedule_file:
+            if pickle.load(schedule_file) != index_key(paths):
+                return False
+            return pickle.load(schedule_file)
+    except Exception:
+        return False
+
+
+def load_schedule(paths):
+    """The persisted queue if it's still up to date, None otherwise."""
+    try:
+        with open(paths.schedule_file_path, 'rb') as schedule_file:
+            if pickle.load(schedule_file) != index_key(paths):
+                return None
+            pickle.load(schedule_file)
+            gc.disable()
+            try:
+                schedule = KabanSchedule()
+                schedule.heap = pickle.load(schedule_file)
+                return schedule
+            finally:
+                gc.enable()
+    except Exception:
+        return None
+
+
+def save_schedule(paths, schedule):
+    try:
+        paths.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = paths.schedule_file_path.with_name(paths.schedule_file_path.name + f'.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as schedule_file:
+            for part in [index_key(paths), schedule.earliest(), schedule.heap]:
+                pickle.dump(part, schedule_file, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path.replace(paths.schedule_file_path)
+    except OSError:
+        pass  # we'll just rebuild it next time
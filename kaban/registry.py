@@ -0,0 +1,41 @@
+"""The kaban repos `--all` works across, for when work, home and the team each have their own.
+
+The registry is a little JSON file next to the default repo's journal, {name: directory},
+local to this machine like the directories in it. Commands given `--all` run in every
+repo in it at once, each in a process of its own (see `KabanControl._across_repos`), so
+pulling or pushing five repos takes about as long as the slowest of them.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from kaban.defaults import Paths
+
+
+# no more repos than this at the same time, the rest wait for one of them to be done
+MAX_WORKERS = 16
+
+
+def is_kaban_dir(kaban_dir):
+    paths = Paths.for_dir(kaban_dir)
+    return paths.toml_file_path.exists() or paths.manifest_file_path.exists()
+
+
+def load_registry(path):
+    """{name: kaban dir} of the registered repos, sorted by name."""
+    try:
+        with open(path, 'r', encoding='utf-8') as registry_file:
+            repos = json.load(registry_file)
+    except FileNotFoundError:
+        return {}
+    return dict(sorted(repos.items()))
+
+
+def save_registry(path, repos):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as registry_file:
+        json.dump(dict(sorted(repos.items())), registry_file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
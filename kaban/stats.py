@@ -0,0 +1,192 @@
+"""Progress statistics, per-bag rollups kept up to date as tasks change plus whole-repo analytics.
+
+The rollups are what `kaban status BAG` reports from, so it costs the same however many
+tasks there are. Anything that needs to look at each task (like how estimates compare
+to the time actually spent, bag by bag) is computed in one go over columns of numbers
+pulled out of the tasks, see `ratio_columns`.
+"""
+
+import math
+import statistics
+from array import array
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+
+from kaban.data import KabanBag
+from kaban.index import _load_part, _save_part, index_key
+from kaban.journal import decode_task, decode_value
+
+
+# durations are summed as whole microseconds, floats would drift as tasks come and go
+_MICROSECOND = timedelta(microseconds=1)
+
+# estimate/actual ratios are bucketed by powers of two, from 1/16 to 16 times
+RATIO_BUCKETS = range(-4, 5)
+
+
+def _ratio_bucket(done, estimate):
+    return min(max(round(math.log2(done / estimate)), RATIO_BUCKETS[0]), RATIO_BUCKETS[-1])
+
+
+@dataclass
+class Rollup:
+    """Running totals over the tasks of a bag, or of the top level."""
+    count: int = 0
+    # tasks with an estimate, and their estimates summed
+    estimated: int = 0
+    estimate: int = 0
+    # time spent on all tasks, and on estimated tasks capped at their estimate
+    done: int = 0
+    done_toward_estimate: int = 0
+    # ratio bucket -> how many estimated tasks took about that many times their estimate
+    ratios: dict = field(default_factory=dict)
+    # date_added as an ordinal -> how many tasks were added that day
+    added: dict = field(default_factory=dict)
+
+    def add(self, task, sign=1):
+        """Count a task in, or out again with sign=-1."""
+        self.count += sign
+        done = task.done // _MICROSECOND
+        self.done += sign * done
+        if task.estimate:
+            estimate = task.estimate // _MICROSECOND
+            self.estimated += sign
+            self.estimate += sign * estimate
+            self.done_toward_estimate += sign * min(done, estimate)
+            if done:
+                self._bump(self.ratios, _ratio_bucket(done, estimate), sign)
+        self._bump(self.added, task.date_added.toordinal(), sign)
+
+    @staticmethod
+    def _bump(counts, key, sign):
+        counts[key] = counts.get(key, 0) + sign
+        if not counts[key]:
+            del counts[key]
+
+    def progress(self):
+        """How much of the estimated work has been done, between 0 and 1. None if nothing's estimated."""
+        if not self.estimate:
+            return None
+        return self.done_toward_estimate / self.estimate
+
+    def projected_completion(self, today=None):
+        """When the estimated work will be done going at the pace so far, None if there's no telling."""
+        today = today or date.today()
+        if not self.estimate or not self.added:
+            return None
+        remaining = self.estimate - self.done_toward_estimate
+        if remaining <= 0:
+            return today
+        if not self.done_toward_estimate:
+            return None
+        days_so_far = max((today - date.fromordinal(min(self.added))).days, 1)
+        return today + timedelta(days=math.ceil(remaining * days_so_far / self.done_toward_estimate))
+
+
+class KabanStats:
+    """Rollups by bag title, with '' for the top level."""
+
+    def __init__(self):
+        self.bags = {}
+
+    @classmethod
+    def build(cls, data):
+        stats = cls()
+        for item in data:
+            if isinstance(item, KabanBag):
+                stats.add_bag(item)
+            else:
+                stats.add_task('', item)
+        return stats
+
+    def add_task(self, bag_title, task, sign=1):
+        self.bags.setdefault(bag_title, Rollup()).add(task, sign)
+
+    def remove_task(self, bag_title, task):
+        self.add_task(bag_title, task, sign=-1)
+
+    def add_bag(self, bag):
+        self.bags.setdefault(bag.title, Rollup())
+        for task in bag:
+            self.add_task(bag.title, task)
+
+    def remove_bag(self, bag):
+        for task in bag:
+            self.remove_task(bag.title, task)
+        if bag.title in self.bags and not self.bags[bag.title].count:
+            del self.bags[bag.title]
+
+    def needs_data(self, change):
+        return change['field'] in ['title', 'estimate', 'done', 'date_added']
+
+    def apply_change(self, data, change):
+        """Update the rollups for a journal change, before it gets applied to `data`.
+        An annotated insert or remove can do without `data`, pass None for it."""
+        path = change['path']
+        bag_title = (data[path[0]].title if data is not None else change['bag_title']) if len(path) == 2 else ''
+        if change['change'] in ['insert', 'remove']:
+            task = decode_task(change['task'])
+            if isinstance(task, KabanBag):
+                (self.add_bag if 'insert' == change['change'] else self.remove_bag)(task)
+            else:
+                (self.add_task if 'insert' == change['change'] else self.remove_task)(bag_title, task)
+        elif 'set' == change['change'] and change['field'] in ['title', 'estimate', 'done', 'date_added']:
+            container = data if len(path) == 1 else data[path[0]]
+            task = container[path[-1]]
+            new_value = decode_value(change['field'], change['new'])
+            if isinstance(task, KabanBag):
+                if 'title' == change['field'] and task.title in self.bags:
+                    self.bags[new_value] = self.bags.pop(task.title)
+            elif change['field'] in ['estimate', 'done', 'date_added']:
+                self.remove_task(bag_title, task)
+                self.add_task(bag_title, replace(task, **{change['field']: new_value}))
+
+
+def ratio_columns(data, by='bag'):
+    """Time spent over estimate for every task that has both, grouped by bag title or by
+    recurrence: {group: array of ratios}. The estimates and the time spent are pulled out
+    into columns of hours first, then divided column by column."""
+    groups, estimates, done = [], array('d'), array('d')
+    hour = timedelta(hours=1)
+    for item in data:
+        tasks = item if isinstance(item, KabanBag) else [item]
+        for task in tasks:
+            if task.estimate and task.done:
+                groups.append((item.title if tasks is item else '') if 'bag' == by else (task.recurring or ''))
+                estimates.append(task.estimate / hour)
+                done.append(task.done / hour)
+    ratios = array('d', map(float.__truediv__, done, estimates))
+    columns = {}
+    for group, ratio in zip(groups, ratios):
+        columns.setdefault(group, array('d')).append(ratio)
+    return columns
+
+
+def ratio_summary(ratios):
+    """Median and quartiles of some ratios, all the same if there's just the one."""
+    if len(ratios) < 2:
+        return ratios[0], ratios[0], ratios[0]
+    low, median, high = statistics.quantiles(ratios, n=4, method='inclusive')
+    return low, median, high
+
+
+def load_stats(paths):
+    """The persisted rollups if they're still up to date, None otherwise."""
+    try:
+        bags = _load_part(paths.stats_file_path, index_key(paths))
+    except Exception:
+        # missing, corrupt or from an older kaban, all the same to us
+        return None
+    if bags is None:
+        return None
+    stats = KabanStats()
+    stats.bags = bags
+    return stats
+
+
+def save_stats(paths, stats):
+    try:
+        paths.stats_file_path.parent.mkdir(parents=True, exist_ok=True)
+        _save_part(paths.stats_file_path, index_key(paths), stats.bags)
+    except OSError:
+        pass  # we'll just rebuild it next time
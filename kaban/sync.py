@@ -0,0 +1,129 @@
+"""Pushing to the remote in the background, so no command ever has to wait on the network.
+
+Commands only ever look at a little state file and, when a push is due, start a
+detached worker process (`python -m kaban.sync KABAN_DIR`, see kaban.worker) to do
+it. There is at most one worker at a time, and it keeps going until the remote has
+caught up, so any number of commits made in the meantime go out in a single push.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from kaban import worker
+from kaban.config import autopush_interval
+from kaban.defaults import Paths
+from kaban.repo import KabanRepo
+from kaban.worker import worker_alive
+
+
+# after a failed push wait a minute, then two, then four... up to six hours
+BACKOFF_BASE = 60
+BACKOFF_MAX = 6 * 60 * 60
+
+# a push that takes longer than this is as good as failed
+PUSH_TIMEOUT = 5 * 60
+
+
+def load_state(paths):
+    """What we know about syncing so far: see `save_state`."""
+    return worker.load_state(paths.sync_file_path)
+
+
+def save_state(paths, state):
+    """Atomically write the sync state. The keys are
+    pushed     \tthe last commit the remote is known to have
+    last_push  \twhen that was, as a Unix timestamp
+    failures   \thow many pushes in a row have failed since
+    retry_at   \tno pushing before this time
+    last_error \twhat git had to say about the last failure
+    worker     \tpid of the worker process pushing right now, if any"""
+    worker.save_state(paths.sync_file_path, state)
+
+
+def push_due(state, head, interval, now=None):
+    """Is there anything the remote hasn't seen, and may we push it yet?"""
+    now = time.time() if now is None else now
+    if interval is None or head is None or head == state.get('pushed'):
+        return False
+    if now < state.get('retry_at', 0):
+        return False
+    return now - state.get('last_push', 0) >= interval
+
+
+def schedule_push(paths, head, setting):
+    """Start a background push if one is due and none is running, return whether we did."""
+    state = load_state(paths)
+    if worker_alive(state) or not push_due(state, head, autopush_interval(setting)):
+        return False
+    worker.start_worker(paths.sync_file_path, state, 'kaban.sync', paths.kaban_dir, setting)
+    return True
+
+
+def _git_push(kaban_dir):
+    """Push HEAD to origin, return None on success or git's complaint if it didn't work."""
+    # never sit there waiting for a password nobody is around to type in
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+    try:
+        result = subprocess.run(['git', '-C', str(kaban_dir), 'push', '--quiet', 'origin', 'HEAD'],
+                                env=env, capture_output=True, text=True, timeout=PUSH_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return f"no answer from the remote in {PUSH_TIMEOUT} seconds"
+    except OSError as error:
+        return str(error)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return lines[-1] if lines else f"git push exited with status {result.returncode}"
+    return None
+
+
+def _record_push(state, head, error):
+    """Note down how a push of `head` went, backing off further if it failed."""
+    now = time.time()
+    if error is None:
+        state.update(pushed=head, last_push=now, failures=0, retry_at=0, last_error=None)
+    else:
+        failures = state.get('failures', 0) + 1
+        retry_at = now + min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+        state.update(failures=failures, retry_at=retry_at, last_error=error)
+
+
+def push_now(paths):
+    """Push right away, whatever the schedule and the failures so far say. Return None if it
+    worked, git's complaint if it didn't."""
+    head = KabanRepo(paths.kaban_dir).head_commit()
+    error = _git_push(paths.kaban_dir)
+    state = load_state(paths)
+    _record_push(state, head, error)
+    save_state(paths, state)
+    return error
+
+
+def push(paths, setting='true'):
+    """Push until the remote has caught up or a push fails. This is what the worker runs."""
+    with worker.holding_lock(paths.sync_lock_path) as locked:
+        if not locked:
+            return  # another worker has it covered
+        state = load_state(paths)
+        state['worker'] = os.getpid()
+        save_state(paths, state)
+        repo = KabanRepo(paths.kaban_dir)
+        interval = autopush_interval(setting)
+        try:
+            # commits keep coming in while we push, go again until there's nothing new
+            while push_due(state, repo.head_commit(), interval):
+                head = repo.head_commit()
+                _record_push(state, head, _git_push(paths.kaban_dir))
+                save_state(paths, state)
+        finally:
+            state['worker'] = None
+            save_state(paths, state)
+
+
+def main():
+    push(Paths.for_dir(sys.argv[1]), sys.argv[2])
+
+
+if __name__ == '__main__':
+    main()
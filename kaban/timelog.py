@@ -0,0 +1,179 @@
+"""Append-only log of time spent on tasks, and the timer that's running if there is one.
+
+`kaban stop` and `kaban log` append one entry per interval to the log, a single small
+write no matter how many tasks there are, instead of rewriting the task file. An entry
+is a JSON object on a single line:
+    {"bag": ..., "task": "...", "start": ..., "stop": ..., "seconds": ...}
+with times as Unix timestamps, "bag" null for the top level and "start" null for time
+logged by hand. Every so often (whenever the journal gets flushed) the log is folded
+into the `done` and `date_last_logged` fields of the tasks with a single operation, see
+`KabanControl._compact_timelog`, and starts over empty.
+
+How much is logged per task since then is kept in the cache and brought up to date by
+reading only what's been appended since, so looking it up doesn't read the whole log.
+
+The running timer is a file of its own, so it outlives the command that started it
+without touching the task file or the log.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from kaban import trace
+
+
+def _parse(content):
+    """The entries in the given bytes of the log, skipping torn lines from a crash."""
+    entries = []
+    for line in content.splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+def add_up(entries, totals=None):
+    """Add entries to {(bag title, task title): [seconds, last stopped]}, and return it."""
+    totals = {} if totals is None else totals
+    for entry in entries:
+        total = totals.setdefault((entry['bag'], entry['task']), [0.0, entry['stop']])
+        total[0] += entry['seconds']
+        total[1] = max(total[1], entry['stop'])
+    return totals
+
+
+class KabanTimeLog:
+    """The log of time spent, the running timer and the totals derived from the log."""
+
+    def __init__(self, path, timer_path, totals_path):
+        self.path = path
+        self.timer_path = timer_path
+        self.totals_path = totals_path
+
+    @property
+    def compacting_path(self):
+        """Where the log goes while it's folded into the tasks, in case we crash halfway."""
+        return self.path.with_name(self.path.name + '.compacting')
+
+    def entries(self):
+        try:
+            return _parse(self.path.read_bytes())
+        except FileNotFoundError:
+            return []
+
+    def append(self, bag_title, title, seconds, start=None, stop=None):
+        """Log time spent on a task, ending at `stop` (now by default)."""
+        entry = {'bag': bag_title, 'task': title, 'start': start, 'stop': stop or time.time(), 'seconds': seconds}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with open(self.path, 'ab+') as log_file:
+            # make sure a torn line left by a crash doesn't swallow this one too
+            if log_file.tell() > 0:
+                log_file.seek(-1, os.SEEK_END)
+                if log_file.read(1) != b'\n':
+                    line = '\n' + line
+            log_file.write(line.encode('utf-8'))
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        trace.count('time log appends')
+        return entry
+
+    def age(self):
+        """Seconds since the oldest entry in the log."""
+        entries = self.entries()
+        return time.time() - entries[0]['stop'] if entries else 0
+
+    def totals(self):
+        """{(bag title, task title): [seconds, last stopped]} for everything in the log, read
+        incrementally: the cached totals remember how far into the log they go."""
+        try:
+            log_file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return {}
+        with log_file:
+            # the first line tells this log apart from the ones before the last compaction
+            first_line = log_file.readline()
+            try:
+                with open(self.totals_path, 'rb') as totals_file:
+                    key, offset, totals = pickle.load(totals_file)
+            except Exception:
+                key, offset, totals = None, 0, {}
+            size = os.fstat(log_file.fileno()).st_size
+            if key != first_line or offset > size:
+                offset, totals = 0, {}
+            if offset == size:
+                return totals
+            log_file.seek(offset)
+            content = log_file.read()
+        # leave a torn last line for when it's whole
+        content = content[:content.rfind(b'\n') + 1]
+        trace.count_read(self.path, len(content))
+        add_up(_parse(content), totals)
+        self._save_totals(first_line, offset + len(content), totals)
+        return totals
+
+    def _save_totals(self, key, offset, totals):
+        try:
+            self.totals_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.totals_path.with_name(self.totals_path.name + f'.{os.getpid()}.tmp')
+            with open(temp_path, 'wb') as totals_file:
+                pickle.dump((key, offset, totals), totals_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.totals_path)
+        except OSError:
+            pass  # we'll just read the log again next time
+
+    def begin_compaction(self):
+        """Set the log aside for folding into the tasks and return an id for it and its entries,
+        (None, []) if there's nothing to fold. A log set aside by a compaction that never
+        finished comes first, anything logged since waits for the next compaction."""
+        if not self.compacting_path.exists():
+            try:
+                os.replace(self.path, self.compacting_path)
+            except FileNotFoundError:
+                return None, []
+        content = self.compacting_path.read_bytes()
+        return hashlib.sha1(content).hexdigest(), _parse(content)
+
+    def end_compaction(self):
+        self.compacting_path.unlink()
+
+    def interrupted_compaction(self):
+        """The id of a compaction that never finished, None if there's none."""
+        try:
+            return hashlib.sha1(self.compacting_path.read_bytes()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def running(self):
+        """The running timer as {"bag": ..., "task": ..., "start": ...}, None if there's none."""
+        try:
+            with open(self.timer_path, 'r', encoding='utf-8') as timer_file:
+                return json.load(timer_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def start_timer(self, bag_title, title, start=None):
+        timer = {'bag': bag_title, 'task': title, 'start': start or time.time()}
+        self.timer_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.timer_path.with_name(self.timer_path.name + f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as timer_file:
+            json.dump(timer, timer_file, ensure_ascii=False)
+            timer_file.flush()
+            os.fsync(timer_file.fileno())
+        os.replace(temp_path, self.timer_path)
+        return timer
+
+    def stop_timer(self, stop=None):
+        """Log the time since the timer was started and return the entry, None if no timer is running."""
+        timer = self.running()
+        if timer is None:
+            return None
+        stop = stop or time.time()
+        entry = self.append(timer['bag'], timer['task'], max(stop - timer['start'], 0.0), timer['start'], stop)
+        # logged first, so a crash in between can't lose the time, at worst the timer keeps running
+        self.timer_path.unlink()
+        return entry
@@ -0,0 +1,161 @@
+"""Where the time goes: a timing tree and a few counters for a single kaban command.
+
+Off unless `--profile` or the KABAN_TRACE environment variable asks for it, and all but
+free when it's off. Either takes a comma separated list of:
+    text       \ta timing tree and the counters in plain words (the default)
+    json       \tthe same as JSON lines, one per phase and one per counter
+    FILE.prof  \ta cProfile dump on top, for `python -m pstats FILE.prof` or snakeviz
+The report goes to stderr once the command is done, so it doesn't get mixed up with
+whatever the command prints.
+
+Phases with the same name under the same parent add up into one line, so a batch of
+500 commands or a commit running git 3 times shows up as a single phase called that
+many times.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+_OFF = nullcontext()
+
+_OFF_SETTINGS = ['', '0', 'off', 'false', 'no']
+
+# the one tracer of the command at hand, None when we're not tracing
+_tracer = None
+
+
+class _Phase:
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        # name -> _Phase, in the order they first came up
+        self.children = {}
+
+
+class Tracer:
+
+    def __init__(self, name, started, json_lines=False, profile_path=None):
+        self.name = name
+        self.started = started
+        self.json_lines = json_lines
+        self.profile_path = profile_path
+        self.root = _Phase()
+        self.stack = [self.root]
+        self.counters = {}
+        self.profiler = None
+        if profile_path is not None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def _child(self, name):
+        return self.stack[-1].children.setdefault(name, _Phase())
+
+    @contextmanager
+    def span(self, name):
+        phase = self._child(name)
+        self.stack.append(phase)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase.seconds += time.perf_counter() - started
+            phase.calls += 1
+            self.stack.pop()
+
+    def record(self, name, started):
+        """A phase that's over already, it started at `started` and ended just now."""
+        phase = self._child(name)
+        phase.seconds += time.perf_counter() - started
+        phase.calls += 1
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _walk(self, phase, path):
+        for name, child in phase.children.items():
+            yield path + [name], child
+            yield from self._walk(child, path + [name])
+
+    def report(self, file):
+        self.root.seconds = time.perf_counter() - self.started
+        self.root.calls = 1
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+        phases = [([self.name], self.root)] + list(self._walk(self.root, [self.name]))
+        if self.json_lines:
+            for path, phase in phases:
+                print(json.dumps({'phase': path, 'calls': phase.calls, 'ms': round(phase.seconds * 1000, 3)}), file=file)
+            for name, value in self.counters.items():
+                print(json.dumps({'counter': name, 'value': value}), file=file)
+            return
+        width = max(2 * (len(path) - 1) + len(path[-1]) for path, _ in phases)
+        for path, phase in phases:
+            label = '  ' * (len(path) - 1) + path[-1]
+            calls = f"  x{phase.calls}" if phase.calls > 1 else ''
+            print(f"{label:<{width}}  {phase.seconds * 1000:9.1f} ms{calls}", file=file)
+        if self.counters:
+            print(', '.join(f"{name} {value}" for name, value in self.counters.items()), file=file)
+        if self.profile_path is not None:
+            print(f"cProfile stats written to '{self.profile_path}'", file=file)
+
+
+def start(setting, name, started=None):
+    """Start tracing if `setting` (the value of --profile or KABAN_TRACE) says so, timing from
+    `started` if it's given. Return whether we're tracing."""
+    global _tracer
+    if setting is None or setting.strip().lower() in _OFF_SETTINGS:
+        return False
+    words = [word.strip() for word in setting.split(',')]
+    profile_path = next((word for word in words if word.endswith(('.prof', '.pstats'))), None)
+    _tracer = Tracer(name, started or time.perf_counter(), json_lines='json' in [word.lower() for word in words],
+                     profile_path=profile_path)
+    return True
+
+
+def span(name):
+    """A context manager timing what's done within it as a phase of whatever phase we're in."""
+    return _tracer.span(name) if _tracer is not None else _OFF
+
+
+def record(name, started):
+    if _tracer is not None:
+        _tracer.record(name, started)
+
+
+def count(name, amount=1):
+    if _tracer is not None:
+        _tracer.count(name, amount)
+
+
+def count_read(path, size=None):
+    """Count a file as read, and its size as bytes read."""
+    if _tracer is not None:
+        try:
+            size = os.path.getsize(path) if size is None else size
+        except OSError:
+            return
+        _tracer.count('files read')
+        _tracer.count('bytes read', size)
+
+
+def count_written(size):
+    """Count a file as written, and its size as bytes written."""
+    if _tracer is not None:
+        _tracer.count('files written')
+        _tracer.count('bytes written', size)
+
+
+def finish(file=None):
+    """Stop tracing and print the report, to stderr unless told otherwise."""
+    global _tracer
+    if _tracer is None:
+        return
+    tracer, _tracer = _tracer, None
+    tracer.report(file or sys.stderr)
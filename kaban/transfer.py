@@ -0,0 +1,213 @@
+"""Tasks in and out of kaban in bulk, as JSON Lines, CSV or todo.txt.
+
+Every format comes down to a stream of flat records, one per task or bag:
+    type   \t'task' (the default) or 'bag'
+    bag    \tthe title of the bag a task goes in, none for the top level
+and the KabanTask fields, with dates in ISO format and durations in hours. Durations
+may also be given like '1h30m' or '2d' on the way in. Records are read and written one
+at a time, never the whole file at once.
+
+todo.txt has a syntax of its own: the creation date becomes date_added, the first
++project the bag, and due:DATE, rec:RULE, est:DURATION and spent:DURATION are kaban's
+deadline, recurring, estimate and done. Completed tasks are left out.
+"""
+
+import csv
+import json
+import re
+from dataclasses import fields
+from datetime import date, datetime, timedelta
+
+from kaban.data import DURATION_FIELDS, KabanBag, KabanTask
+from kaban.journal import DATE_FIELDS, encode_value
+from kaban.recurrence import parse_rule
+
+
+_FIELDS = [field.name for field in fields(KabanTask)]
+
+COLUMNS = ['type', 'bag'] + _FIELDS
+
+FORMAT_SUFFIXES = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl', '.csv': 'csv', '.txt': 'todotxt'}
+
+_DURATION_UNITS = {'w': timedelta(weeks=1), 'd': timedelta(days=1), 'h': timedelta(hours=1), 'm': timedelta(minutes=1)}
+_DURATION = re.compile(r'((\d+(\.\d+)?)\s*([wdhm])\s*)+')
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)\s*([wdhm])')
+
+
+def guess_format(filename):
+    """The format a file name suggests, None if it doesn't suggest any."""
+    for suffix, format in FORMAT_SUFFIXES.items():
+        if str(filename).lower().endswith(suffix):
+            return format
+    return None
+
+
+def parse_duration(value):
+    """A timedelta from a number of hours, or from text like '90m', '1h30m' or '2d'."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return timedelta(hours=value)
+    text = str(value).strip().lower()
+    try:
+        return timedelta(hours=float(text))
+    except ValueError:
+        pass
+    if not _DURATION.fullmatch(text):
+        raise ValueError(f"'{value}' isn't a duration, try something like 1.5 or 1h30m")
+    return sum((float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PART.findall(text)), timedelta(0))
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value}' isn't a date, try something like 2024-07-01") from None
+
+
+def task_from_record(record, now=None):
+    """Validate a record into ('task' or 'bag', bag title or None, KabanTask or KabanBag).
+    Raises ValueError saying what's wrong with it."""
+    # empty CSV cells are as good as missing
+    record = {key: value for key, value in record.items() if value is not None and value != ''}
+    unknown = sorted(set(record) - set(COLUMNS))
+    if unknown:
+        raise ValueError(f"unknown field '{unknown[0]}', the ones kaban knows are {', '.join(COLUMNS)}")
+    kind = record.pop('type', 'task')
+    if kind not in ['task', 'bag']:
+        raise ValueError(f"type is either 'task' or 'bag', not '{kind}'")
+    bag_title = record.pop('bag', None)
+    if not isinstance(record.get('title'), str) or not record['title'].strip():
+        raise ValueError("every task needs a title")
+    for field, value in record.items():
+        if field in DATE_FIELDS:
+            record[field] = _parse_date(value)
+        elif field in DURATION_FIELDS:
+            record[field] = parse_duration(value)
+        elif not isinstance(value, str):
+            raise ValueError(f"{field} should be text, not {value!r}")
+    if record.get('recurring') is not None and parse_rule(record['recurring']) is None:
+        raise ValueError(f"don't know how often '{record['recurring']}' is, try daily, weekly or every 2 weeks")
+    record.setdefault('date_added', now or datetime.now())
+    if 'bag' == kind:
+        return kind, None, KabanBag(**record)
+    return kind, bag_title, KabanTask(**record)
+
+
+def record_from_task(task, bag_title=None):
+    """The record for a task in a bag (or at the top level), or for a bag itself."""
+    record = {'type': 'bag'} if isinstance(task, KabanBag) else {}
+    if bag_title is not None:
+        record['bag'] = bag_title
+    for field in _FIELDS:
+        value = getattr(task, field)
+        if value is not None and not (field in DURATION_FIELDS and not value):
+            record[field] = encode_value(field, value)
+    return record
+
+
+def read_jsonl(file):
+    """(line number, record) for every line of a JSON Lines file."""
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number} isn't valid JSON") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"line {number} isn't a JSON object")
+        yield number, record
+
+
+def write_jsonl(records, file):
+    for record in records:
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def read_csv(file):
+    """(line number, record) for every row of a CSV file with a header row."""
+    reader = csv.DictReader(file)
+    for record in reader:
+        if None in record:
+            raise ValueError(f"line {reader.line_num} has more cells than there are columns")
+        yield reader.line_num, record
+
+
+def write_csv(records, file):
+    writer = csv.DictWriter(file, COLUMNS)
+    writer.writeheader()
+    writer.writerows(records)
+
+
+_TODO_DATE = r'\d{4}-\d{2}-\d{2}'
+_TODO_LINE = re.compile(rf'(?P<done>x )?(?:{_TODO_DATE} (?={_TODO_DATE}))?(?:\([A-Z]\) )?'
+                        rf'(?:(?P<added>{_TODO_DATE}) )?(?P<text>.*)')
+_TODO_KEYS = {'due': 'deadline', 'rec': 'recurring', 'est': 'estimate', 'spent': 'done'}
+_TODO_UNITS = {'d': 'day', 'w': 'week', 'm': 'month', 'y': 'year'}
+_TODO_RULE = re.compile(r'\+?(\d*)([dwmy])')
+
+
+def read_todotxt(file):
+    """(line number, record) for every task in a todo.txt file that isn't done yet."""
+    for number, line in enumerate(file, start=1):
+        match = _TODO_LINE.fullmatch(line.strip())
+        if not line.strip() or match.group('done'):
+            continue
+        record = {}
+        if match.group('added'):
+            record['date_added'] = match.group('added')
+        words = []
+        for word in match.group('text').split():
+            key, _, value = word.partition(':')
+            if word.startswith('+') and len(word) > 1 and 'bag' not in record:
+                record['bag'] = word[1:]
+            elif key in _TODO_KEYS and value:
+                rule = _TODO_RULE.fullmatch(value) if 'rec' == key else None
+                if rule is not None:
+                    value = f"every {rule.group(1) or 1} {_TODO_UNITS[rule.group(2)]}s"
+                record[_TODO_KEYS[key]] = value
+            else:
+                words.append(word)
+        record['title'] = ' '.join(words)
+        yield number, record
+
+
+def write_todotxt(records, file):
+    for record in records:
+        if 'bag' == record.get('type'):
+            continue  # todo.txt has projects but nothing to say about them
+        words = [record['date_added'][:10], record['title']]
+        if 'bag' in record:
+            words.append('+' + re.sub(r'\s+', '-', record['bag']))
+        if 'deadline' in record:
+            words.append(f"due:{record['deadline'][:10]}")
+        rule = parse_rule(record['recurring']) if 'recurring' in record else None
+        if rule is not None:
+            words.append(f"rec:{rule.interval}{rule.unit[0]}")
+        for key, field in [('est', 'estimate'), ('spent', 'done')]:
+            if field in record:
+                words.append(f"{key}:{record[field]:g}h")
+        file.write(' '.join(words) + '\n')
+
+
+# format -> (reader, writer, newline to open files with)
+FORMATS = { 'jsonl'  : (read_jsonl, write_jsonl, None)
+          , 'csv'    : (read_csv, write_csv, '')
+          , 'todotxt': (read_todotxt, write_todotxt, None)
+          }
+
+
+def read_tasks(format, file, now=None):
+    """('task' or 'bag', bag title or None, task) for every record in a file, validated.
+    Raises ValueError saying which line is wrong and how."""
+    read = FORMATS[format][0]
+    for number, record in read(file):
+        try:
+            yield task_from_record(record, now)
+        except ValueError as error:
+            raise ValueError(f"line {number}: {error}") from None
+
+
+def write_tasks(format, items, file):
+    """Write (bag title or None, task) pairs, where a bag comes before its tasks."""
+    write = FORMATS[format][1]
+    write((record_from_task(task, bag_title) for bag_title, task in items), file)
@@ -0,0 +1,127 @@
+"""The stacks of steps `kaban undo` and `kaban redo` work through.
+
+Undoing a step doesn't rewrite history, it records a new operation with the inverse
+changes. The stacks only keep where each step's operation is to be found: its id and
+the commit it went into, or none while it's still in the journal. That keeps the file
+next to the journal small however big the steps, and undolog never has to go digging
+through the commit history. Undo and redo read the one operation they need back out of
+the journal or the commit. Only a step that was undone before it was ever committed
+keeps its changes in the stack, since they're nowhere else anymore.
+
+The commits steps went into are pinned down by refs under refs/kaban/steps/, so they
+survive `git gc` even if the branch itself gets reset or rewritten.
+
+The stacks are only trusted as long as HEAD is where they left it. If something else
+moved it (a manual `git reset` or `git pull`, say) they get rebuilt from the operations
+recorded in the latest commits.
+"""
+
+import json
+import os
+
+
+# how many steps back you can go
+UNDO_LIMIT = 100
+
+# how many recorded operations to look through when the stacks need rebuilding,
+# enough for a good deal of undoing and redoing on top of UNDO_LIMIT steps
+REBUILD_WINDOW = 4 * UNDO_LIMIT
+
+STEP_REF_PREFIX = 'refs/kaban/steps/'
+
+
+def _step(operation, commit=None):
+    return {'id': operation['id'], 'time': operation['time'], 'message': operation['message'], 'commit': commit}
+
+
+class UndoStack:
+    """Steps that can be undone, most recent last, and steps that have been undone and
+    can be redone, most recently undone last."""
+
+    def __init__(self, path):
+        self.path = path
+        self.head = None
+        self.undo = []
+        self.redo = []
+        # refs we've created, so we know which ones to delete without asking git
+        self.refs = []
+        try:
+            with open(path, 'r', encoding='utf-8') as stack_file:
+                state = json.load(stack_file)
+            self.head = state['head']
+            self.undo = state['undo']
+            self.redo = state['redo']
+            self.refs = state['refs']
+        except (OSError, ValueError, KeyError):
+            pass  # missing or corrupt, we'll have to rebuild it
+
+    def save(self):
+        text = json.dumps({'head': self.head, 'undo': self.undo, 'redo': self.redo, 'refs': self.refs},
+                          ensure_ascii=False)
+        temp_path = self.path.with_name(self.path.name + f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as stack_file:
+            stack_file.write(text)
+        os.replace(temp_path, self.path)
+
+    def is_stale(self, head):
+        """Has HEAD been moved by someone other than us since we last saw it?"""
+        return not self.path.exists() or self.head != head
+
+    def did(self, operation):
+        """A new step was taken, which is the end of redoing anything."""
+        self.undo.append(_step(operation))
+        del self.undo[:-UNDO_LIMIT]
+        self.redo = []
+
+    def undone(self):
+        """Move the latest step over to the redo stack and return it, None if there's none."""
+        if not self.undo:
+            return None
+        step = self.undo.pop()
+        self.redo.append(step)
+        return step
+
+    def redone(self):
+        """Move the latest undone step back to the undo stack and return it, None if there's none."""
+        if not self.redo:
+            return None
+        step = self.redo.pop()
+        self.undo.append(step)
+        return step
+
+    def committed(self, head_before, head_after):
+        """Steps without a commit are in the one that just moved HEAD from head_before to head_after."""
+        for step in self.undo + self.redo:
+            # steps undone before they were ever committed aren't in there
+            if step['commit'] is None and not step.get('dropped'):
+                step['commit'] = head_after
+        if self.head == head_before:
+            self.head = head_after
+        # otherwise HEAD moved behind our back before this commit, so leave us stale
+
+    def ref_updates(self):
+        """Refs to create and refs to delete so that every step's commit has one, and no other commit does."""
+        wanted = sorted({STEP_REF_PREFIX + step['commit'] for step in self.undo + self.redo if step['commit']})
+        create = {ref: ref[len(STEP_REF_PREFIX):] for ref in wanted if ref not in self.refs}
+        delete = [ref for ref in self.refs if ref not in wanted]
+        self.refs = wanted
+        return create, delete
+
+    def rebuild(self, operations, head):
+        """Start over from (operation, commit) pairs, oldest first, with None for pending ones."""
+        self.undo = []
+        self.redo = []
+        for operation, commit in operations:
+            if 'undoes' in operation:
+                if self.undo and self.undo[-1]['id'] == operation['undoes']:
+                    self.redo.append(self.undo.pop())
+            elif 'redoes' in operation:
+                if self.redo and self.redo[-1]['id'] == operation['redoes']:
+                    self.undo.append(self.redo.pop())
+            elif 'compacts' in operation or 'shards' in operation:
+                continue  # logged time folded into the tasks, or the files split up, not a step anyone took
+            else:
+                self.undo.append(_step(operation, commit))
+                del self.undo[:-UNDO_LIMIT]
+                self.redo = []
+        self.head = head
@@ -0,0 +1,92 @@
+"""Detached worker processes, for the slow things no command should have to wait on.
+
+kaban.sync pushes and kaban.maintenance tidies up the repo this way. Each keeps a little
+JSON state file that commands peek at, and when there's work to do starts
+`python -m MODULE KABAN_DIR ...` in a session of its own. The worker holds a lock file
+for as long as it works and notes its pid in the state, so there's never more than one
+of each at a time.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # no file locks on Windows, we'll have to trust the worker pid
+
+
+# workers started by this process, kept around so they get reaped when they're done
+_workers = []
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        # never ran, or the cache got cleaned out; either way start from scratch
+        return {}
+
+
+def save_state(path, state):
+    """Atomically write a worker's state, quietly giving up if that can't be done: worst
+    case the work gets done twice."""
+    path = Path(path)
+    temp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def worker_alive(state):
+    global _workers
+    _workers = [worker for worker in _workers if worker.poll() is None]
+    pid = state.get('worker')
+    if pid is None:
+        return False
+    if any(pid == worker.pid for worker in _workers):
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # it's there alright, just not ours to signal
+    return True
+
+
+def start_worker(state_path, state, module, *args):
+    """Run `python -m module args...` detached, and note its pid in the state."""
+    # the worker might not be on sys.path otherwise, if kaban isn't installed
+    package_root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([package_root, os.environ.get('PYTHONPATH', '')]))
+    worker = subprocess.Popen([sys.executable, '-m', module] + [str(arg) for arg in args],
+                              env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, start_new_session=True)
+    _workers.append(worker)
+    state['worker'] = worker.pid
+    save_state(state_path, state)
+
+
+@contextmanager
+def holding_lock(lock_path):
+    """Take the worker's lock for the duration, yield False if another worker has it."""
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+        yield True
@@ -0,0 +1,23 @@
+"""Fixtures shared by the kaban test modules."""
+
+
+import sys
+
+import pytest
+
+from kaban.control import KabanControl
+from kaban.defaults import Paths
+
+
+@pytest.fixture
+def kaban(tmp_path, monkeypatch):
+    """Run a kaban command line in a fresh repo, return whether it succeeded and the control object."""
+    paths = Paths(tmp_path, tmp_path / 'my_kaban_tasks.toml', tmp_path / 'my_kaban_tasks.yaml',
+                  tmp_path / 'config.toml')
+    monkeypatch.setattr('kaban.control.DEFAULT_PATHS', paths)
+    def run(*argv):
+        monkeypatch.setattr(sys, 'argv', ['kaban'] + list(argv))
+        control = KabanControl()
+        return control._execute_command(), control
+    assert run('init')[0]
+    return run
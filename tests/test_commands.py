@@ -1,6 +1,11 @@
 """Test basic kaban commands and business logic."""
 
 
+import json
+import os
+import subprocess
+import sys
+
 import git
 
 from pathlib import Path
@@ -88,3 +93,54 @@ def test_add(setup_init):
 
 
 # TODO: more tests to come...
+
+
+def test_list_and_dump(kaban, capsys):
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom', 'dad')
+    kaban('add', "Feed dragon")
+    capsys.readouterr()
+    # straight from memory while there are changes pending...
+    assert kaban('list')[0]
+    expected = "top level: Feed dragon\ngifts bag: mom\ngifts bag: dad\n"
+    assert capsys.readouterr().out == expected
+    _, control = kaban('flush')
+    capsys.readouterr()
+    # ...from the snapshot once there aren't...
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr('kaban.data.iter_tasks', lambda _: pytest.fail("streamed"))
+        assert kaban('list')[0]
+    assert capsys.readouterr().out == expected
+    # ...and streamed from the file if there's no snapshot
+    control.paths.snapshot_file_path.unlink()
+    assert kaban('list')[0]
+    assert capsys.readouterr().out == expected
+    _, control = kaban('dump')
+    assert capsys.readouterr().out == control.paths.toml_file_path.read_text(encoding='utf-8')
+
+
+# run kaban in a fresh interpreter and tell which modules it imported on the way
+LIST_MODULES = ( "import atexit, json, runpy, sys; "
+                 "atexit.register(lambda: print(json.dumps(sorted(sys.modules)), file=sys.stderr)); "
+                 "sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name='__main__')"
+               )
+
+# 'git' itself is there from the start, lazily, it's the modules inside it that tell it got loaded
+NEVER_NEEDED = [ 'git.repo', 'tomlkit', 'yaml', 'concurrent.futures', 'kaban.daemon', 'kaban.sync'
+               , 'kaban.maintenance', 'kaban.merge', 'kaban.history', 'kaban.transfer', 'kaban.registry'
+               , 'kaban.undo', 'kaban.stats'
+               ]
+
+
+def test_lazy_imports(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    def modules(*argv):
+        result = subprocess.run([sys.executable, '-c', LIST_MODULES, str(Path(__file__).parent.parent)] + list(argv),
+                                env=env, capture_output=True, text=True)
+        return set(json.loads(result.stderr.splitlines()[-1]))
+    modules('init')
+    modules('add', "Feed dragon")
+    for argv in [['help'], ['config', 'quiet']]:
+        assert not modules(*argv) & set(NEVER_NEEDED + ['kaban.data', 'kaban.journal', 'kaban.index']), argv
+    listed = modules('list')
+    assert 'kaban.data' in listed and not listed & set(NEVER_NEEDED)
@@ -0,0 +1,33 @@
+"""Test the shell completion cache."""
+
+
+from kaban.completion import candidates, read_cache
+
+
+def test_candidates():
+    entries = {'command': ['deadline', 'dump', 'help'], 'bag': ['gifts'], 'task': ['Feed dragon', 'gifts']}
+    assert candidates(entries, ['kaban', 'd'], 1) == ['deadline', 'dump']
+    assert candidates(entries, ['kaban'], 1) == ['deadline', 'dump', 'help']
+    assert candidates(entries, ['kaban', 'help', 'DU'], 2) == ['dump']
+    assert candidates(entries, ['kaban', 'deadline', '2025-01-01', '"f'], 3) == ['Feed dragon']
+    assert candidates(entries, ['kaban', 'add', 'g'], 2) == ['gifts']
+
+
+def test_cache(kaban):
+    kaban('add', "Feed dragon")
+    kaban('bag', 'gifts')
+    _, control = kaban('add', 'gifts', 'mom')
+    cache_path, kaban_dir = str(control.paths.completion_file_path), str(control.paths.kaban_dir)
+    # written once the index is around, and kept up to date from then on
+    kaban('complete')
+    entries = read_cache(cache_path, kaban_dir)
+    assert {'add', 'gc', 'import', 'start'} <= set(entries['command'])
+    assert entries['bag'] == ['gifts'] and entries['task'] == ["Feed dragon", 'mom']
+    kaban('add', 'gifts', 'dad')
+    assert read_cache(cache_path, kaban_dir)['task'] == ['dad', "Feed dragon", 'mom']
+    # like a `git pull` would
+    _, control = kaban('flush')
+    control.paths.toml_file_path.write_text(control.paths.toml_file_path.read_text().replace('dad', 'Dad'))
+    assert read_cache(cache_path, kaban_dir) is None
+    kaban('complete')
+    assert read_cache(cache_path, kaban_dir)['task'] == ['Dad', "Feed dragon", 'mom']
@@ -0,0 +1,91 @@
+"""Test that the config file is only written when something actually changed."""
+
+
+import os
+import sys
+
+import pytest
+
+from kaban.config import KabanConfig
+from kaban.control import KabanControl
+from kaban.defaults import Paths
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.toml'
+    KabanConfig().save_to_file(filepath=path)
+    return path
+
+
+@pytest.fixture
+def config_writes(config_path, monkeypatch):
+    """Count every time the config file gets replaced on disk."""
+    writes = []
+    real_replace = os.replace
+    def counting_replace(src, dst, *args, **kwargs):
+        if os.fspath(dst) == os.fspath(config_path):
+            writes.append(dst)
+        return real_replace(src, dst, *args, **kwargs)
+    monkeypatch.setattr(os, 'replace', counting_replace)
+    return writes
+
+
+def test_no_writes_on_load(config_path, config_writes):
+    config = KabanConfig(path=config_path)
+    config.load_from_file()
+    assert config_writes == []
+
+
+def test_write_per_change(config_path, config_writes):
+    config = KabanConfig(path=config_path)
+    config.load_from_file()
+    config.quiet = True
+    assert len(config_writes) == 1
+    # setting the same value again is not a change
+    config.quiet = True
+    assert len(config_writes) == 1
+    reloaded = KabanConfig()
+    reloaded.load_from_file(filepath=config_path)
+    assert reloaded.quiet is True
+
+
+def test_transaction(config_path, config_writes):
+    config = KabanConfig(path=config_path)
+    with config.transaction():
+        config.quiet = True
+        config.format = 'yaml'
+        with config.transaction():
+            config.local = True
+        assert config_writes == []
+    assert len(config_writes) == 1
+    reloaded = KabanConfig()
+    reloaded.load_from_file(filepath=config_path)
+    assert (reloaded.quiet, reloaded.format, reloaded.local) == (True, 'yaml', True)
+
+
+def test_transaction_rollback(config_path, config_writes):
+    config = KabanConfig(path=config_path)
+    with pytest.raises(RuntimeError):
+        with config.transaction():
+            config.quiet = True
+            raise RuntimeError
+    assert config.quiet is False
+    assert config_writes == []
+    assert not list(config_path.parent.glob('*.tmp'))
+
+
+@pytest.mark.parametrize('argv, expected_writes', [ (['config', 'quiet'], 0)
+                                                  , (['config', 'quiet', 'true'], 1)
+                                                  , (['dump'], 0)
+                                                  , (['help'], 0)
+                                                  ])
+def test_writes_per_command(tmp_path, config_path, config_writes, monkeypatch, argv, expected_writes):
+    paths = Paths(tmp_path, tmp_path / 'my_kaban_tasks.toml', tmp_path / 'my_kaban_tasks.yaml', config_path)
+    paths.toml_file_path.touch()
+    (tmp_path / '.git').mkdir()
+    monkeypatch.setattr('kaban.control.DEFAULT_PATHS', paths)
+    monkeypatch.setattr(sys, 'argv', ['kaban'] + argv + ['--config', str(config_path)])
+    control = KabanControl()
+    assert control._execute_command() is not False
+    assert len(config_writes) == expected_writes
@@ -0,0 +1,84 @@
+"""Test running commands through `kaban serve`."""
+
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import git
+import pytest
+
+from kaban.client import forward, reads_stdin
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def env(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    subprocess.run([sys.executable, str(REPO_ROOT), 'init'], env=env, check=True, capture_output=True)
+    return env
+
+
+@pytest.fixture
+def daemon(env, tmp_path):
+    """Start `kaban serve` in the background, return the path of its socket."""
+    socket_path = tmp_path / '.kaban' / '.cache' / 'kaban.sock'
+    process = subprocess.Popen([sys.executable, str(REPO_ROOT), 'serve'], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while forward(['help', 'help'], socket_path) is None:
+        assert time.monotonic() < deadline and process.poll() is None, "daemon didn't come up"
+        time.sleep(0.05)
+    yield socket_path
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def test_forward(daemon, capfd):
+    capfd.readouterr()
+    assert forward(['add', "Feed dragon"], daemon) == 0
+    # failures come back as the exit status
+    assert forward(['bag'], daemon) == 1
+    capfd.readouterr()
+    assert forward(['list'], daemon) == 0
+    assert capfd.readouterr().out == "top level: Feed dragon\n"
+
+
+def test_reload_on_external_change(daemon, tmp_path, capfd):
+    forward(['add', "Feed dragon"], daemon)
+    forward(['flush'], daemon)
+    # go behind the daemon's back
+    git.Repo(tmp_path / '.kaban').head.reset('HEAD~1', index=True, working_tree=True)
+    capfd.readouterr()
+    assert forward(['list'], daemon) == 0
+    assert capfd.readouterr().out == ''
+
+
+def test_stop(daemon):
+    assert forward(['serve', 'stop'], daemon) == 0
+    deadline = time.monotonic() + 10
+    while daemon.exists():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert forward(['list'], daemon) is None
+
+
+def test_reads_stdin():
+    assert reads_stdin(['batch'])
+    assert reads_stdin(['batch', '--atomic', '-'])
+    assert not reads_stdin(['batch', 'commands.txt'])
+    assert reads_stdin(['import', '-', '--format=csv'])
+    assert reads_stdin(['import', '--format', 'csv', '-'])
+    assert not reads_stdin(['import', 'tasks.csv'])
+    assert not reads_stdin(['mv', '-', 'housework'])
+
+
+def test_no_daemon(tmp_path):
+    assert forward(['list'], tmp_path / 'kaban.sock') is None
+    # left behind by a daemon that got killed
+    (tmp_path / 'kaban.sock').touch()
+    assert forward(['list'], tmp_path / 'kaban.sock') is None
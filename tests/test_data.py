@@ -0,0 +1,175 @@
+"""Test loading and caching of task data."""
+
+
+from datetime import date, timedelta
+
+import pytest
+
+from kaban.data import KabanBag, KabanData, KabanTask, iter_tasks
+
+
+TASKS_TOML = """
+[[tasks]]
+title = "Feed dragon"
+date_added = 2024-02-29
+recurring = 'daily'
+
+[[tasks]]
+title = "Reload ion cannons"
+date_added = 2024-05-04
+notes = "Use vegan ions though"
+estimate = 54.5
+done = 21
+"""
+
+
+@pytest.fixture
+def task_file(tmp_path):
+    path = tmp_path / 'my_kaban_tasks.toml'
+    path.write_text(TASKS_TOML, encoding='utf-8')
+    return path
+
+
+def test_load(task_file):
+    data = KabanData()
+    data.load_from_file(task_file)
+    assert len(data) == 2
+    assert data[0] == KabanTask("Feed dragon", date(2024, 2, 29), recurring='daily')
+    assert data[1].estimate == timedelta(hours=54.5)
+    assert data[1].done == timedelta(hours=21)
+
+
+def test_snapshot_hit(task_file, tmp_path, monkeypatch):
+    snapshot_path = tmp_path / '.cache' / 'tasks.pickle'
+    fresh = KabanData()
+    fresh.load_from_file(task_file, snapshot_path=snapshot_path)
+    assert snapshot_path.exists()
+    # a second load must not touch the TOML parser at all
+    monkeypatch.setattr('kaban.data._parse_toml', lambda _: pytest.fail("reparsed"))
+    cached = KabanData()
+    cached.load_from_file(task_file, snapshot_path=snapshot_path)
+    assert cached == fresh
+
+
+def test_snapshot_stale(task_file, tmp_path):
+    snapshot_path = tmp_path / '.cache' / 'tasks.pickle'
+    KabanData().load_from_file(task_file, snapshot_path=snapshot_path)
+    with open(task_file, 'a', encoding='utf-8') as file:
+        file.write('\n[[tasks]]\ntitle = "Memorize pi"\ndate_added = 2024-03-14\n')
+    data = KabanData()
+    data.load_from_file(task_file, snapshot_path=snapshot_path)
+    assert [task.title for task in data] == ["Feed dragon", "Reload ion cannons", "Memorize pi"]
+
+
+def test_snapshot_corrupt(task_file, tmp_path):
+    snapshot_path = tmp_path / '.cache' / 'tasks.pickle'
+    KabanData().load_from_file(task_file, snapshot_path=snapshot_path)
+    snapshot_path.write_bytes(snapshot_path.read_bytes()[:-10])
+    data = KabanData()
+    data.load_from_file(task_file, snapshot_path=snapshot_path)
+    assert len(data) == 2
+
+
+def test_compact_tasks(tmp_path):
+    path = tmp_path / 'my_kaban_tasks.toml'
+    path.write_text(TASKS_TOML + TASKS_TOML.replace('Feed dragon', 'Feed cat'), encoding='utf-8')
+    data = KabanData()
+    data.load_from_file(path)
+    assert not hasattr(data[0], '__dict__')
+    # equal values parsed from different tables are shared
+    assert data[1].estimate is data[3].estimate
+    assert data[0].date_added is data[2].date_added
+
+
+def test_bag_roundtrip(tmp_path):
+    path = tmp_path / 'my_kaban_tasks.toml'
+    data = KabanData()
+    bag = KabanBag("gifts", date(2024, 7, 10))
+    bag.extend([KabanTask('mom', date(2024, 7, 10)), KabanTask('dad', date(2024, 7, 11))])
+    data.extend([KabanTask("Feed dragon", date(2024, 2, 29), estimate=timedelta(minutes=10)), bag])
+    data.save_to_file(path)
+    reloaded = KabanData()
+    reloaded.load_from_file(path)
+    assert reloaded == data
+    assert [task.title for task in reloaded[1]] == ['mom', 'dad']
+
+
+STREAMING_TOML = '''
+[[tasks]]
+title = "Feed dragon"
+date_added = 2024-02-29
+notes = """
+[[bags]]
+title = "not a bag"
+"""
+
+[[bags]]
+title = "gifts"
+date_added = 2024-07-10
+
+[[bags.tasks]]
+title = 'mom'
+date_added = 2024-07-10
+
+[[bags.tasks]]
+title = 'dad'
+date_added = 2024-07-10
+
+[[tasks]]
+title = "Memorize pi"
+date_added = 2024-03-14
+'''
+
+
+def test_iter_tasks(tmp_path):
+    path = tmp_path / 'my_kaban_tasks.toml'
+    path.write_text(STREAMING_TOML, encoding='utf-8')
+    records = [(bag.title if bag is not None else None, task.title) for bag, task in iter_tasks(path)]
+    assert records == [ (None, "Feed dragon")
+                      , (None, 'gifts')
+                      , ('gifts', 'mom')
+                      , ('gifts', 'dad')
+                      , (None, "Memorize pi")
+                      ]
+    data = KabanData()
+    data.load_from_file(path)
+    assert [task.title for task in data] == ["Feed dragon", "Memorize pi", 'gifts']
+    assert [task.title for task in data[2]] == ['mom', 'dad']
+
+
+def test_iter_tasks_root_keys(tmp_path):
+    path = tmp_path / 'my_kaban_tasks.toml'
+    path.write_text('tasks = [{title = "Feed dragon", date_added = 2024-02-29}]\n', encoding='utf-8')
+    assert [task.title for _, task in iter_tasks(path)] == ["Feed dragon"]
+
+
+def test_shards(tmp_path):
+    data = KabanData()
+    gifts = KabanBag("gifts", date(2024, 7, 10))
+    gifts.extend([KabanTask('mom', date(2024, 7, 10)), KabanTask('dad', date(2024, 7, 11))])
+    chores = KabanBag("chores / errands", date(2024, 7, 10))
+    chores.append(KabanTask("Feed dragon", date(2024, 2, 29)))
+    data.extend([KabanTask("Memorize pi", date(2024, 3, 14)), gifts, chores])
+    written, removed = data.save_to_shards(tmp_path / 'tasks')
+    assert sorted(path.name for path in written) == [ 'bag-chores-errands.toml', 'bag-gifts.toml'
+                                                    , 'manifest.toml', 'top.toml'
+                                                    ]
+    assert removed == []
+    reloaded = KabanData()
+    reloaded.load_from_shards(tmp_path / 'tasks')
+    # bags are only read once their tasks are needed
+    assert [bag.loaded() for bag in reloaded[1:]] == [False, False]
+    assert reloaded[2].title == "chores / errands"
+    assert [task.title for task in reloaded[1]] == ['mom', 'dad']
+    assert [bag.loaded() for bag in reloaded[1:]] == [True, False]
+    assert reloaded == data
+    # only what changed gets written
+    reloaded[1].append(KabanTask('Chris', date(2024, 7, 12)))
+    assert reloaded.save_to_shards(tmp_path / 'tasks') == ([tmp_path / 'tasks' / 'bag-gifts.toml'], [])
+    del reloaded[1]
+    reloaded[1].title = "chores"
+    written, removed = reloaded.save_to_shards(tmp_path / 'tasks')
+    # the bag keeps its file when renamed
+    assert written == [tmp_path / 'tasks' / 'manifest.toml']
+    assert removed == [tmp_path / 'tasks' / 'bag-gifts.toml']
+    assert not removed[0].exists()
@@ -0,0 +1,56 @@
+"""Test the history index behind `kaban hist`."""
+
+
+import subprocess
+
+from kaban.history import iter_history, select_rows, update_history
+
+
+def hist(kaban, capsys, *argv):
+    capsys.readouterr()
+    success, _ = kaban('hist', *argv)
+    assert success
+    return capsys.readouterr().out.splitlines()[1:]
+
+
+def test_hist(kaban, capsys):
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom', 'dad')
+    kaban('flush')
+    kaban('add', "Feed dragon")
+    lines = hist(kaban, capsys)
+    assert lines[0].endswith("pending  Add 1 task at top level")
+    assert len(lines) == 4
+    assert lines[3].endswith("Init kaban repo")
+    assert 'pending' not in lines[1] and 'pending' not in lines[2]
+    assert len(hist(kaban, capsys, '--limit=1')) == 1
+    assert len(hist(kaban, capsys, '--bag=GIFT')) == 2
+    assert len(hist(kaban, capsys, '--task=dad')) == 1
+    assert len(hist(kaban, capsys, '--task=dragon')) == 1
+    assert hist(kaban, capsys, '--since=2999-01-01') == []
+    assert not kaban('hist', '--limit=lots')[0]
+
+
+def test_incremental(kaban):
+    kaban('add', "Feed dragon")
+    _, control = kaban('flush')
+    path = control.paths.history_file_path
+    assert update_history(path, control.repo) == 2
+    assert update_history(path, control.repo) == 0
+    kaban('add', "Memorize pi")
+    kaban('flush')
+    assert update_history(path, control.repo) == 1
+    assert [row['tasks'] for row in iter_history(path)] == [["Memorize pi"], ["Feed dragon"], []]
+    # rewritten history means starting over
+    subprocess.run(['git', '-C', str(control.paths.kaban_dir), 'reset', '--quiet', '--hard', 'HEAD~1'], check=True)
+    assert update_history(path, control.repo) == 2
+    assert [row['tasks'] for row in iter_history(path)] == [["Feed dragon"], []]
+
+
+def test_select_out_of_order():
+    # a backdated commit on top of newer ones doesn't hide what comes after it
+    rows = [ {'time': 300, 'bags': ['gifts'], 'tasks': []}, {'time': 100, 'bags': [], 'tasks': []}
+           , {'time': 200, 'bags': ['gifts'], 'tasks': ['mom']}
+           ]
+    assert [row['time'] for row in select_rows(rows, since=150)] == [300, 200]
+    assert [row['time'] for row in select_rows(rows, since=150, task='MOM')] == [200]
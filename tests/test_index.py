@@ -0,0 +1,115 @@
+"""Test title and full-text lookups."""
+
+
+from datetime import date, datetime
+
+import pytest
+
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.index import KabanFieldIndex, KabanIndex, load_field_index, load_index
+
+
+@pytest.fixture
+def data():
+    data = KabanData()
+    personal = KabanBag('personal', date(2024, 7, 10))
+    personal.extend([ KabanTask("Get 7.5 hours of sleep", date(2024, 7, 10))
+                    , KabanTask("Feed dragon", date(2024, 7, 10), notes="Sleepy dragons are grumpy")
+                    ])
+    data.extend([KabanTask("Feed cat", date(2024, 2, 29)), KabanTask("Memorize pi", date(2024, 3, 14)), personal])
+    return data
+
+
+def test_complete(data):
+    index = KabanIndex.build(data)
+    assert index.complete('fee') == ["Feed cat", "Feed dragon"]
+    assert index.complete('Pers') == ['personal']
+    assert index.complete('x') == []
+    assert index.find('feed DRAGON') == [('personal', "Feed dragon")]
+
+
+def test_grep(data):
+    index = KabanIndex.build(data)
+    assert index.grep('sleep') == [('personal', "Get 7.5 hours of sleep")]
+    assert index.grep('dragon') == [('personal', "Feed dragon")]
+    assert index.grep('feed') == [('', "Feed cat"), ('personal', "Feed dragon")]
+    assert index.grep('feed grumpy') == [('personal', "Feed dragon")]
+
+
+def test_incremental(kaban, capsys):
+    kaban('add', "Feed dragon")
+    # build the index once, from then on changes keep it up to date
+    kaban('grep', 'dragon')
+    _, control = kaban('bag', 'personal')
+    kaban('add', 'personal', "Get 7.5 hours of sleep", "Feed cat")
+    kaban('undo')
+    kaban('add', 'personal', "Get 7.5 hours of sleep", "Feed dragon")
+    _, control = kaban('flush')
+    index = load_index(control.paths)
+    assert index is not None
+    rebuilt = KabanIndex.build(control.data)
+    assert (index.titles, index.bags, index.words) == (rebuilt.titles, rebuilt.bags, rebuilt.words)
+    capsys.readouterr()
+    assert kaban('find', 'sleep')[0]
+    assert capsys.readouterr().out == "personal bag: Get 7.5 hours of sleep\n"
+
+
+def test_caught_up(kaban, capsys):
+    kaban('config', 'flush_count', '100')
+    kaban('bag', 'personal')
+    kaban('add', 'personal', "Feed dragon")
+    kaban('flush')
+    kaban('grep', 'dragon')
+    _, control = kaban('list', '--sortby=deadline')
+    saved = control.paths.index_file_path.stat().st_mtime_ns, control.paths.field_index_path('deadline').stat().st_mtime_ns
+    # the indexes on disk stay the way they were until the journal is flushed
+    kaban('add', 'personal', "Get 7.5 hours of sleep")
+    kaban('deadline', '2024-12-24', "Feed", "dragon")
+    assert (control.paths.index_file_path.stat().st_mtime_ns,
+            control.paths.field_index_path('deadline').stat().st_mtime_ns) == saved
+    capsys.readouterr()
+    assert kaban('find', 'sleep')[0]
+    assert capsys.readouterr().out == "personal bag: Get 7.5 hours of sleep\n"
+    _, control = kaban('list', '--sortby=deadline')
+    rebuilt = KabanIndex.build(control.data)
+    assert (control.index.titles, control.index.words) == (rebuilt.titles, rebuilt.words)
+    assert control.field_index.fields == KabanFieldIndex.build(control.data).fields
+    _, control = kaban('flush')
+    assert control.paths.index_file_path.stat().st_mtime_ns != saved[0]
+
+
+def test_field_index(data):
+    index = KabanFieldIndex.build(data)
+    # plain dates and datetimes sort together
+    data[2].append(KabanTask("Nap", datetime(2024, 3, 1, 12, 0)))
+    index.add_task('personal', data[2][-1])
+    assert [title for _, _, title in index.first('date_added', 3)] == ["Feed cat", "Nap", "Memorize pi"]
+    assert [title for _, _, title in index.first('date_added', start=date(2024, 7, 1))] == \
+           ["Feed dragon", "Get 7.5 hours of sleep"]
+    assert [title for _, _, title in index.last('date_added', 1)] == ["Get 7.5 hours of sleep"]
+    assert index.first('deadline') == []
+
+
+def test_sortby(kaban, capsys):
+    kaban('add', "Feed dragon")
+    kaban('bag', 'personal')
+    kaban('add', 'personal', "Get 7.5 hours of sleep", "Feed cat")
+    kaban('list', '--sortby=deadline')
+    assert kaban('deadline', '2025-01-01')[0]
+    assert kaban('deadline', '2024-12-24', "Feed", "dragon")[0]
+    assert not kaban('deadline', '2024-12-24', "Feed")[0]
+    assert not kaban('deadline', 'tomorrow')[0]
+    _, control = kaban('flush')
+    index = load_field_index(control.paths)
+    assert index is not None
+    assert index.fields == KabanFieldIndex.build(control.data).fields
+    capsys.readouterr()
+    assert kaban('list', '--sortby=deadline', '--limit=1')[0]
+    assert capsys.readouterr().out.splitlines()[1:] == ["top level: Feed dragon  (2024-12-24)"]
+    assert not kaban('list', '--sortby=color')[0]
+    kaban('deadline', '2999-01-01', "Feed cat")
+    capsys.readouterr()
+    assert kaban('status')[0]
+    assert capsys.readouterr().out.splitlines()[:2] == [ "Good to see you! Upcoming deadlines:"
+                                                       , "  2999-01-01  personal bag: Feed cat"
+                                                       ]
@@ -0,0 +1,150 @@
+"""Test journaling of changes and coalescing them into commits."""
+
+
+import git
+
+
+def commit_count(control):
+    return len(list(git.Repo(control.paths.kaban_dir).iter_commits()))
+
+
+def titles(data):
+    return [task.title for task in data]
+
+
+def test_add_is_journaled(kaban):
+    _, control = kaban('add', "Feed dragon")
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom', 'dad', 'Chris')
+    assert commit_count(control) == 1
+    assert control.paths.toml_file_path.read_text(encoding='utf-8') == ''
+    # reads see journaled state
+    _, control = kaban('help')
+    assert titles(control.data) == ["Feed dragon", 'gifts']
+    assert titles(control.data[1]) == ['mom', 'dad', 'Chris']
+
+
+def test_bookkeeping_ignored(kaban):
+    kaban('add', "Feed dragon")
+    _, control = kaban('undo')
+    repo = git.Repo(control.paths.kaban_dir)
+    assert control.paths.journal_file_path.exists() and control.paths.undo_file_path.exists()
+    assert repo.untracked_files == []
+
+
+def test_flush(kaban):
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom', 'dad', 'Chris')
+    success, control = kaban('flush')
+    assert success
+    assert commit_count(control) == 2
+    assert control.journal.pending() == []
+    _, control = kaban('help')
+    assert titles(control.data[0]) == ['mom', 'dad', 'Chris']
+
+
+def test_flush_threshold(kaban):
+    kaban('config', 'flush_count', '3')
+    for title in ['mom', 'dad', 'Chris']:
+        _, control = kaban('add', title)
+    assert commit_count(control) == 2
+    assert control.journal.pending() == []
+
+
+def test_undo_pending(kaban):
+    kaban('add', "Feed dragon")
+    kaban('add', "Memorize pi")
+    success, control = kaban('undo')
+    assert success
+    assert titles(control.data) == ["Feed dragon"]
+    assert len(control.journal.pending()) == 1
+
+
+def test_undo_committed(kaban):
+    kaban('add', "Feed dragon")
+    kaban('add', "Memorize pi")
+    kaban('flush')
+    kaban('undo')
+    _, control = kaban('undo')
+    assert titles(control.data) == []
+    assert not kaban('undo')[0]
+    # both undos are journaled rather than rewriting history
+    assert len(control.journal.pending()) == 2
+
+
+def test_shard(kaban):
+    kaban('add', "Feed dragon")
+    kaban('bag', 'gifts')
+    kaban('bag', 'chores')
+    kaban('add', 'gifts', 'mom', 'dad')
+    success, control = kaban('shard')
+    assert success
+    assert not control.paths.toml_file_path.exists()
+    repo = git.Repo(control.paths.kaban_dir)
+    assert 'my_kaban_tasks.toml' not in [entry.path for entry in repo.head.commit.tree.traverse()]
+    # the steps from before the split are still there to undo
+    assert len([ref for ref in repo.refs if ref.path.startswith('refs/kaban/steps/')]) == 1
+    control.undo_stack.head = None
+    assert len(control._fresh_undo_stack().undo) == 4
+    kaban('add', 'chores', "Take out the trash")
+    kaban('flush')
+    # the commit only touches the bag that changed
+    assert list(repo.head.commit.stats.files) == ['tasks/bag-chores.toml']
+    _, control = kaban('help')
+    assert titles(control.data) == ["Feed dragon", 'gifts', 'chores']
+    assert titles(control.data[2]) == ["Take out the trash"]
+    assert not control.data[1].loaded()
+    assert kaban('undo')[0]
+    assert kaban('grep', 'trash')[0] is False
+
+
+def test_batch(kaban, tmp_path, capsys):
+    kaban('add', "Feed dragon")
+    script = tmp_path / 'script.txt'
+    script.write_text("# presents\n"
+                      "bag gifts\n"
+                      "\n"
+                      "kaban add gifts mom 'Uncle Bob'\n"
+                      "frobnicate\n"
+                      "deadline 2024-12-24 mom\n")
+    capsys.readouterr()
+    success, control = kaban('batch', str(script))
+    assert not success
+    out = capsys.readouterr().out
+    assert "`frobnicate` is a valid command" in out and "That was line 5: frobnicate" in out
+    assert "3 of 4 commands went through" in out
+    assert commit_count(control) == 1
+    _, control = kaban('help')
+    assert titles(control.data) == ["Feed dragon", 'gifts']
+    assert titles(control.data[1]) == ['mom', 'Uncle Bob']
+    assert control.data[1][0].deadline is not None
+
+
+def test_batch_atomic(kaban, tmp_path, monkeypatch, capsys):
+    kaban('config', 'flush_count', '2')
+    kaban('add', "Feed dragon")
+    script = tmp_path / 'script.txt'
+    script.write_text("bag gifts\nadd gifts mom dad\nundo\nadd gifts cat\ndeadline someday cat\n")
+    success, control = kaban('batch', str(script), '--atomic')
+    assert not success
+    assert "None of the batch stuck" in capsys.readouterr().out
+    assert commit_count(control) == 1
+    _, control = kaban('help')
+    assert titles(control.data) == ["Feed dragon"]
+    assert len(control.journal.pending()) == 1
+    assert kaban('undo')[0] and not kaban('undo')[0]
+    kaban('redo')
+    # without the bad line it all goes into a single commit, however low flush_count is
+    script.write_text("bag gifts\nadd gifts mom dad\nundo\nadd gifts cat\n")
+    monkeypatch.setattr('sys.stdin', script.open())
+    success, control = kaban('batch', '--atomic')
+    assert success
+    assert commit_count(control) == 2
+    assert control.journal.pending() == []
+    _, control = kaban('help')
+    assert titles(control.data) == ["Feed dragon", 'gifts']
+    assert titles(control.data[1]) == ['cat']
+    # commands that have to commit on their own are a no go
+    script.write_text("add gifts dad\nflush\n")
+    assert not kaban('batch', str(script), '--atomic')[0]
+    assert len(kaban('help')[1].data[1]) == 1
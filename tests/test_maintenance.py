@@ -0,0 +1,40 @@
+"""Test tidying up the git repo."""
+
+
+import subprocess
+
+import git
+
+from kaban.maintenance import LOOSE_LIMIT, MIN_INTERVAL, PACK_LIMIT, gc_due, load_state, schedule_gc
+
+
+def test_gc(kaban, capsys):
+    kaban('config', 'flush_count', '1')
+    for title in ["Feed dragon", "Memorize pi", "Reload ion cannons"]:
+        kaban('add', title)
+    _, control = kaban('undo')
+    repo = git.Repo(control.paths.kaban_dir)
+    # the undone step's commit is only around thanks to its ref once the branch forgets it
+    undone = repo.head.commit.parents[0].hexsha
+    repo.git.reset('--hard', 'HEAD~2')
+    refs = {ref.path: ref.commit.hexsha for ref in repo.refs if ref.path.startswith('refs/kaban/')}
+    assert undone in refs.values()
+    capsys.readouterr()
+    assert kaban('gc')[0]
+    out = capsys.readouterr().out
+    assert "Objects after:  0 loose" in out and "walk history" in out
+    assert {ref.path: ref.commit.hexsha for ref in repo.refs if ref.path.startswith('refs/kaban/')} == refs
+    subprocess.run(['git', '-C', str(control.paths.kaban_dir), 'cat-file', '-e', undone], check=True)
+    assert load_state(control.paths)['worker'] is None
+    # and undo still knows where it's at
+    assert kaban('undolog')[0]
+
+
+def test_schedule(kaban):
+    assert not gc_due({}, 0, 1, now=MIN_INTERVAL)
+    assert gc_due({}, LOOSE_LIMIT, 1, now=MIN_INTERVAL)
+    assert gc_due({}, 0, PACK_LIMIT, now=MIN_INTERVAL)
+    assert not gc_due({'last_run': 1}, LOOSE_LIMIT, 1, now=MIN_INTERVAL)
+    # a handful of commits is nothing to tidy up after
+    _, control = kaban('add', "Feed dragon")
+    assert not schedule_gc(control.paths)
@@ -0,0 +1,146 @@
+"""Test merging task stores task by task, and pulling from the remote."""
+
+
+import sys
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+
+import git
+
+from kaban.control import KabanControl
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.defaults import Paths
+from kaban.journal import apply_changes
+from kaban.merge import merge_tasks
+
+
+def store(*items):
+    data = KabanData()
+    data.extend(items)
+    return data
+
+
+def bag(title, day, *tasks):
+    new_bag = KabanBag(title=title, date_added=datetime(2024, 1, day))
+    new_bag.tasks = list(tasks)
+    return new_bag
+
+
+def copy(data):
+    copied = KabanData()
+    for item in data:
+        if isinstance(item, KabanBag):
+            item = bag(item.title, item.date_added.day, *[replace(task) for task in item])
+        else:
+            item = replace(item)
+        copied.append(item)
+    return copied
+
+
+def titles(data):
+    return [[task.title for task in item] if isinstance(item, KabanBag) else item.title for item in data]
+
+
+def test_merge_tasks():
+    dragon = KabanTask(title="Feed dragon", date_added=datetime(2024, 1, 1, 9, 0, 0, 1), done=timedelta(hours=1))
+    pi = KabanTask(title="Memorize pi", date_added=datetime(2024, 1, 1, 9, 0, 0, 2))
+    mom = KabanTask(title="mom", date_added=datetime(2024, 1, 2, 9, 0, 0, 3))
+    cat = KabanTask(title="cat", date_added=datetime(2024, 1, 2, 9, 0, 0, 4))
+    base = store(dragon, pi, bag("gifts", 2, mom, cat), bag("chores", 3))
+    ours, theirs = copy(base), copy(base)
+    # an hour on each side, and a deadline here and notes there for the same task
+    ours[0].done += timedelta(hours=1)
+    ours[0].deadline = date(2025, 1, 1)
+    theirs[0].done += timedelta(hours=1)
+    theirs[0].notes = "Mind the fire"
+    # renamed here, given an estimate there
+    ours[1].title = "Memorize tau"
+    theirs[1].estimate = timedelta(hours=2)
+    # moved to another bag here, removed there
+    theirs[2].pop(0)
+    ours[3].append(ours[2].pop(1))
+    # new on both sides
+    ours.insert(2, KabanTask(title="Learn to juggle", date_added=datetime(2024, 2, 1)))
+    theirs[3].append(KabanTask(title="Water plants", date_added=datetime(2024, 2, 2)))
+    # and a conflict
+    ours[0].recurring = 'daily'
+    theirs[0].recurring = 'weekly'
+    changes, conflicts = merge_tasks(base, ours, theirs)
+    apply_changes(ours, changes)
+    assert titles(ours) == ["Feed dragon", "Memorize tau", "Learn to juggle", [], ["cat", "Water plants"]]
+    assert ours[0].done == timedelta(hours=3)
+    assert ours[0].deadline == date(2025, 1, 1) and ours[0].notes == "Mind the fire"
+    assert ours[0].recurring == 'daily'
+    assert ours[1].estimate == timedelta(hours=2)
+    assert conflicts == ["'Feed dragon': recurring was changed on both sides, kept yours"]
+    # nothing to merge once both sides are the same
+    assert merge_tasks(ours, ours, copy(ours))[0] == []
+
+
+def test_merge_bags():
+    mom = KabanTask(title="mom", date_added=datetime(2024, 1, 2, 9, 0, 0, 3))
+    base = store(bag("gifts", 2, mom), bag("chores", 3))
+    ours, theirs = copy(base), copy(base)
+    # removed there but changed here, so it stays
+    theirs.pop(0)
+    ours[0][0].notes = "Socks again"
+    # new there, and renamed there
+    theirs.append(bag("books", 4, KabanTask(title="Dune", date_added=datetime(2024, 3, 1))))
+    theirs[0].title = "housework"
+    changes, conflicts = merge_tasks(base, ours, theirs)
+    apply_changes(ours, changes)
+    assert [item.title for item in ours] == ["gifts", "housework", "books"]
+    assert titles(ours) == [["mom"], [], ["Dune"]]
+    assert conflicts == ["'gifts' bag: removed on the remote but changed here, kept it"]
+
+
+def machine(tmp_path, monkeypatch, name):
+    """A function to run kaban command lines with on another machine."""
+    kaban_dir = tmp_path / name
+    paths = Paths.for_dir(kaban_dir)
+    def run(*argv):
+        monkeypatch.setattr('kaban.control.DEFAULT_PATHS', paths)
+        monkeypatch.setattr(sys, 'argv', ['kaban'] + list(argv))
+        control = KabanControl()
+        return control._execute_command(), control
+    return run
+
+
+def test_pull(kaban, tmp_path, monkeypatch, capsys):
+    git.Repo.init(tmp_path / 'remote.git', bare=True)
+    kaban('remote', str(tmp_path / 'remote.git'))
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom', 'dad')
+    _, control = kaban('flush')
+    control.repo._git('push', '--quiet', 'origin', 'HEAD')
+    laptop_dir = tmp_path / 'laptop'
+    git.Repo.clone_from(tmp_path / 'remote.git', laptop_dir)
+    laptop = machine(tmp_path, monkeypatch, 'laptop')
+    laptop('config', 'flush_count', '1')
+    laptop('deadline', '2025-12-24', 'dad')
+    _, laptop_control = laptop('add', "Feed dragon")
+    laptop_control.repo._git('push', '--quiet', 'origin', 'HEAD')
+    # back on the first machine, which has been busy too
+    monkeypatch.setattr('kaban.control.DEFAULT_PATHS', control.paths)
+    kaban('add', 'gifts', 'cat')
+    kaban('flush')
+    capsys.readouterr()
+    assert not kaban('pull')[0]
+    assert "diverged" in capsys.readouterr().out
+    success, control = kaban('pull', '--merge')
+    assert success
+    _, control = kaban('help')
+    assert [task.title for task in control.data] == ["Feed dragon", "gifts"]
+    assert [task.title for task in control.data[1]] == ["mom", "dad", "cat"]
+    assert control.data[1][1].deadline == date(2025, 12, 24)
+    merge_commit = git.Repo(control.paths.kaban_dir).head.commit
+    assert len(merge_commit.parents) == 2
+    # and the laptop just catches up
+    control.repo._git('push', '--quiet', 'origin', 'HEAD')
+    success, laptop_control = laptop('pull')
+    assert success
+    assert laptop_control.repo.head_commit() == merge_commit.hexsha
+    assert [task.title for task in laptop('help')[1].data[1]] == ["mom", "dad", "cat"]
+    capsys.readouterr()
+    assert laptop('pull')[0]
+    assert "all caught up" in capsys.readouterr().out
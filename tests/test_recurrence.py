@@ -0,0 +1,65 @@
+"""Test recurrence rules and catching up on recurring tasks that came due."""
+
+
+from datetime import date, datetime, timedelta
+
+import git
+
+from kaban.data import KabanTask
+from kaban.journal import encode_value
+from kaban.recurrence import KabanSchedule, Rule, due_dates, load_earliest, parse_rule
+
+
+def test_rules():
+    assert parse_rule('Weekly') == Rule('weeks')
+    assert parse_rule('every 3 days') == Rule('days', 3)
+    assert parse_rule('every month') == Rule('months')
+    assert parse_rule('every 0 days') is None
+    assert parse_rule('whenever') is None
+    assert Rule('months').next_after(date(2024, 1, 31)) == date(2024, 2, 29)
+    assert Rule('years').next_after(date(2024, 2, 29)) == date(2025, 2, 28)
+    assert Rule('weeks', 2).next_after(date(2024, 12, 25)) == date(2025, 1, 8)
+
+
+def test_schedule():
+    task = KabanTask("Water plants", datetime(2024, 7, 1, 9, 30), recurring='weekly')
+    # hand-written, no next_due, so it goes by the date added
+    assert due_dates(task, date(2024, 7, 20)) == ([date(2024, 7, 8), date(2024, 7, 15)], date(2024, 7, 22))
+    schedule = KabanSchedule()
+    for day in range(1, 30):
+        schedule.add_task('', KabanTask(f"Task {day}", date(2024, 7, day), recurring='daily'))
+    schedule.add_task('', KabanTask("Once", date(2024, 7, 1)))
+    assert schedule.due(date(2024, 7, 3)) == [('', "Task 1"), ('', "Task 2")]
+    assert date.fromordinal(schedule.earliest()) == date(2024, 7, 2)
+
+
+def test_catch_up(kaban, capsys):
+    kaban('bag', 'chores')
+    assert kaban('auto', 'weekly', 'chores', "Water plants")[0]
+    _, control = kaban('auto', 'every 2 days', "Feed dragon")
+    assert not kaban('auto', 'whenever', "Feed dragon")[0]
+    # three weeks offline
+    today = date.today()
+    control._record("Time flies", [ {'change': 'set', 'path': [1, 0], 'field': 'next_due', 'old': None,
+                                     'new': encode_value('next_due', today - timedelta(weeks=3))}
+                                  , {'change': 'set', 'path': [0], 'field': 'next_due', 'old': None,
+                                     'new': encode_value('next_due', today - timedelta(days=1))}
+                                  ])
+    kaban('flush')
+    repo = git.Repo(control.paths.kaban_dir)
+    commits = len(list(repo.iter_commits()))
+    capsys.readouterr()
+    _, control = kaban('list')
+    assert capsys.readouterr().out.startswith("5 recurring tasks came due and got added.")
+    assert len(list(repo.iter_commits())) == commits + 1
+    assert [task.title for task in control.data] == ["Feed dragon", "Feed dragon", 'chores']
+    assert [task.date_added.date() for task in control.data[2][1:]] == \
+           [today - timedelta(weeks=weeks) for weeks in [3, 2, 1, 0]]
+    assert control.data[2][0].next_due == today + timedelta(weeks=1)
+    assert control.data[0].next_due == today + timedelta(days=1)
+    assert control.data[1].recurring is None
+    # from now on there's nothing due, and that's known without loading a thing
+    kaban('auto')
+    assert load_earliest(control.paths) == (today + timedelta(days=1)).toordinal()
+    _, control = kaban('add', "Memorize pi")
+    assert len(list(repo.iter_commits())) == commits + 1
@@ -0,0 +1,123 @@
+"""Test running commands across several registered kaban repos."""
+
+
+import shutil
+import sys
+
+import git
+
+from kaban.control import KabanControl
+from kaban.defaults import Paths
+
+
+def other_repo(tmp_path, monkeypatch, name):
+    """Like the kaban fixture, for another repo of the same user's."""
+    paths = Paths.for_dir(tmp_path / name)
+    def run(*argv):
+        monkeypatch.setattr('kaban.control.DEFAULT_PATHS', paths)
+        monkeypatch.setattr(sys, 'argv', ['kaban'] + list(argv))
+        control = KabanControl()
+        return control._execute_command(), control
+    assert run('init')[0]
+    return run
+
+
+def setup_repos(kaban, tmp_path, monkeypatch):
+    """Register two more repos with the fixture's, return commands for all three."""
+    _, control = kaban('repos')
+    def main(*argv):
+        monkeypatch.setattr('kaban.control.DEFAULT_PATHS', control.paths)
+        return kaban(*argv)
+    work = other_repo(tmp_path, monkeypatch, 'work')
+    work('add', "Deliver hotfix")
+    work('add', "Review dragon feature")
+    home = other_repo(tmp_path, monkeypatch, 'home')
+    home('add', "Feed dragon")
+    home('add', "Fix landlady's sink")
+    main('repos', 'add', str(tmp_path / 'work'))
+    main('repos', 'add', str(tmp_path / 'home'), 'house')
+    return main, work, home
+
+
+def test_repos(kaban, tmp_path, monkeypatch, capsys):
+    kaban, _, _ = setup_repos(kaban, tmp_path, monkeypatch)
+    capsys.readouterr()
+    assert kaban('repos')[0]
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].split() == ['house', str(tmp_path / 'home')]
+    assert out[1].split() == ['work', str(tmp_path / 'work')]
+    assert not kaban('repos', 'add', str(tmp_path / 'nowhere'))[0]
+    assert not kaban('repos', 'add', str(tmp_path / 'work'), 'house')[0]
+    assert kaban('repos', 'remove', 'house')[0]
+    assert not kaban('repos', 'remove', 'house')[0]
+    capsys.readouterr()
+    kaban('repos')
+    assert 'house' not in capsys.readouterr().out
+    assert (tmp_path / 'home').is_dir()
+
+
+def test_list_grep_all(kaban, tmp_path, monkeypatch, capsys):
+    kaban, work, _ = setup_repos(kaban, tmp_path, monkeypatch)
+    work('add', "Ship it")
+    capsys.readouterr()
+    assert kaban('list', '--all')[0]
+    out = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in out] == ['[house]', '[house]', '[work]', '[work]', '[work]']
+    assert "Feed dragon" in out[0] and "Deliver hotfix" in out[2] and "Ship it" in out[4]
+    assert kaban('list', '--all', '--limit', '2')[0]
+    assert len(capsys.readouterr().out.splitlines()) == 2
+    assert kaban('grep', '--all', 'dragon')[0]
+    out = capsys.readouterr().out.splitlines()
+    assert out == ["[house] top level: Feed dragon", "[work] top level: Review dragon feature"]
+    # sorted, the tasks of all repos come out as one list
+    assert kaban('list', '--all', '--sortby=date_added')[0]
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "Here's a list of all tasks sorted by 'date_added':"
+    assert [line.split()[0] for line in out[1:]] == ['[work]', '[work]', '[house]', '[house]', '[work]']
+    assert "Review dragon feature" in out[2] and "Feed dragon" in out[3] and "Ship it" in out[5]
+    assert kaban('list', '--all', '--sortby=date_added', '--limit=3')[0]
+    assert len(capsys.readouterr().out.splitlines()) == 4
+    assert not kaban('add', '--all', "Memorize pi")[0]
+    assert "one repo at a time" in capsys.readouterr().out
+
+
+def test_init_dir(kaban, tmp_path, capsys):
+    success, control = kaban('init', '--dir', str(tmp_path / 'side' / 'projects'))
+    assert success
+    assert "Registered as 'projects'" in capsys.readouterr().out
+    # whatever comes next, in the daemon say, is for the default repo again
+    assert control.paths.kaban_dir == tmp_path
+    assert control.repo.path == tmp_path
+    kaban('repos')
+    assert (tmp_path / 'side' / 'projects' / 'my_kaban_tasks.toml').exists()
+    assert git.Repo(tmp_path / 'side' / 'projects').head.commit.message.startswith("Init kaban repo")
+    assert "projects" in capsys.readouterr().out
+    assert kaban('init', '--dir', str(tmp_path / 'side' / 'projects'))[0]
+    assert "already have a kaban repo" in capsys.readouterr().out
+
+
+def test_failure_isolated(kaban, tmp_path, monkeypatch, capsys):
+    kaban, _, _ = setup_repos(kaban, tmp_path, monkeypatch)
+    shutil.rmtree(tmp_path / 'work')
+    capsys.readouterr()
+    assert not kaban('status', '--all')[0]
+    out = capsys.readouterr().out
+    assert "house:" in out and "work:" in out
+    assert "No kaban repo found" in out
+    assert "1 of 2 repos didn't make it: work." in out
+
+
+def test_push_pull_all(kaban, tmp_path, monkeypatch, capsys):
+    kaban, work, _ = setup_repos(kaban, tmp_path, monkeypatch)
+    remote = git.Repo.init(tmp_path / 'work.git', bare=True)
+    work('remote', str(tmp_path / 'work.git'))
+    capsys.readouterr()
+    # the home repo has no remote, which doesn't keep the work one from being pushed
+    assert not kaban('push', '--all')[0]
+    out = capsys.readouterr().out
+    assert "Pushed to the remote" in out and "No remote URL found" in out
+    _, control = work('status')
+    assert remote.head.commit.hexsha == control.repo.head_commit()
+    capsys.readouterr()
+    kaban('pull', '--all')
+    assert "all caught up" in capsys.readouterr().out
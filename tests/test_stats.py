@@ -0,0 +1,65 @@
+"""Test the progress rollups and the estimate analytics."""
+
+
+from datetime import date, timedelta
+
+import pytest
+
+from kaban.data import KabanBag, KabanData, KabanTask
+from kaban.stats import KabanStats, load_stats, ratio_columns, ratio_summary
+
+
+def hours(count):
+    return timedelta(hours=count)
+
+
+@pytest.fixture
+def data():
+    data = KabanData()
+    work = KabanBag('work', date(2024, 7, 1))
+    work.extend([ KabanTask("Read emails", date(2024, 7, 1), estimate=hours(1), done=hours(2))
+                , KabanTask("Fix kaban bug", date(2024, 7, 5), estimate=hours(3))
+                , KabanTask("Lunch", date(2024, 7, 5), done=hours(1))
+                ])
+    data.extend([KabanTask("Feed dragon", date(2024, 7, 2), recurring='daily', estimate=hours(2), done=hours(1)),
+                 work])
+    return data
+
+
+def test_rollups(data):
+    work = KabanStats.build(data).bags['work']
+    assert (work.count, work.estimated) == (3, 2)
+    # time spent over the estimate doesn't count toward it
+    assert work.progress() == pytest.approx(1 / 4)
+    # a quarter done in 10 days, three quarters to go
+    assert work.projected_completion(date(2024, 7, 11)) == date(2024, 8, 10)
+    assert work.ratios == {1: 1}
+
+
+def test_ratio_columns(data):
+    by_bag = ratio_columns(data)
+    assert list(by_bag) == ['', 'work']
+    assert list(by_bag['work']) == [2.0]
+    assert ratio_summary(by_bag['']) == (0.5, 0.5, 0.5)
+    assert list(ratio_columns(data, by='recurring')) == ['daily', '']
+
+
+def test_incremental(kaban, capsys):
+    kaban('bag', 'work')
+    kaban('add', 'work', "Read emails", "Fix kaban bug")
+    _, control = kaban('status', 'work')
+    control._record("Estimate", [{'change': 'set', 'path': [0, 0], 'field': 'estimate', 'old': None, 'new': 1.0},
+                                 {'change': 'set', 'path': [0, 1], 'field': 'estimate', 'old': None, 'new': 3.0}])
+    control._record("Log", [{'change': 'set', 'path': [0, 0], 'field': 'done', 'old': 0.0, 'new': 2.0}])
+    kaban('undo')
+    kaban('add', 'work', "Lunch")
+    _, control = kaban('flush')
+    stats = load_stats(control.paths)
+    assert stats is not None
+    assert stats.bags == KabanStats.build(control.data).bags
+    capsys.readouterr()
+    assert kaban('status', 'work')[0]
+    assert capsys.readouterr().out.startswith("'work' bag is currently 0% done based on your estimates.")
+    assert not kaban('status', 'play')[0]
+    assert kaban('stats', 'recurring')[0]
+    assert not kaban('stats', 'color')[0]
@@ -0,0 +1,79 @@
+"""Test pushing to the remote in the background."""
+
+
+import os
+import signal
+import time
+
+import git
+
+from kaban.sync import BACKOFF_BASE, load_state, push, push_due
+
+
+def wait_for_worker(paths, timeout=30):
+    deadline = time.monotonic() + timeout
+    while load_state(paths).get('worker') is not None:
+        assert time.monotonic() < deadline, "push never finished"
+        time.sleep(0.05)
+    return load_state(paths)
+
+
+def test_autopush(kaban, tmp_path):
+    remote = git.Repo.init(tmp_path / 'remote.git', bare=True)
+    _, control = kaban('remote', str(tmp_path / 'remote.git'))
+    kaban('config', 'flush_count', '1')
+    kaban('config', 'autopush', 'true')
+    _, control = kaban('add', "Feed dragon")
+    state = wait_for_worker(control.paths)
+    head = control.repo.head_commit()
+    assert state['pushed'] == head
+    assert remote.head.commit.hexsha == head
+    # every commit that came in meanwhile goes out with the next push
+    kaban('add', "Memorize pi")
+    kaban('add', "Reload ion cannons")
+    state = wait_for_worker(control.paths)
+    assert remote.head.commit.hexsha == control.repo.head_commit() == state['pushed']
+
+
+def test_schedule():
+    state = {'pushed': 'abc', 'last_push': 1000}
+    assert not push_due(state, 'abc', 0, now=5000)
+    assert push_due(state, 'def', 0, now=5000)
+    # once an hour means once an hour
+    assert not push_due(state, 'def', 3600, now=2000)
+    assert push_due(state, 'def', 3600, now=5000)
+    assert not push_due(state, 'def', None, now=5000)
+
+
+def test_backoff(kaban, tmp_path, capsys):
+    _, control = kaban('remote', str(tmp_path / 'nowhere.git'))
+    kaban('config', 'flush_count', '1')
+    kaban('add', "Feed dragon")
+    before = time.time()
+    push(control.paths)
+    state = load_state(control.paths)
+    assert state['failures'] == 1
+    assert state['retry_at'] >= before + BACKOFF_BASE
+    assert state['worker'] is None
+    # failures don't stop commands from going through, and don't retry right away either
+    kaban('config', 'autopush', 'true')
+    assert kaban('add', "Memorize pi")[0]
+    assert load_state(control.paths)['failures'] == 1
+    capsys.readouterr()
+    assert kaban('status')[0]
+    assert "The last push failed" in capsys.readouterr().out
+
+
+def test_slow_remote(kaban, tmp_path):
+    _, control = kaban('remote', 'ssh://example.invalid/tasks.git')
+    # a remote that takes ages to answer, then says no
+    control.repo.set_config('core', 'sshCommand', 'sleep 20; false')
+    kaban('config', 'flush_count', '1')
+    kaban('config', 'autopush', 'true')
+    start = time.monotonic()
+    assert kaban('add', "Feed dragon")[0]
+    assert kaban('add', "Memorize pi")[0]
+    assert time.monotonic() - start < 10
+    worker = load_state(control.paths)['worker']
+    assert worker is not None
+    os.kill(worker, signal.SIGTERM)
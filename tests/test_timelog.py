@@ -0,0 +1,88 @@
+"""Test the time log, the timer and folding logged time into the tasks."""
+
+
+import time
+from datetime import timedelta
+
+import git
+
+from kaban.timelog import KabanTimeLog
+
+
+def test_totals(tmp_path):
+    timelog = KabanTimeLog(tmp_path / 'log.jsonl', tmp_path / 'timer.json', tmp_path / 'totals.pickle')
+    assert timelog.totals() == {}
+    timelog.append('gifts', 'mom', 60, stop=100)
+    timelog.append(None, 'dragon', 30, stop=200)
+    assert timelog.totals() == {('gifts', 'mom'): [60, 100], (None, 'dragon'): [30, 200]}
+    timelog.append('gifts', 'mom', 15, stop=300)
+    # only the new line gets read, the rest comes from the cached totals
+    with open(timelog.path, 'r+b') as log_file:
+        log_file.readline()
+        log_file.write(b'{"garbage": ')
+    assert timelog.totals() == {('gifts', 'mom'): [75, 300], (None, 'dragon'): [30, 200]}
+    compaction, entries = timelog.begin_compaction()
+    # the line we garbled is skipped like a torn one
+    assert compaction is not None and len(entries) == 2
+    timelog.end_compaction()
+    assert timelog.begin_compaction() == (None, [])
+    timelog.append('gifts', 'dad', 5, stop=400)
+    assert timelog.totals() == {('gifts', 'dad'): [5, 400]}
+
+
+def test_timer(kaban, capsys):
+    kaban('add', "Feed dragon")
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom')
+    kaban('add', 'gifts', 'dad')
+    _, control = kaban('flush')
+    repo = git.Repo(control.paths.kaban_dir)
+    head = repo.head.commit
+    assert kaban('start', 'mom')[0]
+    # the timer outlives the command that started it
+    _, control = kaban('help')
+    timer = control.timelog.running()
+    assert (timer['bag'], timer['task']) == ('gifts', 'mom')
+    control.timelog.start_timer('gifts', 'mom', time.time() - 3782)
+    capsys.readouterr()
+    assert kaban('stop')[0]
+    assert "1:03:02 logged on 'mom'" in capsys.readouterr().out
+    assert not kaban('stop')[0]
+    assert kaban('log', '1h30m', "Feed dragon")[0]
+    assert kaban('log', '30m', 'mom')[0]
+    assert "0:30:00 logged on 'mom', 1:33:02 since the last commit" in capsys.readouterr().out
+    assert not kaban('log', 'forever', 'mom')[0]
+    assert not kaban('log', '1h', 'cat')[0]
+    # none of it touched the task file, let alone committed it
+    assert repo.head.commit == head and not repo.is_dirty()
+    _, control = kaban('status')
+    assert "3 changes waiting to be committed" in capsys.readouterr().out
+    assert kaban('flush')[0]
+    assert repo.head.commit.message.startswith("Log 3:03:02 on 2 tasks")
+    assert not control.paths.timelog_file_path.exists()
+    _, control = kaban('help')
+    assert control.data[0].done == timedelta(hours=1, minutes=30)
+    mom = control.data[1][0]
+    assert mom.done == timedelta(hours=1, minutes=33, seconds=2)
+    assert mom.date_last_logged is not None
+    # folding logged time in isn't a step to undo
+    kaban('undo')
+    assert [task.title for task in kaban('help')[1].data[1]] == ['mom']
+    assert kaban('help')[1].data[1][0].done == mom.done
+
+
+def test_interrupted_compaction(kaban):
+    kaban('add', 'mom')
+    _, control = kaban('log', '1h', 'mom')
+    # cut short before the operation made it to the journal
+    control.timelog.begin_compaction()
+    _, control = kaban('log', '30m', 'mom')
+    kaban('flush')
+    assert kaban('help')[1].data[0].done == timedelta(hours=1)
+    # cut short after it did
+    content = control.timelog.path.read_bytes()
+    assert control._compact_timelog()
+    control.timelog.compacting_path.write_bytes(content)
+    kaban('flush')
+    assert kaban('help')[1].data[0].done == timedelta(hours=1, minutes=30)
+    assert not control.timelog.compacting_path.exists()
@@ -0,0 +1,43 @@
+"""Test the timing tree and counters of --profile and KABAN_TRACE."""
+
+
+import io
+import json
+
+from kaban import trace
+
+
+def test_phases_add_up():
+    assert trace.span('anything') is trace.span('something else')  # nothing to it when it's off
+    assert trace.start('text', 'kaban test')
+    with trace.span('command test'):
+        for _ in range(3):
+            with trace.span('git log'):
+                trace.count('git processes')
+    report = io.StringIO()
+    trace.finish(report)
+    lines = report.getvalue().splitlines()
+    assert [line.split()[0] for line in lines[:3]] == ['kaban', 'command', 'git']
+    assert lines[2].startswith('    git log') and lines[2].endswith('x3')
+    assert lines[3] == 'git processes 3'
+    # and it's off again
+    assert trace.span('anything') is trace.span('something else')
+
+
+def test_profile(kaban, tmp_path, monkeypatch):
+    monkeypatch.setenv('KABAN_TRACE', f"json,{tmp_path / 'add.prof'}")
+    kaban('add', "Feed dragon")
+    report = io.StringIO()
+    trace.finish(report)
+    lines = [json.loads(line) for line in report.getvalue().splitlines()]
+    phases = [line['phase'] for line in lines if 'phase' in line]
+    assert ['kaban add', 'load data'] in phases and ['kaban add', 'command add'] in phases
+    counters = {line['counter']: line['value'] for line in lines if 'counter' in line}
+    assert counters['journal appends'] == 1
+    assert (tmp_path / 'add.prof').exists()
+    monkeypatch.delenv('KABAN_TRACE')
+    kaban('flush', '--profile')
+    report = io.StringIO()
+    trace.finish(report)
+    assert 'commits created 1' in report.getvalue()
+    assert '    flush journal' in report.getvalue()
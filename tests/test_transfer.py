@@ -0,0 +1,121 @@
+"""Test importing and exporting tasks in bulk."""
+
+
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import git
+import pytest
+
+from kaban.transfer import parse_duration, read_tasks, task_from_record, write_tasks
+
+
+def test_task_from_record():
+    now = datetime(2024, 7, 1, 12)
+    kind, bag_title, task = task_from_record({ 'bag': 'gifts', 'title': 'mom', 'deadline': '2024-12-24'
+                                             , 'estimate': '1h30m', 'done': 2, 'notes': ''
+                                             }, now)
+    assert (kind, bag_title) == ('task', 'gifts')
+    assert task.deadline == date(2024, 12, 24) and task.date_added == now
+    assert task.estimate == timedelta(minutes=90) and task.done == timedelta(hours=2)
+    assert task.notes is None
+    assert parse_duration('2d') == timedelta(days=2)
+    for record, message in [ ({'title': 'mom', 'colour': 'red'}, "unknown field 'colour'")
+                           , ({'notes': 'no title'}, "needs a title")
+                           , ({'title': 'mom', 'deadline': 'someday'}, "isn't a date")
+                           , ({'title': 'mom', 'estimate': 'forever'}, "isn't a duration")
+                           , ({'title': 'mom', 'recurring': 'now and then'}, "how often")
+                           , ({'title': 'mom', 'type': 'box'}, "either 'task' or 'bag'")
+                           ]:
+        with pytest.raises(ValueError, match=message):
+            task_from_record(record)
+
+
+def test_todotxt():
+    text = ("(A) 2024-07-01 Call mom +gifts due:2024-07-10 est:30m\n"
+            "x 2024-07-02 2024-07-01 Already done\n"
+            "\n"
+            "Water plants rec:2d @home\n")
+    read = list(read_tasks('todotxt', io.StringIO(text)))
+    assert [(bag_title, task.title) for _, bag_title, task in read] == [('gifts', 'Call mom'), (None, 'Water plants @home')]
+    mom, plants = read[0][2], read[1][2]
+    assert mom.date_added == date(2024, 7, 1) and mom.deadline == date(2024, 7, 10)
+    assert mom.estimate == timedelta(minutes=30)
+    assert plants.recurring == 'every 2 days'
+    out = io.StringIO()
+    write_tasks('todotxt', [('gifts', mom), (None, plants)], out)
+    assert out.getvalue() == ("2024-07-01 Call mom +gifts due:2024-07-10 est:0.5h\n"
+                              f"{plants.date_added.date().isoformat()} Water plants @home rec:2d\n")
+
+
+@pytest.mark.parametrize('suffix', ['jsonl', 'csv'])
+def test_round_trip(kaban, tmp_path, suffix):
+    kaban('add', "Feed dragon")
+    kaban('bag', 'gifts')
+    kaban('add', 'gifts', 'mom', 'dad')
+    kaban('deadline', '2024-12-24', 'dad')
+    kaban('estimate', '2h', 'dad')
+    kaban('bag', 'chores')
+    exported = tmp_path / f'tasks.{suffix}'
+    success, control = kaban('export', str(exported))
+    assert success
+    before = list(control.data)
+    # into a store of its own
+    kaban('undo')
+    while kaban('undo')[0]:
+        pass
+    commits = len(list(git.Repo(control.paths.kaban_dir).iter_commits()))
+    success, control = kaban('import', str(exported))
+    assert success
+    assert len(list(git.Repo(control.paths.kaban_dir).iter_commits())) == commits + 1
+    _, control = kaban('help')
+    assert list(control.data) == before
+
+
+def test_import(kaban, tmp_path, capsys):
+    kaban('add', "Feed dragon")
+    kaban('bag', 'gifts')
+    kaban('flush')
+    records = [ {'title': "Memorize pi"}
+              , {'bag': 'gifts', 'title': 'cat'}
+              , {'type': 'bag', 'title': 'books'}
+              , {'bag': 'chores', 'title': "Take out the trash"}
+              ]
+    source = tmp_path / 'new.jsonl'
+    source.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    success, control = kaban('import', str(source))
+    assert success
+    repo = git.Repo(control.paths.kaban_dir)
+    head = repo.head.commit
+    assert head.message.startswith("Import 3 tasks from 'new.jsonl'")
+    _, control = kaban('help')
+    assert [item.title for item in control.data] == ["Feed dragon", "Memorize pi", 'gifts', 'books', 'chores']
+    assert [task.title for task in control.data[2]] == ['cat']
+    assert [task.title for task in control.data[4]] == ["Take out the trash"]
+    # only where they went in gets recorded, the tasks themselves are in the commit already
+    assert "Memorize pi" not in head.message and "Take out the trash" not in head.message
+    assert "Memorize pi" not in control.undo_stack.path.read_text()
+    # a step like any other, and the ones before it are still there too
+    refs = [ref.path for ref in repo.refs if ref.path.startswith('refs/kaban/steps/')]
+    assert 'refs/kaban/steps/' + head.hexsha in refs and len(refs) == 2
+    assert kaban('undo')[0]
+    assert [item.title for item in kaban('help')[1].data] == ["Feed dragon", 'gifts']
+    assert kaban('undo')[0]
+    assert kaban('redo')[0]
+    assert kaban('redo')[0]
+    _, control = kaban('help')
+    assert [item.title for item in control.data] == ["Feed dragon", "Memorize pi", 'gifts', 'books', 'chores']
+    assert [task.title for task in control.data[2]] == ['cat']
+    assert [task.title for task in control.data[4]] == ["Take out the trash"]
+    assert "Memorize pi" not in repo.head.commit.message
+    kaban('flush')
+    head = repo.head.commit
+    # one bad record and nothing goes in
+    source.write_text(json.dumps({'title': 'fine'}) + '\n' + json.dumps({'title': 'bad', 'done': 'lots'}) + '\n')
+    capsys.readouterr()
+    assert not kaban('import', str(source))[0]
+    assert "line 2" in capsys.readouterr().out
+    assert repo.head.commit == head
+    assert len(kaban('help')[1].data) == 5
+    assert not kaban('import', str(tmp_path / 'tasks.xml'))[0]
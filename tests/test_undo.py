@@ -0,0 +1,99 @@
+"""Test undoing and redoing, and the stack of steps behind them."""
+
+
+import subprocess
+
+import git
+
+from kaban.undo import STEP_REF_PREFIX
+
+
+def titles(data):
+    return [task.title for task in data]
+
+
+def test_redo(kaban):
+    kaban('add', "Feed dragon")
+    kaban('add', "Memorize pi")
+    kaban('undo')
+    success, control = kaban('redo')
+    assert success
+    assert titles(control.data) == ["Feed dragon", "Memorize pi"]
+    # an undo that never got committed leaves nothing behind in the journal
+    assert len(control.journal.pending()) == 2
+    assert not kaban('redo')[0]
+    kaban('flush')
+    kaban('undo')
+    kaban('undo')
+    _, control = kaban('redo')
+    assert titles(control.data) == ["Feed dragon"]
+    # a new change is the end of redoing anything
+    kaban('add', "Learn to juggle")
+    assert not kaban('redo')[0]
+    _, control = kaban('help')
+    assert titles(control.data) == ["Feed dragon", "Learn to juggle"]
+
+
+def test_undolog(kaban, capsys):
+    kaban('bag', 'gifts')
+    kaban('flush')
+    kaban('add', "Memorize pi")
+    kaban('bag', 'chores')
+    kaban('undo')
+    capsys.readouterr()
+    assert kaban('undolog')[0]
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith('redo 1') and lines[0].endswith("'chores'")
+    assert lines[1].startswith('undo 1') and 'pending' in lines[1]
+    assert lines[2].startswith('undo 2') and lines[2].endswith("'gifts'") and 'pending' not in lines[2]
+    assert len(lines) == 3
+
+
+def test_refs_survive_gc(kaban):
+    kaban('add', "Feed dragon")
+    _, control = kaban('flush')
+    repo = git.Repo(control.paths.kaban_dir)
+    step_commit = repo.head.commit.hexsha
+    assert [ref.path for ref in repo.refs if ref.path.startswith(STEP_REF_PREFIX)] == [STEP_REF_PREFIX + step_commit]
+    # throw the commit away as far as the branch is concerned
+    repo.git.reset('--hard', 'HEAD~1')
+    repo.git.reflog('expire', '--expire=now', '--all')
+    repo.git.gc('--prune=now', '--quiet')
+    assert repo.git.cat_file('-t', step_commit) == 'commit'
+
+
+def test_rebuild(kaban):
+    kaban('add', "Feed dragon")
+    kaban('add', "Memorize pi")
+    kaban('flush')
+    kaban('add', "Learn to juggle")
+    kaban('undo')
+    _, control = kaban('undo')
+    control.paths.undo_file_path.unlink()
+    _, control = kaban('redo')
+    assert titles(control.data) == ["Feed dragon", "Memorize pi"]
+    # someone moved HEAD behind our back
+    kaban('flush')
+    subprocess.run(['git', '-C', str(control.paths.kaban_dir), 'reset', '--quiet', '--hard', 'HEAD~1'], check=True)
+    success, control = kaban('undo')
+    assert success
+    assert titles(control.data) == ["Feed dragon"]
+    _, control = kaban('undo')
+    assert titles(control.data) == []
+    assert not kaban('undo')[0]
+
+
+def test_steps_by_reference(kaban):
+    kaban('add', "Feed dragon " * 1000)
+    _, control = kaban('flush')
+    # the stack says where the step is, its changes stay in the commit
+    assert 'dragon' not in control.paths.undo_file_path.read_text(encoding='utf-8')
+    kaban('add', "Memorize pi")
+    assert kaban('undo')[0]
+    # an undo that was never committed has nowhere else to keep them
+    assert 'Memorize pi' in control.paths.undo_file_path.read_text(encoding='utf-8')
+    assert kaban('undo')[0]
+    assert kaban('redo')[0]
+    _, control = kaban('redo')
+    assert titles(control.data) == ["Feed dragon " * 1000, "Memorize pi"]
+    assert 'Memorize pi' not in control.paths.undo_file_path.read_text(encoding='utf-8')